@@ -0,0 +1,274 @@
+"""
+Throughput of ``/graphql/`` under WSGI and under ASGI with many slow clients.
+
+The WSGI server has a fixed pool of worker threads, like gunicorn's gthread
+worker, and a request holds a thread for as long as its client takes to send
+it. The ASGI server is uvicorn with the async view, which waits for slow
+clients in the event loop. Each client sends its headers, waits ``--delay``
+seconds, and then sends the body. With ``--idle``, that many more clients
+open a connection first and never finish their request, as a slow mobile
+client or a slowloris attack would:
+
+    python -m benchmarks.asgi_wsgi --clients 200 --delay 0.2 --idle 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks.common import setup_django, synthetic_rows
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            symbol
+        }
+    }
+}
+"""
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """Handle each connection in one of a fixed number of threads."""
+
+    # Queue the clients waiting for a thread rather than refuse them.
+    request_queue_size = 1024
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+
+def serve(mode, port, db_path, threads):
+    if mode == "asgi":
+        os.environ["COUNTRIES_GRAPHQL_ASYNC"] = "1"
+    setup_django(db_path)
+
+    import logging
+
+    from django.conf import settings
+
+    logging.getLogger("nplusone").disabled = True
+    settings.ALLOWED_HOSTS = ["127.0.0.1"]
+
+    if mode == "asgi":
+        import uvicorn
+        from django.core.asgi import get_asgi_application
+
+        uvicorn.run(
+            get_asgi_application(), host="127.0.0.1", port=port, log_level="warning"
+        )
+    else:
+        from django.core.wsgi import get_wsgi_application
+
+        server = make_server(
+            "127.0.0.1",
+            port,
+            get_wsgi_application(),
+            server_class=lambda *args, **kwargs: PooledWSGIServer(
+                *args, threads=threads, **kwargs
+            ),
+            handler_class=QuietWSGIRequestHandler,
+        )
+        server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start on port {}.".format(port))
+
+
+async def slow_request(port, body, delay):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(
+            (
+                "POST /graphql/ HTTP/1.1\r\n"
+                "Host: 127.0.0.1\r\n"
+                "Content-Type: application/json\r\n"
+                "Content-Length: {}\r\n"
+                "Connection: close\r\n\r\n".format(len(body))
+            ).encode()
+        )
+        await writer.drain()
+        await asyncio.sleep(delay)
+        writer.write(body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return response.split(b" ", 2)[1] == b"200"
+
+
+async def idle_connection(port, stop):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"POST /graphql/ HTTP/1.1\r\nHost: 127.0.0.1\r\n")
+    await writer.drain()
+    await stop.wait()
+    writer.close()
+
+
+async def run_load(port, clients, requests_per_client, delay, idle, timeout):
+    latencies = []
+    failures = 0
+    stop = asyncio.Event()
+    idlers = [asyncio.create_task(idle_connection(port, stop)) for _ in range(idle)]
+    # Let the server accept them first.
+    await asyncio.sleep(0.5)
+
+    async def client(index):
+        nonlocal failures
+        for i in range(requests_per_client):
+            body = json.dumps(
+                {
+                    "query": QUERY,
+                    "variables": {
+                        "search": "Country {}".format(100 + (index + i) % 900)
+                    },
+                }
+            ).encode()
+            start = time.perf_counter()
+            try:
+                ok = await asyncio.wait_for(slow_request(port, body, delay), timeout)
+            except (OSError, asyncio.TimeoutError):
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            failures += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*idlers)
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "failures": failures,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=1000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 200])
+    parser.add_argument("--requests", type=int, default=5, help="Per client.")
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--idle", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=10, help="Per request.")
+    parser.add_argument("--threads", type=int, default=8, help="WSGI threads.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--serve", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        mode, port, db_path = args.serve
+        serve(mode, int(port), db_path, args.threads)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "bench.sqlite3"
+        setup_django(db_path)
+        from countries.sync import sync_feeds
+
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        print(
+            "{:>5} {:>8} {:>9} {:>9} {:>10} {:>9} {:>9}".format(
+                "mode",
+                "clients",
+                "requests",
+                "failures",
+                "requests/s",
+                "p50 ms",
+                "p99 ms",
+            )
+        )
+        for mode in ("wsgi", "asgi"):
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.asgi_wsgi",
+                    "--threads",
+                    str(args.threads),
+                    "--serve",
+                    mode,
+                    str(port),
+                    str(db_path),
+                ]
+            )
+            try:
+                wait_for_port(port)
+                for clients in args.clients:
+                    result = {
+                        "mode": mode,
+                        "clients": clients,
+                        "delay": args.delay,
+                        "idle": args.idle,
+                        **asyncio.run(
+                            run_load(
+                                port,
+                                clients,
+                                args.requests,
+                                args.delay,
+                                args.idle,
+                                args.timeout,
+                            )
+                        ),
+                    }
+                    results.append(result)
+                    print(
+                        "{mode:>5} {clients:>8} {requests:>9} {failures:>9} "
+                        "{requests_per_second:>10} {p50_ms:>9} {p99_ms:>9}".format(
+                            **result
+                        )
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
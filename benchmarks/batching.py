@@ -0,0 +1,163 @@
+"""
+Latency and SQL statements of N separate GraphQL requests against one batch.
+
+A fresh database is filled with synthetic countries and served over HTTP by
+a WSGI server in a thread. A page with N autocomplete boxes sends one
+``countries(search:)`` query per box, first as N requests one after the
+other, then as one batch (see ``countries.batching``). ``--rtt`` adds the
+given network round trip, in milliseconds, to every request, which is what
+batching saves the most of away from localhost. The result cache and the
+read model are off, and the statements are counted through the test client:
+
+    python -m benchmarks.batching --countries 20000 --sizes 1 5 10 --rtt 20
+"""
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks.common import setup_django, synthetic_rows
+from benchmarks.suite import count_queries
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            symbol
+        }
+    }
+}
+"""
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server(
+        "127.0.0.1",
+        0,
+        get_wsgi_application(),
+        server_class=WSGIServer,
+        handler_class=QuietWSGIRequestHandler,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/graphql/".format(server.server_port)
+
+
+def http_post(url, data, rtt):
+    request = urllib.request.Request(
+        url,
+        json.dumps(data).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    time.sleep(rtt / 1000)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def operations(size):
+    return [
+        # Codes of the synthetic countries, which each find one.
+        {"query": QUERY, "variables": {"search": "Z{:07d}".format(7 * i + 1)}}
+        for i in range(size)
+    ]
+
+
+def median_ms(function, repeat):
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--rtt", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(Path(directory) / "bench.sqlite3")
+        from django.conf import settings
+        from django.test import Client
+
+        from countries.sync import sync_feeds
+
+        settings.COUNTRIES_RESULT_CACHE = {"ENABLED": False}
+        settings.COUNTRIES_READ_MODEL = {"ENABLED": False}
+        settings.COUNTRIES_BATCH = {"MAX_OPERATIONS": max(args.sizes)}
+        # nplusone logs every unused prefetch, which is not what we measure.
+        logging.getLogger("nplusone").disabled = True
+        # The test client's host, which the test runner would otherwise allow.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver", "127.0.0.1"]
+
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        server, url = serve()
+        client = Client()
+
+        def post_client(data):
+            response = client.post("/graphql/", data, content_type="application/json")
+            assert response.status_code == 200
+
+        print(
+            "{:>5} {:>13} {:>9} {:>17} {:>13}".format(
+                "N", "separate ms", "batch ms", "separate queries", "batch queries"
+            )
+        )
+        for size in args.sizes:
+            batch = operations(size)
+
+            def separate():
+                return [http_post(url, data, args.rtt) for data in batch]
+
+            def batched():
+                return http_post(url, batch, args.rtt)
+
+            assert separate() == batched()
+            _, separate_queries = count_queries(
+                lambda: [post_client(data) for data in batch]
+            )
+            _, batch_queries = count_queries(lambda: post_client(batch))
+            result = {
+                "size": size,
+                "separate_ms": median_ms(separate, args.repeat),
+                "batch_ms": median_ms(batched, args.repeat),
+                "separate_queries": separate_queries,
+                "batch_queries": batch_queries,
+            }
+            results.append(result)
+            print(
+                "{size:>5} {separate_ms:>13} {batch_ms:>9} {separate_queries:>17} "
+                "{batch_queries:>13}".format(**result)
+            )
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rtt_ms": args.rtt, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
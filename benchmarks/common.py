@@ -0,0 +1,101 @@
+"""
+Shared helpers for the benchmarks in this package.
+
+The benchmarks run against a throwaway SQLite database and a local stand-in
+for the feed API, never against ``db.sqlite3``. Run them from the repository
+root, e.g. ``python -m benchmarks.stream_memory``.
+"""
+import functools
+import json
+import os
+import random
+import resource
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def setup_django(db_path):
+    """Configure Django for a fresh database at ``db_path`` and migrate it."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "codingtest.settings")
+    from django.conf import settings
+
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(db_path)
+    # The generation token and what is keyed by it belong to this database,
+    # not to db.sqlite3.
+    settings.CACHES["countries"]["LOCATION"] = str(Path(db_path).parent / "cache")
+    # DEBUG keeps every query in memory, which would skew the numbers.
+    settings.DEBUG = False
+
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def synthetic_rows(num_countries, seed=0):
+    """
+    Yield feed rows as (countries, currencies) generators.
+
+    There is one currency for every four countries, and each country uses
+    one to five of them.
+    """
+    num_currencies = max(num_countries // 4, 5)
+
+    def currencies():
+        for i in range(num_currencies):
+            yield {"code": "Y{:07d}".format(i), "name": "Currency {}".format(i)}
+
+    def countries():
+        rng = random.Random(seed)
+        for i in range(num_countries):
+            yield {
+                "code": "Z{:07d}".format(i),
+                "name": "Country {}".format(i),
+                "currencies": [
+                    "Y{:07d}".format(rng.randrange(num_currencies))
+                    for _ in range(rng.randint(1, 5))
+                ],
+            }
+
+    return countries(), currencies()
+
+
+def write_json_array(path, rows):
+    """Write rows as a JSON array without holding them all in memory."""
+    with open(path, "w") as f:
+        f.write("[")
+        for i, row in enumerate(rows):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(row))
+        f.write("]\n")
+
+
+def write_feeds(directory, num_countries, seed=0):
+    countries, currencies = synthetic_rows(num_countries, seed)
+    write_json_array(os.path.join(directory, "countries.json"), countries)
+    write_json_array(os.path.join(directory, "currencies.json"), currencies)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(directory):
+    """Serve ``directory`` over HTTP from a background thread."""
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, "http://127.0.0.1:{}/".format(server.server_port)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
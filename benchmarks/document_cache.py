@@ -0,0 +1,137 @@
+"""
+Requests per second of ``/graphql/`` with the document cache on and off.
+
+The requests go through Django's test client in this process, so the numbers
+include the view and the middleware but not a network round trip:
+
+    python -m benchmarks.document_cache --countries 250 --requests 2000
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, synthetic_rows
+
+# The kind of queries our clients send: a few fixed documents, with the search
+# term passed as a variable.
+QUERIES = [
+    (
+        """
+        query Countries($search: String) {
+            countries(search: $search) {
+                name
+                symbol
+                currencies {
+                    name
+                    symbol
+                }
+            }
+        }
+        """,
+        {"search": "Country 12"},
+    ),
+    (
+        """
+        query CountryNames($search: String) {
+            countries(search: $search) {
+                name
+                symbol
+            }
+        }
+        """,
+        {"search": "Country 7"},
+    ),
+]
+
+
+def persisted_query(query):
+    from countries.documents import query_hash
+
+    return {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+
+def requests_per_second(client, payloads, num_requests):
+    start = time.perf_counter()
+    for i in range(num_requests):
+        response = client.post(
+            "/graphql/", payloads[i % len(payloads)], content_type="application/json"
+        )
+        assert response.status_code == 200, response.content
+    return num_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(Path(directory) / "bench.sqlite3")
+
+        from django.conf import settings
+        from django.test import Client
+
+        from countries.documents import document_cache
+        from countries.sync import sync_feeds
+
+        # nplusone logs every unused prefetch, which is not what we measure.
+        logging.getLogger("nplusone").disabled = True
+        # The test client's host, which the test runner would otherwise allow.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        client = Client()
+        results = []
+        print("{:>10} {:>10} {:>12}".format("cache", "requests", "requests/s"))
+        for mode in ("off", "on", "persisted"):
+            settings.COUNTRIES_DOCUMENT_CACHE = {
+                **settings.COUNTRIES_DOCUMENT_CACHE,
+                "ENABLED": mode != "off",
+            }
+            document_cache.clear()
+            payloads = [
+                {"query": query, "variables": variables} for query, variables in QUERIES
+            ]
+            if mode == "persisted":
+                # Register the queries, then send only their hashes.
+                requests_per_second(
+                    client,
+                    [
+                        {**payload, "extensions": persisted_query(payload["query"])}
+                        for payload in payloads
+                    ],
+                    len(payloads),
+                )
+                payloads = [
+                    {
+                        "variables": payload["variables"],
+                        "extensions": persisted_query(payload["query"]),
+                    }
+                    for payload in payloads
+                ]
+            # Warm up the connection, the caches and the interpreter.
+            requests_per_second(client, payloads, 50)
+            rate = requests_per_second(client, payloads, args.requests)
+            results.append(
+                {
+                    "cache": mode,
+                    "countries": args.countries,
+                    "requests": args.requests,
+                    "requests_per_second": round(rate, 1),
+                }
+            )
+            print("{:>10} {:>10} {:>12.1f}".format(mode, args.requests, rate))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Memory and start-up time of worker processes sharing the read model file.
+
+A fresh database is filled with synthetic countries. For each mode and
+number of workers, that many processes are started at once, like the
+workers of a web server, and each serves a search and the currencies of the
+countries found from the read model:
+
+- ``in_process``: each worker reads the tables and builds its own model;
+- ``mapped``: each worker maps the file that the sync wrote (see
+  ``countries.mapped_model``).
+
+Each worker reports how long it took to be ready to serve, and the memory
+that is private to it (not shared with other processes) and its
+proportional share of all its memory, from ``/proc/self/smaps_rollup``,
+which makes this benchmark Linux-only:
+
+    python -m benchmarks.mapped_model --countries 100000 --workers 1 2 4
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, synthetic_rows
+
+MODES = ("in_process", "mapped")
+
+
+def memory_mb():
+    """The private memory and the PSS of this process, in MiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                values[name] = int(value.split()[0])
+    private = values["Private_Clean"] + values["Private_Dirty"]
+    return private / 1024, values["Pss"] / 1024
+
+
+def run_worker(mode, db_path, model_path):
+    """Serve from the model, print the figures, and wait for the parent."""
+    setup_django(db_path)
+    from django.conf import settings
+
+    from countries.read_model import read_models
+
+    settings.COUNTRIES_READ_MODEL = {
+        "ENABLED": True,
+        "FILE": model_path if mode == "mapped" else None,
+    }
+    private_before, _ = memory_mb()
+    start = time.perf_counter()
+    model = read_models.get()
+    countries = model.countries("Country 42")
+    for country in countries:
+        model.country_currencies(country["id"])
+    ready_ms = (time.perf_counter() - start) * 1000
+    private_after, pss = memory_mb()
+    print(
+        json.dumps(
+            {
+                "ready_ms": ready_ms,
+                "private_mb": private_after - private_before,
+                "pss_mb": pss,
+            }
+        ),
+        flush=True,
+    )
+    # Alive until every worker has measured, so that they share the pages.
+    sys.stdin.read()
+
+
+def run_workers(mode, count, db_path, model_path):
+    workers = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.mapped_model",
+                "--worker",
+                mode,
+                str(db_path),
+                str(model_path),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(count)
+    ]
+    results = [json.loads(worker.stdout.readline()) for worker in workers]
+    for worker in workers:
+        worker.stdin.close()
+        worker.wait()
+    return {
+        "mode": mode,
+        "workers": count,
+        "ready_ms": round(statistics.median(r["ready_ms"] for r in results), 1),
+        "private_mb": round(statistics.median(r["private_mb"] for r in results), 1),
+        "total_pss_mb": round(sum(r["pss_mb"] for r in results), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "bench.sqlite3"
+        model_path = Path(directory) / "read_model.bin"
+        setup_django(db_path)
+
+        from django.conf import settings
+        from django.test import TestCase
+
+        from countries.sync import sync_feeds
+
+        settings.COUNTRIES_READ_MODEL = {"ENABLED": True, "FILE": model_path}
+        countries, currencies = synthetic_rows(args.countries)
+        # The sync writes the file when it commits.
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            sync_feeds(list(countries), list(currencies))
+        file_mb = model_path.stat().st_size / 1024 / 1024
+        print("{} countries, a {:.1f} MB file.".format(args.countries, file_mb))
+
+        print(
+            "{:>10} {:>7} {:>9} {:>15} {:>13}".format(
+                "", "workers", "ready ms", "private MB each", "total PSS MB"
+            )
+        )
+        for mode in args.modes:
+            for count in args.workers:
+                result = run_workers(mode, count, db_path, model_path)
+                results.append(result)
+                print(
+                    "{mode:>10} {workers:>7} {ready_ms:>9} {private_mb:>15} "
+                    "{total_pss_mb:>13}".format(**result)
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"file_mb": round(file_mb, 1), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Cost of the metrics of ``/graphql/``, off, sampled and on every request.
+
+The requests go through Django's test client in this process. They are sent
+in short rounds that alternate between the modes, so that drift in the
+machine's speed affects them alike, and each mode is rated by its fastest
+round, the one least disturbed by everything else running. On a busy machine
+the differences between the modes can still be lost in the noise, so the
+cost of the middleware and of the SQL wrapper is also timed on its own, with
+a view that does nothing else:
+
+    python -m benchmarks.metrics_overhead --countries 1000 --requests 2000
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, synthetic_rows
+
+QUERY = """
+query Countries($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            name
+            symbol
+        }
+    }
+}
+"""
+
+MODES = {
+    "off": {"ENABLED": False},
+    "sampled": {"ENABLED": True},
+    "every": {"ENABLED": True, "RESOLVER_SAMPLE_RATE": 1.0},
+}
+
+
+def run(client, num_requests):
+    start = time.perf_counter()
+    for i in range(num_requests):
+        response = client.post(
+            "/graphql/",
+            {"query": QUERY, "variables": {"search": "Country {}".format(i % 100)}},
+            content_type="application/json",
+        )
+        assert response.status_code == 200, response.content
+    return (time.perf_counter() - start) / num_requests * 1000
+
+
+def request_metrics_ms(num_requests=20000, num_queries=2):
+    """What recording the metrics of one request costs, without the request."""
+    from types import SimpleNamespace
+
+    from django.http import JsonResponse
+
+    from countries import metrics
+
+    response = JsonResponse({"data": {"countries": []}})
+
+    def view(request):
+        for _ in range(num_queries):
+            metrics.record_sql(lambda *args: None, "", None, False, None)
+        return response
+
+    middleware = metrics.MetricsMiddleware(view)
+    request = SimpleNamespace(
+        method="POST", resolver_match=SimpleNamespace(url_name="graphql")
+    )
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        middleware(request)
+    return (time.perf_counter() - start) / num_requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(Path(directory) / "bench.sqlite3")
+
+        from django.conf import settings
+        from django.test import Client
+
+        from countries.sync import sync_feeds
+
+        # nplusone logs every unused prefetch, which is not what we measure.
+        logging.getLogger("nplusone").disabled = True
+        # The test client's host, which the test runner would otherwise allow.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        client = Client()
+        # The rate in the settings, for the sampled mode.
+        rate = settings.COUNTRIES_METRICS["RESOLVER_SAMPLE_RATE"]
+        per_round = max(args.requests // args.rounds, 1)
+        times = {mode: [] for mode in MODES}
+        run(client, 50)
+        for _ in range(args.rounds):
+            for mode, config in MODES.items():
+                settings.COUNTRIES_METRICS = {**settings.COUNTRIES_METRICS, **config}
+                times[mode].append(run(client, per_round))
+
+        request_metrics = request_metrics_ms()
+
+    baseline = min(times["off"])
+    results = []
+    print("{:>8} {:>10} {:>10}".format("metrics", "ms/request", "overhead"))
+    for mode in MODES:
+        fastest = min(times[mode])
+        overhead = (fastest - baseline) / baseline * 100
+        results.append(
+            {
+                "metrics": mode,
+                "countries": args.countries,
+                "requests": per_round * args.rounds,
+                "ms_per_request": round(fastest, 3),
+                "overhead_percent": round(overhead, 2),
+            }
+        )
+        print("{:>8} {:>10.3f} {:>9.2f}%".format(mode, fastest, overhead))
+
+    expected = request_metrics + rate * max(min(times["every"]) - baseline, 0)
+    print(
+        "Recording the metrics of a request alone takes {:.4f} ms; with the "
+        "resolvers timed in {:.0%} of the requests, the metrics should cost "
+        "{:.2f}% of a request.".format(request_metrics, rate, expected / baseline * 100)
+    )
+    results.append(
+        {
+            "metrics": "expected",
+            "request_metrics_ms": round(request_metrics, 4),
+            "resolver_sample_rate": rate,
+            "overhead_percent": round(expected / baseline * 100, 2),
+        }
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Throughput and peak memory of ``exportdata`` and ``importdata``.
+
+A throwaway database is filled with synthetic countries, which have one to
+five currencies each, so that a dump has about three links to every
+country. It is exported to a plain and a gzipped dump, and each dump
+is imported into a fresh database. Each export and import runs in a fresh
+subprocess so that its peak RSS is measured on its own; that it does not
+grow with the rows is what the chunks are for. The snapshot, which is
+rebuilt once an import commits as after any sync, is off. The peak of an
+export includes the pages of the database that the ``mmap_size`` pragma
+maps in, see countries/db.py. 250000 countries make about a million rows:
+
+    python -m benchmarks.ndjson --sizes 25000 250000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from benchmarks.common import peak_rss_mb, setup_django, synthetic_rows
+
+
+def run_child(command, db_path, dump_path):
+    setup_django(db_path)
+    from django.conf import settings
+    from django.core.management import call_command
+
+    # What is rebuilt once an import commits is the same as after any sync,
+    # and the snapshot holds every country in memory while it is built.
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    call_command(command, dump_path, stdout=StringIO())
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def child(command, db_path, dump_path):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ndjson", "--child"]
+        + [command, str(db_path), str(dump_path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def fill(db_path, size):
+    """Fill a fresh database at ``db_path`` and return its number of rows."""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ndjson", "--fill", str(size), str(db_path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_fill(size, db_path):
+    setup_django(db_path)
+    from django.db import transaction
+
+    from countries.models import Country, CountryCurrency, Currency
+    from countries.sync.stream import stream_sync
+
+    countries, currencies = synthetic_rows(size)
+    with transaction.atomic():
+        stream_sync(countries, currencies)
+    return sum(model.objects.count() for model in (Currency, Country, CountryCurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25000, 250000])
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--fill", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+    if args.fill:
+        print(json.dumps(run_fill(int(args.fill[0]), args.fill[1])))
+        return
+
+    results = []
+    print(
+        "{:>9} {:>10} {:>9} {:>8} {:>9} {:>12} {:>12} {:>9}".format(
+            "rows",
+            "command",
+            "dump",
+            "dump MB",
+            "seconds",
+            "rows/s",
+            "baseline MB",
+            "peak MB",
+        )
+    )
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / "source.sqlite3"
+            rows = fill(source, size)
+            for dump in ("ndjson", "ndjson.gz"):
+                dump_path = Path(directory) / "dump.{}".format(dump)
+                target = Path(directory) / "target-{}.sqlite3".format(dump)
+                for command, db_path in (
+                    ("exportdata", source),
+                    ("importdata", target),
+                ):
+                    result = {
+                        "rows": rows,
+                        "command": command,
+                        "dump": dump,
+                        **child(command, db_path, dump_path),
+                        "dump_mb": round(os.path.getsize(dump_path) / 2**20, 1),
+                    }
+                    result["rows_per_second"] = round(rows / result["seconds"])
+                    result["seconds"] = round(result["seconds"], 2)
+                    results.append(result)
+                    print(
+                        "{rows:>9} {command:>10} {dump:>9} {dump_mb:>8} "
+                        "{seconds:>9} {rows_per_second:>12} {baseline_rss_mb:>12} "
+                        "{peak_rss_mb:>9}".format(**result)
+                    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Latency of GraphQL reads while a sync is writing to the database.
+
+For each journal mode, a fresh database is filled with synthetic countries.
+Search queries are then sent through Django's test client, first with the
+database idle, then while another process syncs the whole dataset over and
+over, renaming every country each time. The result, snapshot and document
+caches are off, so that each read queries the database. With the rollback
+journal of SQLite's default ``delete`` mode, readers wait for the writer's
+commits; in ``wal`` mode, the default of ``COUNTRIES_DATABASE``, they should
+not.
+
+There are two writers. ``full`` runs ``sync_feeds`` back to back, which is
+busy on the CPU throughout. On a machine with fewer CPUs than processes the
+readers then slow down for lack of CPU, whatever the journal mode.
+``stream`` syncs with ``stream_sync`` and pauses after each chunk, as
+``syncdata --stream`` does while a slow feed downloads. It holds its write
+transaction open while mostly idle, so any slowdown of the readers comes
+from locking rather than from a lack of CPU:
+
+    python -m benchmarks.read_during_sync --countries 20000 --reads 500
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, synthetic_rows
+
+QUERY = """
+query Countries($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            name
+            symbol
+        }
+    }
+}
+"""
+
+MODES = ("delete", "wal")
+
+WRITERS = ("full", "stream")
+
+# Rows the stream writer syncs between pauses, and the pause in seconds.
+CHUNK_SIZE = 1000
+PAUSE = 1.0
+
+
+def setup(db_path, mode):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "codingtest.settings")
+    from django.conf import settings
+
+    config = settings.COUNTRIES_DATABASE
+    settings.COUNTRIES_DATABASE = {
+        **config,
+        "PRAGMAS": {**config["PRAGMAS"], "journal_mode": mode},
+    }
+    setup_django(db_path)
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    settings.COUNTRIES_RESULT_CACHE = {"ENABLED": False}
+    settings.COUNTRIES_DOCUMENT_CACHE = {"ENABLED": False}
+    # nplusone logs every unused prefetch, which is not what we measure.
+    logging.getLogger("nplusone").disabled = True
+    # The test client's host, which the test runner would otherwise allow.
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+
+def renamed_rows(num_countries, round_):
+    countries, currencies = synthetic_rows(num_countries)
+    countries = [
+        {**row, "name": "{} r{}".format(row["name"], round_)} for row in countries
+    ]
+    return countries, list(currencies)
+
+
+def paced(rows):
+    """Yield the rows, pausing after each chunk as a slow download would."""
+    for i, row in enumerate(rows, 1):
+        yield row
+        if i % CHUNK_SIZE == 0:
+            time.sleep(PAUSE)
+
+
+def run_writer(db_path, mode, writer, num_countries, stop_path):
+    """Sync until ``stop_path`` exists, then print the time of each sync."""
+    setup(db_path, mode)
+    from countries.sync import sync_feeds
+    from countries.sync.stream import stream_sync
+
+    syncs = []
+    print("ready", flush=True)
+    round_ = 0
+    while not os.path.exists(stop_path):
+        round_ += 1
+        countries, currencies = renamed_rows(num_countries, round_)
+        start = time.perf_counter()
+        if writer == "stream":
+            stream_sync(paced(countries), currencies, CHUNK_SIZE)
+        else:
+            sync_feeds(countries, currencies)
+        syncs.append(time.perf_counter() - start)
+    print(json.dumps(syncs), flush=True)
+
+
+def read(client, num_reads):
+    """Return the latency of each read, in ms, and the number of errors."""
+    latencies = []
+    errors = 0
+    for i in range(num_reads):
+        start = time.perf_counter()
+        response = client.post(
+            "/graphql/",
+            {"query": QUERY, "variables": {"search": "Country {} r".format(i)}},
+            content_type="application/json",
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200 or "errors" in response.json():
+            errors += 1
+    return latencies, errors
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "median_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+def run_child(mode, writer_kind, num_countries, num_reads):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "bench.sqlite3"
+        setup(db_path, mode)
+
+        from django.test import Client
+
+        from countries.sync import sync_feeds
+
+        sync_feeds(*renamed_rows(num_countries, 0))
+        # A read that times out waiting for a lock is an error, not a crash.
+        client = Client(raise_request_exception=False)
+        read(client, 20)
+        idle, idle_errors = read(client, num_reads)
+
+        stop_path = Path(directory) / "stop"
+        writer = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.read_during_sync",
+                "--writer",
+                mode,
+                writer_kind,
+                str(num_countries),
+                str(db_path),
+                str(stop_path),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert writer.stdout.readline().strip() == "ready"
+        # Until the first sync is under way.
+        time.sleep(0.5)
+        busy, busy_errors = read(client, num_reads)
+        stop_path.touch()
+        syncs = json.loads(writer.stdout.readline())
+        writer.wait()
+
+    return [
+        {
+            "mode": mode,
+            "writer": writer_kind,
+            "while": "idle",
+            "errors": idle_errors,
+            **summary(idle),
+        },
+        {
+            "mode": mode,
+            "writer": writer_kind,
+            "while": "syncing",
+            "errors": busy_errors,
+            "syncs": len(syncs),
+            "sync_s": round(statistics.median(syncs), 3),
+            **summary(busy),
+        },
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--writers", nargs="+", choices=WRITERS, default=WRITERS)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    parser.add_argument("--writer", nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        mode, writer, num_countries, db_path, stop_path = args.writer
+        run_writer(db_path, mode, writer, int(num_countries), stop_path)
+        return
+    if args.child:
+        mode, writer, num_countries, num_reads = args.child
+        print(json.dumps(run_child(mode, writer, int(num_countries), int(num_reads))))
+        return
+
+    results = []
+    print(
+        "{:>7} {:>7} {:>8} {:>10} {:>8} {:>8} {:>7} {:>6}".format(
+            "journal",
+            "writer",
+            "while",
+            "median ms",
+            "p95 ms",
+            "max ms",
+            "errors",
+            "syncs",
+        )
+    )
+    for writer in args.writers:
+        for mode in args.modes:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.read_during_sync",
+                    "--child",
+                    mode,
+                    writer,
+                    str(args.countries),
+                    str(args.reads),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            for result in json.loads(output.strip().splitlines()[-1]):
+                results.append(result)
+                print(
+                    "{mode:>7} {writer:>7} {while:>8} {median_ms:>10} {p95_ms:>8} "
+                    "{max_ms:>8} {errors:>7} {syncs:>6}".format(
+                        **{"syncs": "", **result}
+                    )
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Memory, rebuild time and resolver latency of the in-process read model.
+
+A fresh database is filled with synthetic countries, and the read model is
+built from it a few times. Its size is what ``tracemalloc`` sees allocated
+by the build and still held by the model. The resolvers of
+``Query.countries`` and ``Country.currencies`` are then timed with the model
+and through the ORM, with the result cache off:
+
+    python -m benchmarks.read_model --countries 100000
+"""
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.common import setup_django, synthetic_rows
+
+
+def best_of(function, repeat):
+    """The fastest of ``repeat`` calls, in milliseconds, and its result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def per_call_us(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(Path(directory) / "bench.sqlite3")
+
+        from django.conf import settings
+
+        from countries import read_model
+        from countries.loaders import Loaders
+        from countries.schema import resolve_countries, resolve_country_currencies
+        from countries.sync import sync_feeds
+
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        gc.collect()
+        tracemalloc.start()
+        model = read_model.load()
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        tracemalloc.stop()
+        rebuild_ms, model = best_of(read_model.load, args.repeat)
+
+        results = {
+            "countries": args.countries,
+            "memory_mb": round(memory_mb, 1),
+            "rebuild_ms": round(rebuild_ms, 1),
+        }
+
+        def info(**context):
+            return SimpleNamespace(
+                context=context, field_nodes=[], fragments={}, variable_values={}
+            )
+
+        settings.COUNTRIES_RESULT_CACHE = {"ENABLED": False}
+        term = "Country 4242"
+        for mode in ("read_model", "orm"):
+            settings.COUNTRIES_READ_MODEL = {"ENABLED": mode == "read_model"}
+            context = {"read_model": model} if mode == "read_model" else {}
+            search_ms, rows = best_of(
+                lambda: list(resolve_countries(None, info(**context), search=term)),
+                args.repeat * 5,
+            )
+            all_ms, everything = best_of(
+                lambda: list(resolve_countries(None, info(**context))), args.repeat
+            )
+            country = rows[0]
+
+            def currencies():
+                # A request's loaders cache what they loaded; start afresh.
+                resolve_country_currencies(country, info(**context, loaders=Loaders()))
+
+            results[mode] = {
+                "search_ms": round(search_ms, 3),
+                "search_rows": len(rows),
+                "all_ms": round(all_ms, 1),
+                "all_rows": len(everything),
+                "currencies_us": round(per_call_us(currencies, 2000), 2),
+            }
+
+    print(
+        "{countries} countries: the read model takes {memory_mb} MB and "
+        "{rebuild_ms} ms to rebuild.".format(**results)
+    )
+    print(
+        "{:>10} {:>10} {:>6} {:>10} {:>14}".format(
+            "", "search ms", "rows", "all ms", "currencies µs"
+        )
+    )
+    for mode in ("read_model", "orm"):
+        print(
+            "{:>10} {search_ms:>10} {search_rows:>6} {all_ms:>10} "
+            "{currencies_us:>14}".format(mode, **results[mode])
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
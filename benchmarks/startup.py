@@ -0,0 +1,155 @@
+"""
+How long a new instance takes to start and to answer its first request.
+
+For each settings profile, fresh processes are started one after another.
+Each loads the WSGI application, as a server would when it starts, and
+calls it with a search query, as the first request an instance started on
+demand would serve. Each reports the time to load the application, the time
+to answer, and the number of modules loaded; the total includes starting
+the interpreter. The database is a throwaway one with synthetic countries:
+
+    python -m benchmarks.startup --runs 10
+
+``codingtest.settings_api`` leaves out the apps and middleware that the API
+does not use. With both profiles the executable schema is built by the first
+request rather than at startup.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROFILES = ("codingtest.settings", "codingtest.settings_api")
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            symbol
+        }
+    }
+}
+"""
+
+
+def first_request(application):
+    """Call the WSGI ``application`` with a search, and return the status."""
+    from wsgiref.util import setup_testing_defaults
+
+    body = json.dumps({"query": QUERY, "variables": {"search": "Country 42"}}).encode()
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/graphql/",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return statuses[0]
+
+
+def run_child(profile, db_path):
+    """Load the application and serve one request, as a new instance would."""
+    start = time.perf_counter()
+    os.environ["DJANGO_SETTINGS_MODULE"] = profile
+    from django.conf import settings
+
+    for database in settings.DATABASES.values():
+        database["NAME"] = db_path
+    settings.CACHES["countries"]["LOCATION"] = str(Path(db_path).parent / "cache")
+
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    loaded = time.perf_counter()
+    status = first_request(application)
+    answered = time.perf_counter()
+    assert status.startswith("200"), status
+    return {
+        "load_ms": (loaded - start) * 1000,
+        "first_response_ms": (answered - loaded) * 1000,
+        "modules": len(sys.modules),
+    }
+
+
+def run_profile(profile, db_path, runs):
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child", profile, db_path],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        total_ms = (time.perf_counter() - start) * 1000
+        results.append(
+            {**json.loads(output.strip().splitlines()[-1]), "total_ms": total_ms}
+        )
+    return {
+        "profile": profile,
+        **{
+            name: round(statistics.median(result[name] for result in results), 1)
+            for name in ("load_ms", "first_response_ms", "total_ms")
+        },
+        "modules": results[-1]["modules"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--countries", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", default=PROFILES)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    # Only here, so that the children do not import what this needs.
+    from benchmarks.common import setup_django, synthetic_rows
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "bench.sqlite3"
+        setup_django(db_path)
+        from countries.sync import sync_feeds
+
+        countries, currencies = synthetic_rows(args.countries)
+        sync_feeds(list(countries), list(currencies))
+
+        print(
+            "{:>25} {:>8} {:>15} {:>9} {:>8}".format(
+                "", "load ms", "first reply ms", "total ms", "modules"
+            )
+        )
+        for profile in args.profiles:
+            result = run_profile(profile, str(db_path), args.runs)
+            results.append(result)
+            print(
+                "{profile:>25} {load_ms:>8} {first_response_ms:>15} {total_ms:>9} "
+                "{modules:>8}".format(**result)
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
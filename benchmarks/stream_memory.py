@@ -0,0 +1,103 @@
+"""
+Peak memory of ``syncdata`` with and without ``--stream``.
+
+Each run happens in a fresh subprocess so that its peak RSS is measured on
+its own. The snapshot of ``countries.snapshot``, which is rebuilt once a
+sync commits, is off, as its peak does not depend on the mode:
+
+    python -m benchmarks.stream_memory --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from benchmarks.common import peak_rss_mb, serve_directory, setup_django, write_feeds
+
+
+def run_child(size, mode):
+    with tempfile.TemporaryDirectory() as directory:
+        write_feeds(directory, size)
+        server, base_url = serve_directory(directory)
+        setup_django(Path(directory) / "bench.sqlite3")
+
+        from django.conf import settings
+        from django.core.management import call_command
+
+        # The snapshot is rebuilt once the sync commits and holds every
+        # country in memory while it is built, whichever mode synced.
+        settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+
+        args = [base_url + "countries.json", base_url + "currencies.json"]
+        if mode == "stream":
+            args.append("--stream")
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        call_command("syncdata", *args, "--retries", "0", stdout=StringIO())
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+    return {
+        "rows": size,
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--modes", nargs="+", choices=["stream", "full"], default=["stream", "full"]
+    )
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(int(args.child[0]), args.child[1])))
+        return
+
+    results = []
+    print(
+        "{:>9} {:>7} {:>9} {:>12} {:>12}".format(
+            "rows", "mode", "seconds", "baseline MB", "peak MB"
+        )
+    )
+    for size in args.sizes:
+        for mode in args.modes:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.stream_memory",
+                    "--child",
+                    str(size),
+                    mode,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                "{rows:>9} {mode:>7} {seconds:>9} {baseline_rss_mb:>12} "
+                "{peak_rss_mb:>12}".format(**result)
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
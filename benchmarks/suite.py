@@ -0,0 +1,346 @@
+"""
+Timings of the countries query and of ``syncdata`` on synthetic datasets.
+
+For each size, a fresh database is filled by syncing synthetic feeds (one to
+five currencies per country) from a local feed server, in a subprocess of
+its own. The suite measures:
+
+- ``sync``: ``sync_data`` for a cold load into the empty database, a no-op
+  run (answered with 304s), a forced no-op run (the feeds are downloaded and
+  compared) and a run after 1% of the countries changed.
+- ``resolver``: ``resolve_countries`` on its own, with and without
+  ``search``.
+- ``execute``: the whole query, currencies included, through the executor.
+- ``http``: a ``/graphql/`` round trip through the test client.
+
+Each query measurement is repeated after a warm-up, and reports the fastest
+and the median run along with the number of SQL queries. Write the results
+with ``--json`` and pass that file to ``--compare`` on a later version to
+see what got slower:
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 --json before.json
+    python -m benchmarks.suite --sizes 1000 10000 100000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from benchmarks.common import (
+    serve_directory,
+    setup_django,
+    synthetic_rows,
+    write_feeds,
+    write_json_array,
+)
+
+QUERY = """
+query Countries($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            name
+            symbol
+        }
+    }
+}
+"""
+
+# The unfiltered query as clients send it, without variables.
+FULL_QUERY = "{ countries { name symbol currencies { name symbol } } }"
+
+SEARCH = "Country 12"
+
+
+def write_delta(directory, num_countries, fraction=0.01, seed=0):
+    """
+    Rewrite the countries feed with ``fraction`` of the countries changed:
+    half of them renamed and half given other currencies.
+    """
+    countries, _ = synthetic_rows(num_countries, seed)
+    step = max(int(1 / fraction), 1)
+
+    def changed():
+        for i, country in enumerate(countries):
+            if i % step == 0:
+                if i // step % 2:
+                    country["name"] += " (renamed)"
+                else:
+                    country["currencies"] = country["currencies"][1:] or ["Y0000000"]
+            yield country
+
+    path = os.path.join(directory, "countries.json")
+    write_json_array(path, changed())
+    # Newer than the Last-Modified the last sync saw, even within a second.
+    mtime = time.time() + 2
+    os.utime(path, (mtime, mtime))
+
+
+def count_queries(function):
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    # Reads and writes go through different connections.
+    with ExitStack() as stack:
+        captured = [
+            stack.enter_context(CaptureQueriesContext(connection))
+            for connection in connections.all()
+        ]
+        result = function()
+    return result, sum(len(queries) for queries in captured)
+
+
+def measure(function, repeat):
+    """Time ``function`` after a warm-up run; times are in milliseconds."""
+    _, num_queries = count_queries(function)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(times), 2),
+        "median_ms": round(statistics.median(times), 2),
+        "queries": num_queries,
+    }
+
+
+def measure_sync(urls, force=False):
+    from countries.management.commands.syncdata import sync_data
+    from countries.sync import FetchConfig
+
+    start = time.perf_counter()
+    report, num_queries = count_queries(
+        lambda: sync_data(*urls, FetchConfig(retries=0), force=force)
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    return {
+        "min_ms": round(elapsed, 2),
+        "median_ms": round(elapsed, 2),
+        "queries": num_queries,
+        "rows_touched": report.total,
+        "skipped": report.skipped,
+    }
+
+
+def countries_info(schema, search):
+    """The resolve info ``resolve_countries`` gets for ``QUERY``."""
+    from graphql import MiddlewareManager
+
+    from countries.documents import graphql_sync
+
+    captured = {}
+
+    def capture(next_, root, info, **kwargs):
+        if info.field_name == "countries":
+            captured["info"] = info
+        return next_(root, info, **kwargs)
+
+    graphql_sync(
+        schema,
+        {"query": QUERY, "variables": {"search": search}},
+        context_value={},
+        middleware=MiddlewareManager(capture),
+    )
+    return captured["info"]
+
+
+def execute(schema, search):
+    from countries.documents import graphql_sync
+    from countries.loaders import LoaderExecutionContext
+
+    success, result = graphql_sync(
+        schema,
+        {"query": QUERY, "variables": {"search": search}},
+        context_value={},
+        execution_context_class=LoaderExecutionContext,
+    )
+    assert success and "errors" not in result, result
+
+
+def post(client, data):
+    response = client.post("/graphql/", data, content_type="application/json")
+    assert response.status_code == 200, response.content
+
+
+def run_child(size, repeat):
+    results = []
+
+    def record(group, name, result):
+        results.append({"countries": size, "group": group, "name": name, **result})
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        feeds = directory / "feeds"
+        feeds.mkdir()
+        write_feeds(feeds, size)
+        server, base_url = serve_directory(feeds)
+        setup_django(directory / "bench.sqlite3")
+
+        import logging
+
+        from django.conf import settings
+        from django.test import Client
+
+        from countries.schema import resolve_countries, schema
+
+        # nplusone logs every unused prefetch, which is not what we measure.
+        logging.getLogger("nplusone").disabled = True
+        # The test client's host, which the test runner would otherwise allow.
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        urls = (base_url + "countries.json", base_url + "currencies.json")
+        record("sync", "cold", measure_sync(urls))
+        record("sync", "noop", measure_sync(urls))
+        record("sync", "noop_forced", measure_sync(urls, force=True))
+        write_delta(feeds, size)
+        record("sync", "delta_1pct", measure_sync(urls))
+        server.shutdown()
+
+        for name, search in (("all", None), ("search", SEARCH)):
+            info = countries_info(schema, search)
+            record(
+                "resolver",
+                name,
+                measure(
+                    lambda: list(resolve_countries(None, info, search=search)), repeat
+                ),
+            )
+            record("execute", name, measure(lambda: execute(schema, search), repeat))
+
+        client = Client()
+        record(
+            "http", "all", measure(lambda: post(client, {"query": FULL_QUERY}), repeat)
+        )
+        record(
+            "http",
+            "search",
+            measure(
+                lambda: post(client, {"query": QUERY, "variables": {"search": SEARCH}}),
+                repeat,
+            ),
+        )
+    return results
+
+
+def environment():
+    import django
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print how the results differ from ``baseline``; return the regressions."""
+    before = {
+        (result["countries"], result["group"], result["name"]): result
+        for result in baseline["results"]
+    }
+    regressions = []
+    print()
+    print(
+        "{:>8} {:>9} {:>12} {:>12} {:>12} {:>8}".format(
+            "rows", "group", "name", "before ms", "after ms", "ratio"
+        )
+    )
+    for result in results:
+        key = (result["countries"], result["group"], result["name"])
+        if key not in before:
+            continue
+        old = before[key]["median_ms"]
+        ratio = result["median_ms"] / old if old else 1
+        slower = ratio > 1 + tolerance or result["queries"] > before[key]["queries"]
+        if slower:
+            regressions.append(key)
+        print(
+            "{:>8} {:>9} {:>12} {:>12} {:>12} {:>8.2f}{}".format(
+                *key, old, result["median_ms"], ratio, " !" if slower else ""
+            )
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument(
+        "--compare", help="Compare with the results written by an earlier run."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown of the median, as a fraction, that --compare accepts.",
+    )
+    parser.add_argument("--child", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    results = []
+    print(
+        "{:>8} {:>9} {:>12} {:>10} {:>10} {:>8}".format(
+            "rows", "group", "name", "min ms", "median ms", "queries"
+        )
+    )
+    for size in args.sizes:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.suite",
+                "--child",
+                str(size),
+                str(args.repeat),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        for result in json.loads(output.strip().splitlines()[-1]):
+            results.append(result)
+            print(
+                "{countries:>8} {group:>9} {name:>12} {min_ms:>10} {median_ms:>10} "
+                "{queries:>8}".format(**result)
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
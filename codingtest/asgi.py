@@ -2,6 +2,10 @@
 ASGI config for codingtest project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+GraphQL is served by the async view, see ``COUNTRIES_GRAPHQL_ASYNC``. Run it
+with e.g.
+
+    uvicorn codingtest.asgi:application --workers 2
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "codingtest.settings")
+os.environ.setdefault("COUNTRIES_GRAPHQL_ASYNC", "1")
 
 application = get_asgi_application()
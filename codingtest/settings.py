@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import logging
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, to time the other middleware too.
+    "countries.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -81,9 +84,20 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "CONN_MAX_AGE": 600,
+    },
+    # The same database, read only, for the GraphQL endpoint. See
+    # countries/db.py.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["countries.db.ReadReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -126,6 +140,117 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# "countries" holds the data generation token that syncdata replaces, and
+# what is keyed by it, so it must be shared with the syncdata process.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "countries": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+    },
+}
+
+# Cache for the results of the countries query, see countries/cache.py.
+# ALIAS must name a cache shared with the process that runs syncdata (e.g.
+# the file-based backend) for the web server to see its changes at once.
+
+COUNTRIES_RESULT_CACHE = {
+    "ENABLED": False,
+    "ALIAS": "countries",
+    "MAX_ENTRIES": 256,
+    "TIMEOUT": 300,
+}
+
+# In-process read model serving the countries query and the currencies of
+# countries without the ORM, see countries/read_model.py. It is rebuilt
+# when the generation token in COUNTRIES_RESULT_CACHE["ALIAS"] changes, and
+# written to FILE, which every process maps into memory, see
+# countries/mapped_model.py.
+
+COUNTRIES_READ_MODEL = {
+    "ENABLED": False,
+    "FILE": BASE_DIR / "read_model.bin",
+}
+
+# Cache of parsed and validated GraphQL documents, and persisted queries, see
+# countries/documents.py. ALIAS stores the texts of persisted queries and
+# must be shared by all the web server processes, as "countries" is.
+
+COUNTRIES_DOCUMENT_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 512,
+    "PERSISTED_QUERIES": True,
+    "ALIAS": "countries",
+    "TIMEOUT": None,
+}
+
+# Pre-rendered responses to the unfiltered countries query, see
+# countries/snapshot.py. They are stored in the cache of
+# COUNTRIES_RESULT_CACHE["ALIAS"], whether or not that cache is enabled.
+
+COUNTRIES_SNAPSHOT = {
+    "ENABLED": True,
+    "GZIP_LEVEL": 9,
+}
+
+# Serve /graphql/ with the async view and resolvers. codingtest/asgi.py turns
+# this on; under WSGI the sync view does less work per request.
+
+COUNTRIES_GRAPHQL_ASYNC = os.environ.get("COUNTRIES_GRAPHQL_ASYNC") == "1"
+
+# ETags and Cache-Control for queries sent with GET, see
+# countries/http_cache.py. The ETags change with the generation token in
+# COUNTRIES_RESULT_CACHE["ALIAS"].
+
+COUNTRIES_HTTP_CACHE = {
+    "ENABLED": True,
+    "MAX_AGE": 60,
+}
+
+# Request, SQL and resolver metrics of /graphql/, served at /metrics, see
+# countries/metrics.py. Resolvers are only timed in a sample of the requests.
+
+COUNTRIES_METRICS = {
+    "ENABLED": True,
+    "RESOLVER_SAMPLE_RATE": 0.01,
+}
+
+# Aliases of the database router and pragmas of every SQLite connection, see
+# countries/db.py.
+
+COUNTRIES_DATABASE = {
+    "READ_ALIAS": "replica",
+    "WRITE_ALIAS": "default",
+    "PRAGMAS": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16 * 1024,
+    },
+}
+
+# Limits on the estimated cost and the depth of GraphQL queries, see
+# countries/cost.py. Clear the document cache after changing them.
+
+COUNTRIES_QUERY_COST = {
+    "ENABLED": True,
+    "MAX_COST": 50000,
+    "MAX_DEPTH": 10,
+}
+
+# Batches of GraphQL operations POSTed as a JSON array, see
+# countries/batching.py.
+
+COUNTRIES_BATCH = {
+    "ENABLED": True,
+    "MAX_OPERATIONS": 20,
+}
+
 # Extra logging
 
 NPLUSONE_LOGGER = logging.getLogger("nplusone")
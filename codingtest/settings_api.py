@@ -0,0 +1,46 @@
+"""
+Settings for an instance that only serves the API.
+
+The default settings install the admin, sessions, authentication, messages,
+static files and nplusone, with their middleware, none of which the GraphQL
+endpoint and the metrics use. Leaving them out makes an instance start and
+answer its first request sooner, which matters when instances are started
+on demand. Run it with e.g.
+
+    DJANGO_SETTINGS_MODULE=codingtest.settings_api gunicorn codingtest.wsgi
+
+See benchmarks/startup.py for how long each profile takes to start.
+``syncdata`` and ``migrate`` work with these settings too.
+"""
+from codingtest.settings import *  # noqa: F401, F403
+
+INSTALLED_APPS = [
+    # For the template of the playground.
+    "ariadne_django",
+    "countries",
+]
+
+MIDDLEWARE = [
+    # First, to time the other middleware too.
+    "countries.metrics.MetricsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.request",
+            ],
+        },
+    },
+]
+
+AUTH_PASSWORD_VALIDATORS = []
+
+# Nothing the API answers is translated.
+USE_I18N = False
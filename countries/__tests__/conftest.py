@@ -1,5 +1,11 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 from django.conf import settings
+from django.core.cache import caches
 
 
 @pytest.fixture(scope="session")
@@ -11,3 +17,87 @@ def django_db_setup():
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": settings.BASE_DIR / "db.sqlite3",
     }
+
+
+@pytest.fixture(autouse=True)
+def test_caches(settings):
+    """
+    Keep the caches in memory, and empty them: entries stored by earlier
+    tests outlive their database changes.
+    """
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "default-test",
+        },
+        "countries": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "countries-test",
+        },
+    }
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        responses = self.server.routes.get(self.path)
+        if not responses:
+            self.send_error(404)
+            return
+        # Each route is a list of responses that are served in turn; the
+        # last one keeps being served once the others are used up.
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        time.sleep(response.get("delay", 0))
+        headers = response.get("headers", {})
+        if ("ETag" in headers 
+                and self.headers.get("If-None-Match") == headers["ETag"]):
+            self.send_response(304)
+            self.send_header("ETag", headers["ETag"])
+            self.end_headers()
+            return
+        body = response.get("body", b"")
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(response.get("status", 200))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FeedServer:
+    """A local stand-in for the mock API."""
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        self.httpd.routes = {}
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                        args=(0.05,), daemon=True)
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.httpd.server_port, path)
+
+    def add(self, path, *responses):
+        self.httpd.routes[path] = list(responses)
+        return self.url(path)
+
+
+@pytest.fixture
+def feed_server():
+    server = FeedServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from django.urls import path
+
+from countries import http_cache, snapshot
+from countries.read_model import read_models
+from countries.schema import async_schema
+from countries.views import AsyncGraphQLView
+
+from test_graphql import GRAPHQL_URL
+from test_loaders import NESTED
+
+# The async resolvers query from worker threads, which do not see the
+# transaction of the test, so only read the data.
+pytestmark = [pytest.mark.django_db, pytest.mark.urls("test_async")]
+
+urlpatterns = [
+    path("graphql/", AsyncGraphQLView.as_view(schema=async_schema), name="graphql"),
+]
+
+
+def post_async(query, **variables):
+    async def post():
+        return await AsyncClient().post(
+            GRAPHQL_URL,
+            {"query": query, "variables": variables},
+            content_type="application/json",
+        )
+
+    response = async_to_sync(post)()
+    return response.status_code, json.loads(response.content)
+
+
+def test_async_view_matches_sync_view(settings):
+    settings.ROOT_URLCONF = "codingtest.urls"
+    response = Client().post(
+        GRAPHQL_URL,
+        {"query": NESTED, "variables": {"search": "aus"}},
+        content_type="application/json",
+    )
+    expected = response.json()
+    settings.ROOT_URLCONF = "test_async"
+
+    assert post_async(NESTED, search="aus") == (200, expected)
+
+
+def test_async_connection():
+    query = """
+    query($after: String) {
+        countriesConnection(first: 2, after: $after) {
+            totalCount
+            edges { node { name currencies { symbol } } }
+            pageInfo { endCursor }
+        }
+    }
+    """
+    status, first = post_async(query)
+    assert status == 200
+    status, second = post_async(
+        query, after=first["data"]["countriesConnection"]["pageInfo"]["endCursor"]
+    )
+    names = [
+        edge["node"]["name"]
+        for page in (first, second)
+        for edge in page["data"]["countriesConnection"]["edges"]
+    ]
+    assert names == ["Afghanistan", "Albania", "Algeria", "American Samoa"]
+    assert second["data"]["countriesConnection"]["totalCount"] > 4
+
+
+def test_async_validation_error():
+    status, result = post_async("{ countries { population } }")
+    assert status == 400
+    assert "population" in result["errors"][0]["message"]
+
+
+def test_async_get_if_none_match():
+    async def get(**headers):
+        return await AsyncClient().get(
+            GRAPHQL_URL,
+            {"query": NESTED, "variables": json.dumps({"search": "aus"})},
+            **headers,
+        )
+
+    response = async_to_sync(get)()
+    assert response.status_code == 200
+    assert response.json()["data"]["countries"]
+    # AsyncClient takes headers by their names.
+    response = async_to_sync(get)(**{"If-None-Match": response["ETag"]})
+    assert response.status_code == 304
+
+
+def test_async_read_model(settings):
+    expected = post_async(NESTED, search="aus")
+    settings.COUNTRIES_READ_MODEL = {"ENABLED": True}
+    read_models.clear()
+    try:
+        assert post_async(NESTED, search="aus") == expected
+    finally:
+        read_models.clear()
+
+
+def test_async_view_does_not_block_the_loop(monkeypatch):
+    # Whether each call ran in the thread of the event loop.
+    on_loop = []
+
+    def recorded(function):
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return function(*args, **kwargs)
+
+        return call
+
+    monkeypatch.setattr(http_cache, "etag", recorded(http_cache.etag))
+    monkeypatch.setattr(
+        snapshot, "request_selection", recorded(snapshot.request_selection)
+    )
+
+    async def requests():
+        client = AsyncClient()
+        await client.get(GRAPHQL_URL, {"query": "{ countries { name } }"})
+        await client.post(
+            GRAPHQL_URL, {"query": NESTED}, content_type="application/json"
+        )
+        await client.post(
+            GRAPHQL_URL,
+            [{"query": NESTED}, {"query": "{ countries { name } }"}],
+            content_type="application/json",
+        )
+
+    async_to_sync(requests)()
+    assert on_loop == [False] * 5
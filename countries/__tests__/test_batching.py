@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+SEARCH = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            symbol
+        }
+    }
+}
+"""
+
+NAMES = """
+query($search: String) {
+    countries(search: $search) {
+        name
+    }
+}
+"""
+
+
+def operation(search, query=SEARCH):
+    return {"query": query, "variables": {"search": search}}
+
+
+def post(data):
+    return Client().post(GRAPHQL_URL, data, content_type="application/json")
+
+
+def test_batch_matches_separate_requests(
+    django_assert_num_queries, django_assert_max_num_queries
+):
+    operations = [operation("aus"), operation("gbr"), operation("zzz")]
+    with django_assert_max_num_queries(6):
+        expected = [post(data).json() for data in operations]
+
+    # One query per search, and one for the currencies of every operation.
+    with django_assert_num_queries(4):
+        response = post(operations)
+    assert response.status_code == 200
+    assert response.json() == expected
+
+
+def test_batch_executes_repeated_operations_once(django_assert_num_queries):
+    operations = [operation("aus"), operation("AUS", NAMES), operation("aus")]
+    with django_assert_num_queries(2):
+        results = post(operations).json()
+    assert results[0] == results[2]
+    assert [country["name"] for country in results[1]["data"]["countries"]] == [
+        "Australia",
+        "Austria",
+    ]
+
+
+def test_batch_reports_errors_per_operation():
+    operations = [
+        operation("aus"),
+        {"query": "{ countries { population } }"},
+        {"query": "{ countries(search: "},
+        "not an operation",
+    ]
+    response = post(operations)
+    assert response.status_code == 200
+    first, *failed = response.json()
+    assert first["data"]["countries"][0]["symbol"] == "AUS"
+    assert all(result["errors"] and "data" not in result for result in failed)
+
+
+def test_batch_includes_snapshots():
+    full = {"query": "{ countries { name symbol currencies { name symbol } } }"}
+    expected = post(full).json()
+    [result, searched] = post([full, operation("aus")]).json()
+    assert result == expected
+    assert searched["data"]["countries"][0]["symbol"] == "AUS"
+
+
+@pytest.mark.parametrize("operations", [[], [operation("aus")] * 3])
+def test_batch_size_is_limited(settings, operations):
+    settings.COUNTRIES_BATCH = {"MAX_OPERATIONS": 2}
+    assert post(operations).status_code == 400
+
+
+def test_batch_disabled(settings):
+    settings.COUNTRIES_BATCH = {"ENABLED": False}
+    response = post([operation("aus")])
+    assert response.status_code == 400
+
+
+def test_async_batch(settings):
+    operations = [operation("aus"), operation("gbr"), operation("aus")]
+    expected = post(operations).json()
+
+    async def post_async():
+        return await AsyncClient().post(
+            GRAPHQL_URL, operations, content_type="application/json"
+        )
+
+    # The async view of test_async.
+    settings.ROOT_URLCONF = "test_async"
+    response = async_to_sync(post_async)()
+    assert response.status_code == 200
+    assert json.loads(response.content) == expected
@@ -0,0 +1,123 @@
+import pytest
+
+from django.core.cache import caches
+from django.test import Client, TestCase
+from countries.cache import result_cache
+from countries.models import Country
+from countries.sync import sync_feeds
+
+from test_graphql import GRAPHQL_URL
+from test_syncdata import feeds_from_db
+
+pytestmark = [pytest.mark.django_db]
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            name
+            symbol
+        }
+    }
+}
+"""
+
+
+@pytest.fixture
+def result_cache_settings(settings, tmp_path):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "countries-test",
+        },
+        "files": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+        },
+    }
+    settings.COUNTRIES_RESULT_CACHE = {
+        "ENABLED": True,
+        "ALIAS": "default",
+        "MAX_ENTRIES": 16,
+        "TIMEOUT": 300,
+    }
+    # Results stored by earlier tests outlive their database changes.
+    caches["default"].clear()
+    result_cache.local.clear()
+    result_cache.reset_stats()
+    yield settings.COUNTRIES_RESULT_CACHE
+    result_cache.local.clear()
+    result_cache.reset_stats()
+
+
+def query_countries(search=None):
+    response = Client().post(
+        GRAPHQL_URL,
+        {"query": QUERY, "variables": {"search": search}},
+        content_type="application/json",
+    )
+    assert response.json().get("errors") is None
+    return response.json()["data"]["countries"]
+
+
+def test_cache_hits(result_cache_settings, django_assert_num_queries, settings):
+    with django_assert_num_queries(2):
+        first = query_countries("aus")
+    with django_assert_num_queries(0):
+        assert query_countries("aus") == first
+    # Case does not change the results, so it does not change the key.
+    with django_assert_num_queries(0):
+        assert query_countries("AUS") == first
+    with django_assert_num_queries(2):
+        query_countries()
+
+    # The statistics are only served in DEBUG.
+    assert Client().get("/cache-stats/").status_code == 404
+    settings.DEBUG = True
+    stats = Client().get("/cache-stats/").json()
+    assert stats["local_hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+def test_cache_follows_data_changes(result_cache_settings, django_assert_num_queries):
+    assert [c["symbol"] for c in query_countries("aus")] == ["AUS", "AUT"]
+
+    countries_list, currencies_list = feeds_from_db()
+    countries_list = [c for c in countries_list if c["code"] != "AUT"]
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        sync_feeds(countries_list, currencies_list)
+
+    with django_assert_num_queries(2):
+        assert [c["symbol"] for c in query_countries("aus")] == ["AUS"]
+
+    # Saving through the ORM changes the generation as well.
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        Country.objects.filter(symbol="AUS").get().delete()
+    assert query_countries("aus") == []
+
+
+def test_cache_lru_eviction(result_cache_settings):
+    result_cache_settings["MAX_ENTRIES"] = 2
+    result_cache_settings["ALIAS"] = "files"
+    for term in ("aus", "gbr", "ind"):
+        query_countries(term)
+    assert len(result_cache.local) == 2
+
+    # "aus" was evicted locally but is still in the shared file cache.
+    query_countries("aus")
+    assert result_cache.shared_hits == 1
+    assert result_cache.misses == 3
+
+
+def test_cache_shared_between_processes(result_cache_settings):
+    # Without the local level every hit comes from the file-based cache,
+    # as it would in another worker process.
+    result_cache_settings["MAX_ENTRIES"] = 0
+    result_cache_settings["ALIAS"] = "files"
+    first = query_countries()
+    assert query_countries() == first
+    assert result_cache.shared_hits == 1
+    assert len(result_cache.local) == 0
@@ -0,0 +1,137 @@
+import pytest
+
+from django.test import Client
+from graphql import parse
+from countries import cost
+from countries.documents import document_cache
+from countries.schema import schema
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+ALIASED = "{{ {} }}".format(
+    " ".join(
+        "c{}: countries {{ name currencies {{ name }} }}".format(i) for i in range(40)
+    )
+)
+
+
+@pytest.fixture
+def cost_settings(settings):
+    settings.COUNTRIES_QUERY_COST = {
+        "ENABLED": True,
+        "MAX_COST": 50000,
+        "MAX_DEPTH": 10,
+    }
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    document_cache.clear()
+    cost.estimates.clear()
+    yield settings.COUNTRIES_QUERY_COST
+    document_cache.clear()
+    cost.estimates.clear()
+
+
+def post(query, **variables):
+    return Client().post(
+        GRAPHQL_URL,
+        {"query": query, "variables": variables},
+        content_type="application/json",
+    )
+
+
+def query_cost(query):
+    return cost.operation_cost(schema, parse(query))
+
+
+def test_cost_in_extensions(cost_settings):
+    response = post('{ countries(search: "aus") { name } }')
+
+    assert response.status_code == 200
+    assert response.json()["extensions"] == {
+        "cost": {"estimated": 500, "maximum": 50000, "depth": 2}
+    }
+
+
+def test_aliased_query_rejected_before_execution(
+    cost_settings, django_assert_num_queries
+):
+    with django_assert_num_queries(0):
+        response = post(ALIASED)
+
+    [error] = response.json()["errors"]
+    assert "data" not in response.json()
+    # The estimate stops at the alias that takes it over the maximum.
+    assert error["message"] == (
+        "The query costs at least 51000, more than the maximum of 50000."
+    )
+    assert error["extensions"] == {
+        "code": "QUERY_COST_EXCEEDED",
+        "cost": 51000,
+        "maxCost": 50000,
+    }
+
+
+def test_deep_query_rejected(cost_settings):
+    cost_settings["MAX_COST"] = 10**12
+    query = "{ countries { currencies { countries { currencies { countries "
+    query += "{ currencies { countries { currencies { countries { currencies "
+    query += "{ name } } } } } } } } } } }"
+
+    [error] = post(query).json()["errors"]
+    assert error["extensions"]["code"] == "QUERY_DEPTH_EXCEEDED"
+    assert error["extensions"]["depth"] == 11
+
+
+def test_page_sizes():
+    page = "{ countriesConnection(first: %d) { edges { node { name } } totalCount } }"
+    # The connection, the edges with their nodes, and the total count.
+    assert query_cost(page % 5) == cost.QueryCost(1 + 5 * 3 + 1, 4)
+    assert query_cost(page % 1000).cost == 1 + 100 * 3 + 1
+    assert query_cost("{ countriesConnection { totalCount } }").cost == 2
+
+    variable = "query($first: Int{}) {{ countriesConnection(first: $first) {{ edges "
+    variable += "{{ cursor }} }} }}"
+    assert query_cost(variable.format(" = 5")).cost == 1 + 5 * 2
+    assert query_cost(variable.format("")).cost == 1 + 100 * 2
+
+
+def test_fragments():
+    query = """
+    { countries { ...Names } }
+    fragment Names on Country { name currencies { ...CurrencyName } }
+    fragment CurrencyName on Currency { name }
+    """
+    assert query_cost(query) == query_cost("{ countries { name currencies { name } } }")
+    assert query_cost(query) == cost.QueryCost(250 * (1 + 1 + 2 * 2), 3)
+    assert query_cost("{ __typename countries { __typename name } }").cost == 500
+
+
+def test_chained_fragments_rejected(cost_settings, monkeypatch):
+    # Each fragment spreads the next twice: 2 ** 40 names if walked naively.
+    query = "{ countries { ...F0 } }"
+    for i in range(40):
+        query += " fragment F{} on Country {{ ...F{} ...F{} }}".format(i, i + 1, i + 1)
+    query += " fragment F40 on Country { name }"
+
+    walk = cost._Estimator.selection_set
+    walks = []
+
+    def counted(*args):
+        walks.append(args)
+        assert len(walks) < 1000, "the fragments are walked again each time"
+        return walk(*args)
+
+    monkeypatch.setattr(cost._Estimator, "selection_set", counted)
+    [error] = post(query).json()["errors"]
+    assert error["extensions"]["code"] == "QUERY_COST_EXCEEDED"
+    assert error["extensions"]["cost"] > cost_settings["MAX_COST"]
+
+
+def test_cost_disabled(cost_settings):
+    cost_settings["ENABLED"] = False
+    response = post(ALIASED)
+
+    assert response.status_code == 200
+    assert "extensions" not in response.json()
+    assert len(response.json()["data"]) == 40
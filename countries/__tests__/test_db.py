@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from django.db import OperationalError, connections
+from countries.db import ReadReplicaRouter, in_worker_thread
+from countries.models import Country
+
+pytestmark = [pytest.mark.django_db]
+
+
+def in_thread(function):
+    # Outside of the test's transaction, on connections of another thread.
+    def run():
+        try:
+            return function()
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(run).result()
+
+
+def test_reads_go_to_replica_outside_transactions():
+    router = ReadReplicaRouter()
+    assert in_thread(lambda: router.db_for_read(Country)) == "replica"
+    assert in_thread(lambda: Country.objects.all()[:1].get()._state.db) == "replica"
+    # Within a transaction, reads see what it wrote.
+    assert router.db_for_read(Country) == "default"
+    assert router.db_for_write(Country) == "default"
+    assert not router.allow_migrate("replica", "countries")
+
+
+def test_replica_is_read_only():
+    def write():
+        with connections["replica"].cursor() as cursor:
+            cursor.execute("UPDATE countries_country SET name = name")
+
+    with pytest.raises(OperationalError, match="readonly"):
+        in_thread(write)
+
+
+def test_pragmas():
+    def pragmas(alias):
+        with connections[alias].cursor() as cursor:
+            return [
+                cursor.execute("PRAGMA {}".format(name)).fetchone()[0]
+                for name in ("journal_mode", "synchronous", "query_only")
+            ]
+
+    assert pragmas("default") == ["wal", 1, 0]
+    assert in_thread(lambda: pragmas("replica")) == ["wal", 1, 1]
+
+
+def test_worker_threads_close_obsolete_connections(monkeypatch):
+    # Past CONN_MAX_AGE as soon as they are opened.
+    monkeypatch.setitem(connections.settings["replica"], "CONN_MAX_AGE", 0)
+
+    def query():
+        Country.objects.all()[:1].get()
+        return connections["replica"]
+
+    connection = async_to_sync(in_worker_thread(query))()
+    assert connection.alias == "replica"
+    assert connection.connection is None
@@ -0,0 +1,166 @@
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from countries.models import Country, FeedState
+from countries.sync.delta import apply_changes, delta_url, parse_changes
+
+from test_graphql import search_countries
+
+pytestmark = [pytest.mark.django_db]
+
+CHANGES = [
+    {
+        "seq": 1,
+        "op": "upsert",
+        "type": "country",
+        "code": "AUS",
+        "name": "Commonwealth of Australia",
+    },
+    {"seq": 2, "op": "upsert", "type": "country", "code": "PXL", "name": "Pixie Land"},
+    {"seq": 3, "op": "upsert", "type": "link", "country": "PXL", "currency": "EUR"},
+    {"seq": 4, "op": "delete", "type": "link", "country": "AUT", "currency": "EUR"},
+]
+
+
+def currencies(symbol):
+    country = Country.objects.get(symbol=symbol)
+    return sorted(currency.symbol for currency in country.currencies.all())
+
+
+def syncdata_delta(url):
+    out = StringIO()
+    call_command("syncdata", "--delta", url, stdout=out)
+    return out.getvalue()
+
+
+def test_syncdata_delta(feed_server, django_assert_max_num_queries):
+    url = feed_server.url("/delta.json")
+    feed_server.add("/delta.json?after=0", {"body": CHANGES})
+
+    out = syncdata_delta(url)
+
+    assert "Applied changes up to sequence 4." in out
+    assert Country.objects.get(symbol="AUS").name == "Commonwealth of Australia"
+    assert currencies("PXL") == ["EUR"]
+    assert currencies("AUT") == []
+    assert search_countries("pixie") == ["PXL"]
+    assert FeedState.objects.get(feed="delta").sequence == 4
+
+    # The server sends the same changes again, and a new one.
+    feed_server.add(
+        "/delta.json?after=4",
+        {
+            "body": CHANGES
+            + [{"seq": 5, "op": "delete", "type": "country", "code": "PXL"}]
+        },
+    )
+    out = syncdata_delta(url)
+    assert "countries +0 ~0 -1" in out
+    assert not Country.objects.filter(symbol="PXL").exists()
+    assert currencies("AUT") == []
+
+    # Nothing new: only the stored sequence is read, before the request and
+    # again in the transaction.
+    feed_server.add("/delta.json?after=5", {"body": CHANGES})
+    with django_assert_max_num_queries(4):
+        out = syncdata_delta(url)
+    assert "No changes after sequence 5." in out
+    assert Country.objects.get(symbol="AUS").name == "Commonwealth of Australia"
+
+
+def test_delete_removes_earlier_links():
+    changes = parse_changes(
+        [
+            {
+                "seq": 1,
+                "op": "upsert",
+                "type": "link",
+                "country": "AUS",
+                "currency": "USD",
+            },
+            {"seq": 2, "op": "delete", "type": "country", "code": "AUS"},
+            {
+                "seq": 4,
+                "op": "upsert",
+                "type": "link",
+                "country": "AUS",
+                "currency": "EUR",
+            },
+            # Out of order.
+            {
+                "seq": 3,
+                "op": "upsert",
+                "type": "country",
+                "code": "AUS",
+                "name": "Australia",
+            },
+        ]
+    )
+
+    report = apply_changes(changes)
+
+    # Only the link made after the country came back remains.
+    assert currencies("AUS") == ["EUR"]
+    assert report.links_deleted == 1
+    assert (report.links_created, report.countries_updated) == (1, 0)
+    # Applying the same changes again deletes and creates the link again.
+    report = apply_changes(changes)
+    assert (report.links_deleted, report.links_created) == (1, 1)
+    assert currencies("AUS") == ["EUR"]
+
+
+def test_links_to_missing_rows_are_ignored():
+    report = apply_changes(
+        parse_changes(
+            [
+                {
+                    "seq": 1,
+                    "op": "upsert",
+                    "type": "link",
+                    "country": "AUS",
+                    "currency": "ZZZ9",
+                },
+                {
+                    "seq": 2,
+                    "op": "delete",
+                    "type": "link",
+                    "country": "NOPE",
+                    "currency": "AUD",
+                },
+            ]
+        )
+    )
+    assert report.total == 0
+    assert currencies("AUS") == ["AUD"]
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"seq": "1", "op": "upsert", "type": "country", "code": "A", "name": "A"},
+        {"seq": True, "op": "upsert", "type": "country", "code": "A", "name": "A"},
+        {"seq": 1, "op": "insert", "type": "country", "code": "A", "name": "A"},
+        {"seq": 1, "op": "upsert", "type": "country", "code": "A"},
+        {"seq": 1, "op": "delete", "type": "link", "country": "A"},
+        [1],
+    ],
+)
+def test_parse_changes_invalid(record):
+    with pytest.raises(ValueError, match="Change 0 is not valid"):
+        parse_changes([record])
+
+
+def test_syncdata_delta_invalid(feed_server):
+    url = feed_server.url("/delta.json")
+    feed_server.add("/delta.json?after=0", {"body": {"changes": []}})
+
+    with pytest.raises(CommandError, match="not a list of changes"):
+        syncdata_delta(url)
+    assert not FeedState.objects.filter(feed="delta").exists()
+
+
+def test_delta_url():
+    assert delta_url("http://x/d?after=3&v=1", 7) == "http://x/d?v=1&after=7"
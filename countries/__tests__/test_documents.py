@@ -0,0 +1,129 @@
+import pytest
+
+from codingtest import settings as project_settings
+from django.test import Client
+from countries.documents import document_cache, query_hash
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+    }
+}
+"""
+
+
+@pytest.fixture
+def document_cache_settings(settings):
+    settings.COUNTRIES_DOCUMENT_CACHE = {
+        "ENABLED": True,
+        "MAX_ENTRIES": 2,
+        "PERSISTED_QUERIES": True,
+        "ALIAS": "default",
+        "TIMEOUT": None,
+    }
+    # Snapshots look up documents too.
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    document_cache.clear()
+    document_cache.reset_stats()
+    yield settings.COUNTRIES_DOCUMENT_CACHE
+    document_cache.clear()
+    document_cache.reset_stats()
+
+
+def post(data):
+    return Client().post(GRAPHQL_URL, data, content_type="application/json")
+
+
+def persisted(query=None, digest=None, variables=None):
+    data = {
+        "variables": variables,
+        "extensions": {
+            "persistedQuery": {"version": 1, "sha256Hash": digest or query_hash(query)}
+        },
+    }
+    if query is not None:
+        data["query"] = query
+    return data
+
+
+def test_repeated_query_is_parsed_once(document_cache_settings):
+    first = post({"query": QUERY, "variables": {"search": "aus"}})
+    second = post({"query": QUERY, "variables": {"search": "aus"}})
+
+    assert first.json() == second.json()
+    assert first.json().get("errors") is None
+    assert (document_cache.hits, document_cache.misses) == (1, 1)
+
+
+def test_invalid_queries_are_not_cached(document_cache_settings):
+    for _ in range(2):
+        response = post({"query": "{ countries { population } }"})
+        assert response.status_code == 400
+        assert "population" in response.json()["errors"][0]["message"]
+    assert len(document_cache.local) == 0
+
+
+def test_least_recently_used_document_is_evicted(document_cache_settings):
+    queries = ["{ countries { name } }", "{ countries { symbol } }", QUERY]
+    for query in queries:
+        assert post({"query": query}).json().get("errors") is None
+
+    assert len(document_cache.local) == 2
+    post({"query": queries[0]})
+    assert document_cache.hits == 0
+
+
+def test_disabled(document_cache_settings):
+    document_cache_settings["ENABLED"] = False
+    for _ in range(2):
+        assert post({"query": QUERY}).json().get("errors") is None
+    assert len(document_cache.local) == 0
+    assert document_cache.hits == 0
+
+
+def test_persisted_query(document_cache_settings):
+    variables = {"search": "aus"}
+    expected = post({"query": QUERY, "variables": variables}).json()
+
+    response = post(persisted(digest=query_hash(QUERY), variables=variables))
+    assert response.json()["errors"][0]["message"] == "PersistedQueryNotFound"
+    assert (
+        response.json()["errors"][0]["extensions"]["code"]
+        == "PERSISTED_QUERY_NOT_FOUND"
+    )
+
+    # Registering the query runs it as well.
+    assert post(persisted(QUERY, variables=variables)).json() == expected
+    assert post(persisted(digest=query_hash(QUERY), variables=variables)).json() == (
+        expected
+    )
+
+
+def test_persisted_query_hash_mismatch(document_cache_settings):
+    response = post(persisted(QUERY, digest=query_hash("{ countries { name } }")))
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["message"] == (
+        "The sha256Hash does not match the query."
+    )
+
+
+def test_persisted_queries_disabled(document_cache_settings):
+    document_cache_settings["PERSISTED_QUERIES"] = False
+    response = post(persisted(QUERY))
+    assert response.json()["errors"][0]["extensions"]["code"] == (
+        "PERSISTED_QUERY_NOT_SUPPORTED"
+    )
+
+
+def test_persisted_queries_are_shared():
+    # A query registered with one process must be known to the others. The
+    # tests replace the caches, so this checks those of the project.
+    alias = project_settings.COUNTRIES_DOCUMENT_CACHE["ALIAS"]
+    backend = project_settings.CACHES[alias]["BACKEND"]
+    assert backend != "django.core.cache.backends.locmem.LocMemCache"
@@ -0,0 +1,190 @@
+import socket
+import time
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from countries.models import Country, Currency, FeedState
+from countries.sync import FetchConfig, FetchError, fetch, fetch_all
+from countries.sync.fetch import backoff_delay, make_session
+
+from test_syncdata import feeds_from_db
+
+# No real waiting between retries in the tests.
+FAST = FetchConfig(timeout=(1, 1), retries=2, backoff=0.01, max_backoff=0.01)
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return "http://127.0.0.1:{}/countries.json".format(port)
+
+
+def test_fetch_all_is_concurrent(feed_server):
+    urls = {
+        "countries": feed_server.add("/countries.json", {"body": [], "delay": 0.4}),
+        "currencies": feed_server.add("/currencies.json", {"body": [], "delay": 0.4}),
+    }
+    start = time.perf_counter()
+    responses = fetch_all(urls, FAST)
+    elapsed = time.perf_counter() - start
+
+    assert responses["countries"].json() == []
+    assert responses["currencies"].json() == []
+    # Roughly the slower of the two downloads, not their sum.
+    assert elapsed < 0.75
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_fetch_retries_transient_status(feed_server, status):
+    url = feed_server.add(
+        "/countries.json", {"status": status}, {"body": [{"code": "AUS"}]}
+    )
+    response = fetch(make_session(), "countries", url, FAST)
+
+    assert response.json() == [{"code": "AUS"}]
+    assert len(feed_server.requests) == 2
+
+
+def test_fetch_gives_up_after_retries(feed_server):
+    url = feed_server.add("/countries.json", {"status": 502})
+    with pytest.raises(FetchError) as error:
+        fetch(make_session(), "countries", url, FAST)
+
+    assert error.value.feed == "countries"
+    assert error.value.status == 502
+    assert error.value.attempts == 3
+    assert len(feed_server.requests) == 3
+
+
+def test_fetch_does_not_retry_client_errors(feed_server):
+    url = feed_server.url("/missing.json")
+    with pytest.raises(FetchError) as error:
+        fetch(make_session(), "countries", url, FAST)
+
+    assert error.value.status == 404
+    assert error.value.attempts == 1
+
+
+def test_fetch_retries_connection_errors():
+    url = unused_url()
+    with pytest.raises(FetchError) as error:
+        fetch(make_session(), "countries", url, FAST)
+
+    assert error.value.status is None
+    assert error.value.attempts == 3
+    assert url in str(error.value)
+
+
+def test_fetch_timeout(feed_server):
+    url = feed_server.add("/countries.json", {"body": [], "delay": 0.5})
+    config = FetchConfig(timeout=(1, 0.1), retries=0)
+    with pytest.raises(FetchError) as error:
+        fetch(make_session(), "countries", url, config)
+
+    assert error.value.attempts == 1
+
+
+def test_backoff_delay():
+    config = FetchConfig(backoff=1, max_backoff=5)
+    for retry in range(6):
+        assert 0 <= backoff_delay(config, retry) <= min(5, 2**retry)
+
+
+@pytest.mark.django_db
+def test_syncdata_against_local_server(feed_server):
+    countries_list, currencies_list = feeds_from_db()
+    countries_url = feed_server.add("/countries.json", {"body": countries_list})
+    currencies_url = feed_server.add("/currencies.json", {"body": currencies_list})
+
+    Country.objects.get(symbol="AUS").delete()
+    Currency.objects.filter(symbol="CNY").update(name="XXXXX")
+
+    out = StringIO()
+    call_command("syncdata", countries_url, currencies_url, stdout=out)
+
+    assert len(Country.objects.filter(symbol="AUS")) == 1
+    assert Currency.objects.get(symbol="CNY").name == "Yuan Renminbi"
+    assert "rows touched" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_syncdata_reports_fetch_errors(feed_server):
+    countries_url = feed_server.add("/countries.json", {"body": []})
+    currencies_url = feed_server.add("/currencies.json", {"status": 500})
+
+    with pytest.raises(CommandError, match="currencies feed"):
+        call_command("syncdata", countries_url, currencies_url, "--retries", "0")
+    # Nothing was deleted although the countries feed was empty.
+    assert Country.objects.exists()
+
+
+def serve_feeds(feed_server, countries_list, currencies_list, etags=False):
+    countries = {"body": countries_list}
+    currencies = {"body": currencies_list}
+    if etags:
+        countries["headers"] = {"ETag": '"c{}"'.format(len(countries_list))}
+        currencies["headers"] = {"ETag": '"x{}"'.format(len(currencies_list))}
+    return (
+        feed_server.add("/countries.json", countries),
+        feed_server.add("/currencies.json", currencies),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("etags", [True, False])
+def test_syncdata_skips_unchanged_feeds(
+    feed_server, etags, django_assert_max_num_queries
+):
+    countries_list, currencies_list = feeds_from_db()
+    urls = serve_feeds(feed_server, countries_list, currencies_list, etags)
+    call_command("syncdata", *urls, stdout=StringIO())
+    assert FeedState.objects.count() == 2
+
+    out = StringIO()
+    # Reading the stored state is the only database work.
+    with django_assert_max_num_queries(1):
+        call_command("syncdata", *urls, stdout=out)
+    assert "sync skipped" in out.getvalue()
+
+    if etags:
+        sent = {
+            headers.get("If-None-Match") for _, headers in feed_server.requests[-2:]
+        }
+        assert sent == {
+            '"c{}"'.format(len(countries_list)),
+            '"x{}"'.format(len(currencies_list)),
+        }
+
+
+@pytest.mark.django_db
+def test_syncdata_one_feed_changed(feed_server):
+    countries_list, currencies_list = feeds_from_db()
+    urls = serve_feeds(feed_server, countries_list, currencies_list, True)
+    call_command("syncdata", *urls, stdout=StringIO())
+
+    # Drop Australia from the countries feed; the currencies feed answers
+    # the conditional request with a 304 and has to be fetched again.
+    countries_list = [c for c in countries_list if c["code"] != "AUS"]
+    urls = serve_feeds(feed_server, countries_list, currencies_list, True)
+    out = StringIO()
+    call_command("syncdata", *urls, stdout=out)
+
+    assert "sync skipped" not in out.getvalue()
+    assert not Country.objects.filter(symbol="AUS").exists()
+    assert Currency.objects.filter(symbol="AUD").exists()
+
+
+@pytest.mark.django_db
+def test_syncdata_force(feed_server):
+    countries_list, currencies_list = feeds_from_db()
+    urls = serve_feeds(feed_server, countries_list, currencies_list, True)
+    call_command("syncdata", *urls, stdout=StringIO())
+
+    out = StringIO()
+    call_command("syncdata", *urls, "--force", stdout=out)
+    assert "0 rows touched" in out.getvalue()
+    assert "If-None-Match" not in feed_server.requests[-1][1]
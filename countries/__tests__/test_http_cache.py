@@ -0,0 +1,147 @@
+import gzip
+import json
+
+import pytest
+
+from django.test import Client, TestCase
+from countries.documents import query_hash
+from countries.models import Country
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+    }
+}
+"""
+
+FULL_QUERY = "{ countries { name symbol currencies { name symbol } } }"
+
+
+@pytest.fixture
+def http_cache_settings(settings):
+    settings.COUNTRIES_HTTP_CACHE = {"ENABLED": True, "MAX_AGE": 120}
+    yield settings.COUNTRIES_HTTP_CACHE
+
+
+def get(query=None, variables=None, **headers):
+    params = {}
+    if query is not None:
+        params["query"] = query
+    if variables is not None:
+        params["variables"] = json.dumps(variables)
+    return Client().get(GRAPHQL_URL, params, **headers)
+
+
+def test_get_runs_the_query(http_cache_settings):
+    response = get(QUERY, {"search": "aus"})
+    expected = Client().post(
+        GRAPHQL_URL,
+        {"query": QUERY, "variables": {"search": "aus"}},
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert response.json() == expected.json()
+    assert response["ETag"].startswith('"')
+    assert response["Cache-Control"] == "public, max-age=120"
+    # POST responses are not cached.
+    assert "ETag" not in expected
+    assert "Cache-Control" not in expected
+
+
+def test_get_without_query_renders_the_playground(http_cache_settings):
+    response = get()
+    assert response.status_code == 200
+    assert "ETag" not in response
+
+
+def test_etag_depends_on_the_request(http_cache_settings):
+    tags = {
+        get(QUERY, {"search": "aus"})["ETag"],
+        get(QUERY, {"search": "fra"})["ETag"],
+        get("{ countries { name } }")["ETag"],
+    }
+    assert len(tags) == 3
+    assert get(QUERY, {"search": "aus"})["ETag"] in tags
+
+
+def test_if_none_match_skips_the_query(http_cache_settings, django_assert_num_queries):
+    tag = get(QUERY, {"search": "aus"})["ETag"]
+
+    with django_assert_num_queries(0):
+        response = get(QUERY, {"search": "aus"}, HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response["ETag"] == tag
+    assert response["Cache-Control"] == "public, max-age=120"
+
+    response = get(QUERY, {"search": "aus"}, HTTP_IF_NONE_MATCH='"stale"')
+    assert response.status_code == 200
+    assert response["ETag"] == tag
+
+
+def test_persisted_query(http_cache_settings):
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}}
+    Client().post(
+        GRAPHQL_URL,
+        {"query": QUERY, "extensions": extensions},
+        content_type="application/json",
+    )
+    response = Client().get(GRAPHQL_URL, {"extensions": json.dumps(extensions)})
+    assert response.status_code == 200
+    assert response.json().get("errors") is None
+
+    response = Client().get(
+        GRAPHQL_URL,
+        {"extensions": json.dumps(extensions)},
+        HTTP_IF_NONE_MATCH=response["ETag"],
+    )
+    assert response.status_code == 304
+
+
+def test_gzipped_snapshot_has_its_own_etag(http_cache_settings):
+    plain = get(FULL_QUERY)
+    gzipped = get(FULL_QUERY, HTTP_ACCEPT_ENCODING="gzip")
+
+    assert json.loads(gzip.decompress(gzipped.content)) == plain.json()
+    assert plain["ETag"] != gzipped["ETag"]
+    assert gzipped["Vary"] == "Accept-Encoding"
+    response = get(FULL_QUERY, HTTP_IF_NONE_MATCH=plain["ETag"])
+    assert response.status_code == 304
+
+
+def test_errors_are_not_cached(http_cache_settings):
+    response = get("{ countries { population } }")
+    assert response.status_code == 400
+    assert "ETag" not in response
+    assert "Cache-Control" not in response
+
+    response = Client().get(GRAPHQL_URL, {"query": QUERY, "variables": "{"})
+    assert response.status_code == 400
+
+
+def test_disabled(http_cache_settings):
+    http_cache_settings["ENABLED"] = False
+    response = get(QUERY, {"search": "aus"})
+    assert response.status_code == 200
+    assert "ETag" not in response
+
+
+class ETagDataVersionTest(TestCase):
+    def test_etag_changes_with_the_data(self):
+        before = get(FULL_QUERY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name="Atlantis", symbol="AT")
+
+        response = get(FULL_QUERY, HTTP_IF_NONE_MATCH=before["ETag"])
+        assert response.status_code == 200
+        assert response["ETag"] != before["ETag"]
+        assert "Atlantis" in [
+            country["name"] for country in response.json()["data"]["countries"]
+        ]
@@ -0,0 +1,110 @@
+import pytest
+
+from django.test import Client
+from countries.models import Country, Currency
+
+from test_cache import result_cache_settings
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+NESTED = """
+query($search: String) {
+    countries(search: $search) {
+        symbol
+        currencies {
+            symbol
+            countries {
+                symbol
+                currencies {
+                    symbol
+                }
+            }
+        }
+    }
+}
+"""
+
+
+def post(query, search=None):
+    response = Client().post(
+        GRAPHQL_URL,
+        {"query": query, "variables": {"search": search}},
+        content_type="application/json",
+    )
+    assert response.json().get("errors") is None
+    return response.json()["data"]["countries"]
+
+
+def expected_nested(countries):
+    return [
+        {
+            "symbol": country.symbol,
+            "currencies": [
+                {
+                    "symbol": currency.symbol,
+                    "countries": [
+                        {
+                            "symbol": other.symbol,
+                            "currencies": [
+                                {"symbol": c.symbol}
+                                for c in other.currencies.order_by(
+                                    "countrycurrency__pk"
+                                )
+                            ],
+                        }
+                        for other in currency.country_set.order_by("name")
+                    ],
+                }
+                for currency in country.currencies.order_by("countrycurrency__pk")
+            ],
+        }
+        for country in countries
+    ]
+
+
+def test_nested_query(django_assert_num_queries):
+    # One statement per level: the countries, their currencies, the countries
+    # of those, and the currencies of the countries not loaded before.
+    with django_assert_num_queries(4):
+        result = post(NESTED, "aus")
+    assert [c["symbol"] for c in result] == ["AUS", "AUT"]
+    assert result == expected_nested(Country.objects.filter(symbol__in=["AUS", "AUT"]))
+
+
+def test_nested_query_of_every_country(django_assert_num_queries):
+    # Everything below the first level is loaded by then.
+    with django_assert_num_queries(3):
+        result = post(NESTED)
+    assert len(result) == 164
+
+
+def test_currency_countries(django_assert_num_queries):
+    query = """
+    query($search: String) {
+        countries(search: $search) {
+            currencies {
+                symbol
+                countries {
+                    name
+                }
+            }
+        }
+    }
+    """
+    with django_assert_num_queries(3):
+        result = post(query, "aus")
+    aud = result[0]["currencies"][0]
+    assert aud["symbol"] == "AUD"
+    assert [c["name"] for c in aud["countries"]] == [
+        c.name for c in Currency.objects.get(symbol="AUD").country_set.order_by("name")
+    ]
+
+
+def test_nested_query_of_cached_result(
+    result_cache_settings, django_assert_num_queries
+):
+    first = post(NESTED, "aus")
+    # The countries and their currencies come from the cache.
+    with django_assert_num_queries(2):
+        assert post(NESTED, "aus") == first
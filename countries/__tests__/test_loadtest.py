@@ -0,0 +1,76 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.management import CommandError, call_command
+from countries.loadtest import Sample, percentile, read_requests, summarize
+
+pytestmark = [pytest.mark.django_db]
+
+REQUESTS = [
+    {
+        "operationName": "Countries",
+        "query": "query Countries($search: String) { countries(search: $search) "
+        "{ name currencies { symbol } } }",
+        "variables": {"search": "aus"},
+    },
+    {"method": "GET", "query": "{ countries { name } }"},
+    {"query": "{ countries { population } }"},
+]
+
+
+@pytest.fixture
+def requests_file(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    path.write_text("".join(json.dumps(request) + "\n" for request in REQUESTS))
+    return path
+
+
+def test_loadtest_in_process(requests_file, tmp_path):
+    report_path = tmp_path / "report.json"
+    out = StringIO()
+    call_command(
+        "loadtest",
+        str(requests_file),
+        "--requests",
+        "9",
+        "--concurrency",
+        "3",
+        "--json",
+        str(report_path),
+        stdout=out,
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report["requests"] == 9
+    # The query for a missing field fails validation.
+    assert report["errors"] == 3
+    assert report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"]
+    operations = report["operations"]
+    assert operations["Countries"]["requests"] == 3
+    # The countries, then the currencies of those found.
+    assert operations["Countries"]["queries_max"] == 2
+    assert "9 requests to in-process" in out.getvalue()
+
+
+def test_read_requests_rejects_other_lines():
+    with pytest.raises(ValueError, match="Line 2 is not a GraphQL request."):
+        read_requests(['{"query": "{ countries { name } }"}', '{"title": "x"}'])
+    with pytest.raises(ValueError, match="Line 1 is not valid JSON"):
+        read_requests(["{"])
+
+
+def test_loadtest_missing_file(tmp_path):
+    with pytest.raises(CommandError, match="Could not read the requests"):
+        call_command("loadtest", str(tmp_path / "missing.jsonl"))
+
+
+def test_percentiles():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values[:1], 95) == 1
+    summary = summarize([Sample("q", 0.002, True, 1), Sample("q", 0.004, False)])
+    assert summary["errors"] == 1
+    assert summary["queries_mean"] == 1
@@ -0,0 +1,81 @@
+import pytest
+
+from django.test import TestCase
+from countries import mapped_model, read_model
+from countries.cache import bump_generation
+from countries.read_model import read_models
+from countries.sync import sync_feeds
+
+from test_read_model import post
+from test_syncdata import feeds_from_db
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def model_file(settings, tmp_path):
+    path = tmp_path / "read_model.bin"
+    settings.COUNTRIES_READ_MODEL = {"ENABLED": True, "FILE": path}
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    read_models.clear()
+    yield path
+    read_models.clear()
+
+
+@pytest.mark.parametrize("search", [None, "aus", "AUS", "republic", "an", "zzz", "é"])
+def test_mapped_model_matches_read_model(tmp_path, search):
+    model = read_model.load()
+    mapped_model.write(model, tmp_path / "model")
+    mapped = mapped_model.read(tmp_path / "model")
+
+    assert mapped.generation == model.generation
+    countries = mapped.countries(search)
+    assert countries == model.countries(search)
+    for country in countries[:20]:
+        currencies = mapped.country_currencies(country["id"])
+        assert currencies == model.country_currencies(country["id"])
+        for currency in currencies:
+            assert mapped.currency_countries(currency["id"]) == (
+                model.currency_countries(currency["id"])
+            )
+    assert mapped.country_currencies(-1) == mapped.currency_countries(-1) == []
+
+
+def test_new_worker_starts_from_the_file(model_file, django_assert_num_queries):
+    read_models.get()
+    assert model_file.exists()
+    # As in a worker started afterwards.
+    read_models.clear()
+    with django_assert_num_queries(0):
+        data = post("aus")["data"]
+    assert data["countries"][0]["symbol"] == "AUS"
+    assert data["countries"][0]["currencies"][0]["symbol"] == "AUD"
+    assert isinstance(read_models.get(), mapped_model.MappedReadModel)
+
+
+def test_data_change_writes_the_file(model_file):
+    countries_list, currencies_list = feeds_from_db()
+    for row in countries_list:
+        if row["code"] == "AUT":
+            row["name"] = "Österreich"
+
+    # As syncdata, which has no model of its own, would.
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        sync_feeds(countries_list, currencies_list)
+
+    mapped = mapped_model.read(model_file)
+    assert mapped.generation == read_models.get().generation
+    assert [country["name"] for country in mapped.countries("reich")] == ["Österreich"]
+
+
+def test_stale_or_invalid_file_is_written_again(model_file):
+    model = read_models.get()
+    bump_generation()
+    assert read_models.get().generation != model.generation
+    # The previous model stays readable.
+    assert model.countries("aus")[0]["symbol"] == "AUS"
+    assert mapped_model.read(model_file).generation == read_models.get().generation
+
+    model_file.write_bytes(b"not a model")
+    read_models.clear()
+    assert read_models.get().countries("aus")[0]["symbol"] == "AUS"
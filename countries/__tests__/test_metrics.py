@@ -0,0 +1,168 @@
+import logging
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from countries.metrics import Histogram, registry
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+METRICS_URL = "/metrics"
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        currencies {
+            symbol
+        }
+    }
+}
+"""
+
+
+@pytest.fixture
+def metrics_settings(settings):
+    settings.COUNTRIES_METRICS = {"ENABLED": True, "RESOLVER_SAMPLE_RATE": 1.0}
+    # Only executed queries have resolvers to time.
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    registry.clear()
+    yield settings.COUNTRIES_METRICS
+    registry.clear()
+
+
+def post(query, **variables):
+    return Client().post(
+        GRAPHQL_URL,
+        {"query": query, "variables": variables},
+        content_type="application/json",
+    )
+
+
+def scrape():
+    response = Client().get(METRICS_URL)
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_request_metrics(metrics_settings):
+    response = post(QUERY, search="aus")
+    samples = scrape()
+
+    assert (
+        samples['countries_graphql_request_duration_seconds_count{method="POST"}'] == 1
+    )
+    assert samples['countries_graphql_response_size_bytes_sum{method="POST"}'] == len(
+        response.content
+    )
+    # The countries, then the currencies of those found.
+    assert samples["countries_graphql_sql_queries_sum"] == 2
+    assert samples["countries_graphql_sql_duration_seconds_sum"] > 0
+    assert samples['countries_graphql_sql_queries_bucket{le="2.0"}'] == 1
+    assert samples['countries_graphql_sql_queries_bucket{le="1.0"}'] == 0
+
+
+def test_resolver_metrics(metrics_settings):
+    countries = post(QUERY, search="aus").json()["data"]["countries"]
+    samples = scrape()
+
+    field = 'countries_graphql_resolver_duration_seconds_count{{field="{}"}}'
+    assert samples[field.format("Query.countries")] == 1
+    assert samples[field.format("Country.currencies")] == len(countries)
+    # Fields read by the default resolver are not timed.
+    assert field.format("Country.name") not in samples
+
+
+def test_resolvers_are_sampled(metrics_settings):
+    metrics_settings["RESOLVER_SAMPLE_RATE"] = 0
+    post(QUERY, search="aus")
+    samples = scrape()
+
+    assert (
+        samples['countries_graphql_request_duration_seconds_count{method="POST"}'] == 1
+    )
+    assert not any(
+        name.startswith("countries_graphql_resolver_duration_seconds")
+        for name in samples
+    )
+
+
+@pytest.mark.urls("test_async")
+def test_async_sql_metrics(metrics_settings):
+    async def post_async():
+        return await AsyncClient().post(
+            GRAPHQL_URL,
+            {"query": QUERY, "variables": {"search": "aus"}},
+            content_type="application/json",
+        )
+
+    # The async resolvers query from other threads.
+    assert async_to_sync(post_async)().status_code == 200
+    samples = dict(
+        line.rsplit(" ", 1)
+        for line in registry.render().splitlines()
+        if not line.startswith("#")
+    )
+    assert float(samples["countries_graphql_sql_queries_sum"]) == 2
+    field = 'countries_graphql_resolver_duration_seconds_count{field="Query.countries"}'
+    assert float(samples[field]) == 1
+
+
+@pytest.mark.urls("test_async")
+def test_middleware_is_async_under_asgi(metrics_settings, settings, caplog):
+    async def post_async():
+        return await AsyncClient().post(
+            GRAPHQL_URL,
+            {"query": QUERY, "variables": {"search": "aus"}},
+            content_type="application/json",
+        )
+
+    # In DEBUG, Django logs each middleware it has to adapt, and run through
+    # a thread.
+    settings.DEBUG = True
+    caplog.set_level(logging.DEBUG, logger="django.request")
+    assert async_to_sync(post_async)().status_code == 200
+    assert not [
+        record
+        for record in caplog.records
+        if "MetricsMiddleware" in record.getMessage()
+    ]
+    samples = dict(
+        line.rsplit(" ", 1)
+        for line in registry.render().splitlines()
+        if not line.startswith("#")
+    )
+    count = 'countries_graphql_request_duration_seconds_count{method="POST"}'
+    assert float(samples[count]) == 1
+
+
+def test_metrics_disabled(metrics_settings):
+    metrics_settings["ENABLED"] = False
+    post(QUERY, search="aus")
+    assert Client().get(METRICS_URL).status_code == 404
+    metrics_settings["ENABLED"] = True
+    assert "countries_graphql_request_duration_seconds_count" not in scrape()
+
+
+def test_histogram_format():
+    histogram = Histogram("latency_seconds", "Latency.", (0.1, 1), ["path"])
+    histogram.observe_many([0.05, 0.5, 5], path='/a"b')
+
+    assert list(histogram.collect()) == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{path="/a\\"b",le="0.1"} 1',
+        'latency_seconds_bucket{path="/a\\"b",le="1.0"} 2',
+        'latency_seconds_bucket{path="/a\\"b",le="+Inf"} 3',
+        'latency_seconds_sum{path="/a\\"b"} 5.55',
+        'latency_seconds_count{path="/a\\"b"} 3',
+    ]
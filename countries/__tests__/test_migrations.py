@@ -0,0 +1,79 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Migrates a database of its own, as the tests run against db.sqlite3
+# without migrations.
+MERGE_DUPLICATES = """
+import json
+import sys
+
+import django
+from django.conf import settings
+
+for database in settings.DATABASES.values():
+    database["NAME"] = sys.argv[1]
+django.setup()
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+
+def migrate(target):
+    executor = MigrationExecutor(connection)
+    executor.migrate([target])
+    return executor.loader.project_state([target]).apps
+
+
+apps = migrate(("countries", "0002_feedstate"))
+Country = apps.get_model("countries", "Country")
+Currency = apps.get_model("countries", "Currency")
+usd = Currency.objects.create(symbol="USD", name="US Dollar")
+aud = Currency.objects.create(symbol="AUD", name="Australian Dollar")
+usd_2 = Currency.objects.create(symbol="USD", name="US Dollar, again")
+usa = Country.objects.create(symbol="USA", name="United States")
+aus = Country.objects.create(symbol="AUS", name="Australia")
+usa_2 = Country.objects.create(symbol="USA", name="United States, again")
+usa.currencies.add(usd)
+aus.currencies.add(aud, usd_2)
+# Both become (USA, USD), and (USA, AUD) is only on the duplicate.
+usa_2.currencies.add(usd_2, aud)
+
+apps = migrate(("countries", "0003_unique_symbols"))
+Country = apps.get_model("countries", "Country")
+Currency = apps.get_model("countries", "Currency")
+CountryCurrency = apps.get_model("countries", "CountryCurrency")
+print(json.dumps({
+    "currencies": sorted(Currency.objects.values_list("id", "symbol")),
+    "countries": sorted(Country.objects.values_list("id", "symbol")),
+    "links": sorted(
+        CountryCurrency.objects.values_list("country__symbol", "currency__symbol")
+    ),
+    "ids": [usd.pk, aud.pk, usa.pk, aus.pk],
+}))
+"""
+
+
+def test_unique_symbols_merges_duplicates(tmp_path):
+    output = subprocess.run(
+        [sys.executable, "-c", MERGE_DUPLICATES, str(tmp_path / "db.sqlite3")],
+        cwd=settings.BASE_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    usd, aud, usa, aus = result["ids"]
+
+    # The rows with the lowest ids are kept, with the links of the others,
+    # each once.
+    assert result["currencies"] == [[usd, "USD"], [aud, "AUD"]]
+    assert result["countries"] == [[usa, "USA"], [aus, "AUS"]]
+    assert result["links"] == [
+        ["AUS", "AUD"],
+        ["AUS", "USD"],
+        ["USA", "AUD"],
+        ["USA", "USD"],
+    ]
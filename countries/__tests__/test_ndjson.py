@@ -0,0 +1,141 @@
+import gzip
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from countries import cache
+from countries.models import Country, CountryCurrency, Currency, FeedState
+
+from test_graphql import search_countries
+from test_syncdata import feeds_from_db
+
+pytestmark = [pytest.mark.django_db]
+
+
+def links():
+    return list(
+        CountryCurrency.objects.order_by("pk").values_list("country_id", "currency_id")
+    )
+
+
+def rows(model):
+    return list(model.objects.order_by("pk").values_list("id", "symbol", "name"))
+
+
+def export(path, *args):
+    stdout = StringIO()
+    call_command("exportdata", str(path), *args, stdout=stdout)
+    return stdout.getvalue()
+
+
+def import_(path, *args):
+    stdout = StringIO()
+    call_command("importdata", str(path), *args, stdout=stdout)
+    return stdout.getvalue()
+
+
+@pytest.mark.parametrize(
+    "name, args",
+    [
+        ("dump.ndjson", []),
+        ("dump.ndjson.gz", []),
+        ("dump.ndjson", ["--gzip"]),
+    ],
+)
+def test_export_import_round_trip(tmp_path, name, args):
+    path = tmp_path / name
+    expected = rows(Currency), rows(Country), links(), feeds_from_db()
+    output = export(path, *args, "--chunk-size", "100")
+    assert output.startswith(
+        "Exported {} currencies, {} countries and {} links.".format(
+            len(expected[0]), len(expected[1]), len(expected[2])
+        )
+    )
+    with open(path, "rb") as f:
+        assert (f.read(2) == b"\x1f\x8b") == (
+            args == ["--gzip"] or name.endswith(".gz")
+        )
+
+    Country.objects.filter(symbol="AUS").delete()
+    Currency.objects.create(symbol="ZZZ", name="Nothing")
+    FeedState.objects.create(
+        feed="countries", url="https://example.com", content_hash="0"
+    )
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        generation = cache.current_generation()
+        import_(path, "--chunk-size", "100")
+    assert cache.current_generation() != generation
+
+    assert (rows(Currency), rows(Country), links(), feeds_from_db()) == expected
+    assert not FeedState.objects.exists()
+    # The search index is rebuilt, and new rows continue after the ids.
+    assert search_countries("aus")[:1] == ["AUS"]
+    assert Country.objects.create(symbol="PXL", name="Pixie Land").pk > max(
+        pk for pk, _, _ in expected[1]
+    )
+
+
+def test_export_records(tmp_path):
+    path = tmp_path / "dump.ndjson"
+    export(path)
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    types = [record["type"] for record in records]
+    assert types == sorted(types, key=["currency", "country", "link"].index)
+    australia = Country.objects.get(symbol="AUS")
+    assert {
+        "type": "country",
+        "id": australia.pk,
+        "code": "AUS",
+        "name": australia.name,
+    } in records
+    assert {
+        "type": "link",
+        "country": australia.pk,
+        "currency": Currency.objects.get(symbol="AUD").pk,
+    } in records
+
+
+def test_import_writes_in_chunks(tmp_path, django_assert_max_num_queries):
+    path = tmp_path / "dump.ndjson"
+    export(path)
+    total = Currency.objects.count() + Country.objects.count() + len(links())
+    # The number of statements depends on the chunks rather than the rows.
+    with django_assert_max_num_queries(total // 100 + 20):
+        import_(path, "--chunk-size", "100")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "not json",
+        '{"type": "planet", "id": 1}',
+        '{"type": "country", "id": "1", "code": "AUS", "name": "Australia"}',
+        '{"type": "link", "country": 1}',
+    ],
+)
+def test_import_invalid_line(tmp_path, line):
+    path = tmp_path / "dump.ndjson.gz"
+    with gzip.open(path, "wt") as f:
+        f.write('{"type": "currency", "id": 1, "code": "AUD", "name": "A"}\n')
+        f.write(line + "\n")
+    countries = rows(Country)
+    with pytest.raises(CommandError, match="Line 2 is not a valid record"):
+        import_(path)
+    assert rows(Country) == countries
+
+
+def test_import_inconsistent_dump(tmp_path):
+    path = tmp_path / "dump.ndjson"
+    path.write_text(
+        '{"type": "country", "id": 1, "code": "AUS", "name": "Australia"}\n'
+        '{"type": "link", "country": 1, "currency": 999}\n'
+    )
+    countries = rows(Country)
+    with pytest.raises(CommandError, match="not consistent"):
+        import_(path)
+    assert rows(Country) == countries
@@ -0,0 +1,114 @@
+import pytest
+
+from django.test import Client
+from countries.models import Country
+from countries.pagination import MAX_PAGE_SIZE
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+QUERY = """
+query($first: Int, $after: String, $search: String) {
+    countriesConnection(first: $first, after: $after, search: $search) {
+        edges {
+            cursor
+            node {
+                symbol
+                currencies {
+                    symbol
+                }
+            }
+        }
+        pageInfo {
+            hasNextPage
+            endCursor
+        }
+    }
+}
+"""
+
+
+def query_page(query=QUERY, **variables):
+    response = Client().post(
+        GRAPHQL_URL,
+        {"query": query, "variables": variables},
+        content_type="application/json",
+    )
+    return response.json()
+
+
+def pages(**variables):
+    after = None
+    while True:
+        page = query_page(after=after, **variables)["data"]["countriesConnection"]
+        yield page
+        if not page["pageInfo"]["hasNextPage"]:
+            return
+        after = page["pageInfo"]["endCursor"]
+
+
+def test_pages_cover_every_country_in_order(django_assert_num_queries):
+    # The countries and the currencies of the page, whatever the page size.
+    with django_assert_num_queries(2):
+        query_page(first=MAX_PAGE_SIZE)
+
+    symbols = [
+        edge["node"]["symbol"] for page in pages(first=50) for edge in page["edges"]
+    ]
+    assert symbols == list(
+        Country.objects.order_by("name", "id").values_list("symbol", flat=True)
+    )
+    first_page = next(pages(first=50))
+    assert first_page["pageInfo"]["endCursor"] == first_page["edges"][-1]["cursor"]
+
+
+def test_keyset_breaks_ties_by_id():
+    Country.objects.create(name="Austria", symbol="AU2")
+    Country.objects.create(name="Austria", symbol="AU3")
+
+    symbols = [
+        edge["node"]["symbol"]
+        for page in pages(first=1, search="austria")
+        for edge in page["edges"]
+    ]
+    assert symbols == ["AUT", "AU2", "AU3"]
+
+
+def test_search():
+    [page] = pages(search="aus")
+    assert [edge["node"]["symbol"] for edge in page["edges"]] == ["AUS", "AUT"]
+    assert page["edges"][0]["node"]["currencies"] == [{"symbol": "AUD"}]
+
+
+def test_total_count_only_when_selected(django_assert_num_queries):
+    query = """
+    query($search: String) {
+        countriesConnection(first: 1, search: $search) {
+            edges {
+                node {
+                    name
+                }
+            }
+            %s
+        }
+    }
+    """
+    with django_assert_num_queries(2):
+        result = query_page(query % "totalCount", search="aus")
+    assert result["data"]["countriesConnection"]["totalCount"] == 2
+
+    with django_assert_num_queries(1):
+        query_page(query % "", search="aus")
+
+
+@pytest.mark.parametrize(
+    "variables, message",
+    [
+        ({"after": "bm9wZQ=="}, "Invalid cursor: 'bm9wZQ=='."),
+        ({"after": "!"}, "Invalid cursor: '!'."),
+        ({"first": MAX_PAGE_SIZE + 1}, "first must be between 0 and 100, not 101."),
+    ],
+)
+def test_invalid_arguments(variables, message):
+    assert query_page(**variables)["errors"][0]["message"] == message
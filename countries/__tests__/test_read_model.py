@@ -0,0 +1,108 @@
+import pytest
+
+from django.test import Client, TestCase
+from countries.cache import bump_generation
+from countries.read_model import read_models
+from countries.schema import countries_queryset
+from countries.sync import sync_feeds
+
+from test_graphql import GRAPHQL_URL
+from test_syncdata import feeds_from_db
+
+pytestmark = [pytest.mark.django_db]
+
+QUERY = """
+query($search: String) {
+    countries(search: $search) {
+        name
+        symbol
+        currencies {
+            symbol
+            countries {
+                symbol
+            }
+        }
+    }
+}
+"""
+
+
+@pytest.fixture
+def read_model_settings(settings):
+    settings.COUNTRIES_READ_MODEL = {"ENABLED": True}
+    # The snapshots would answer the unfiltered query first.
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": False}
+    read_models.clear()
+    yield settings.COUNTRIES_READ_MODEL
+    read_models.clear()
+
+
+def post(search=None):
+    response = Client().post(
+        GRAPHQL_URL,
+        {"query": QUERY, "variables": {"search": search}},
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("search", [None, "aus", "AUS", "republic", "an", "u", "zzz"])
+def test_read_model_matches_database(read_model_settings, search):
+    expected = post(search)
+    read_model_settings["ENABLED"] = False
+    from_database = post(search)
+
+    if search is None or len(search) < 3:
+        assert expected == from_database
+    else:
+        # Without the FTS rank, only the countries are the same.
+        countries = expected["data"]["countries"]
+        assert sorted(countries, key=lambda country: country["symbol"]) == sorted(
+            from_database["data"]["countries"], key=lambda country: country["symbol"]
+        )
+
+
+def test_read_model_exact_symbol_first(read_model_settings):
+    model = read_models.get()
+    assert [country["symbol"] for country in model.countries("aus")] == ["AUS", "AUT"]
+    assert model.countries("aut")[0]["symbol"] == "AUT"
+    assert {country["symbol"] for country in model.countries("ZAF")} == {
+        country.symbol for country in countries_queryset("ZAF")
+    }
+
+
+def test_read_model_serves_without_queries(
+    read_model_settings, django_assert_num_queries
+):
+    post("aus")
+    with django_assert_num_queries(0):
+        data = post("aus")["data"]
+    assert data["countries"][0]["symbol"] == "AUS"
+    assert data["countries"][0]["currencies"][0]["symbol"] == "AUD"
+
+
+def test_read_model_follows_data_changes(read_model_settings):
+    model = read_models.get()
+    countries_list, currencies_list = feeds_from_db()
+    for row in countries_list:
+        if row["code"] == "AUT":
+            row["name"] = "Österreich"
+            row["currencies"] = []
+
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        sync_feeds(countries_list, currencies_list)
+
+    # Replaced by a new model, while the old one is unchanged.
+    assert read_models.get() is not model
+    assert [country["name"] for country in model.countries("aut")] == ["Austria"]
+    [country] = post("reich")["data"]["countries"]
+    assert (country["name"], country["currencies"]) == ("Österreich", [])
+
+
+def test_read_model_follows_other_processes(read_model_settings):
+    model = read_models.get()
+    assert read_models.get() is model
+    # As syncdata in another process would.
+    bump_generation()
+    assert read_models.get() is not model
@@ -0,0 +1,117 @@
+import gzip
+
+import pytest
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from countries.models import Country
+from countries.read_model import read_models
+from countries.snapshot import FULL_QUERY, snapshots
+from countries.sync import sync_feeds
+
+from test_graphql import GRAPHQL_URL
+from test_syncdata import feeds_from_db
+
+pytestmark = [pytest.mark.django_db]
+
+QUERIES = [
+    FULL_QUERY,
+    "query Countries { countries { symbol currencies { symbol name } name } }",
+    "{ countries { name } }",
+]
+
+
+@pytest.fixture
+def snapshot_settings(settings):
+    settings.COUNTRIES_SNAPSHOT = {"ENABLED": True, "GZIP_LEVEL": 6}
+    snapshots.clear()
+    yield settings.COUNTRIES_SNAPSHOT
+    snapshots.clear()
+
+
+def post(query, **headers):
+    return Client().post(
+        GRAPHQL_URL, {"query": query}, content_type="application/json", **headers
+    )
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_snapshot_matches_executed_query(
+    snapshot_settings, query, django_assert_num_queries
+):
+    snapshot_settings["ENABLED"] = False
+    expected = post(query).content
+    snapshot_settings["ENABLED"] = True
+
+    post(query)
+    with django_assert_num_queries(0):
+        response = post(query)
+    assert response.content == expected
+    assert response["Content-Type"] == "application/json"
+    assert response["Vary"] == "Accept-Encoding"
+
+    with django_assert_num_queries(0):
+        response = post(query, HTTP_ACCEPT_ENCODING="gzip, deflate")
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        '{ countries(search: "aus") { name } }',
+        "{ countries { country: name } }",
+        "{ countries { name @include(if: true) } }",
+        "{ countries { ...Name } } fragment Name on Country { name }",
+        "{ countries { name currencies { countries { name } } } }",
+        "{ countries { __typename } }",
+        "{ countries { name name } }",
+    ],
+)
+def test_other_queries_are_executed(snapshot_settings, query):
+    post(query)
+    assert snapshots.local == {}
+
+
+def test_snapshot_is_rebuilt_on_commit(snapshot_settings, django_assert_num_queries):
+    assert Country.objects.filter(symbol="AUT").exists()
+    post(FULL_QUERY)
+
+    countries_list, currencies_list = feeds_from_db()
+    countries_list = [c for c in countries_list if c["code"] != "AUT"]
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        sync_feeds(countries_list, currencies_list)
+
+    # Rendered by the sync, so serving it takes no queries.
+    with django_assert_num_queries(0):
+        response = post(FULL_QUERY)
+    symbols = [c["symbol"] for c in response.json()["data"]["countries"]]
+    assert "AUT" not in symbols
+    assert len(symbols) == Country.objects.count()
+
+
+def test_snapshot_orders_like_read_model(snapshot_settings, settings):
+    # Countries of the same name, in the order of their ids, as in the read
+    # model and the pages of countriesConnection.
+    Country.objects.create(symbol="ZZA", name="Atlantis")
+    Country.objects.create(symbol="AAA", name="Atlantis")
+    query = "{ countries { symbol name } }"
+    with CaptureQueriesContext(connection) as queries:
+        snapshot = post(query).json()
+    # SQLite happens to return ties in the order of their ids anyway.
+    assert any(
+        'ORDER BY "countries_country"."name" ASC, "countries_country"."id" ASC'
+        in captured["sql"]
+        for captured in queries
+    )
+
+    settings.COUNTRIES_READ_MODEL = {"ENABLED": True}
+    snapshot_settings["ENABLED"] = False
+    read_models.clear()
+    try:
+        assert post(query).json() == snapshot
+    finally:
+        read_models.clear()
+    symbols = [c["symbol"] for c in snapshot["data"]["countries"]]
+    assert symbols.index("ZZA") < symbols.index("AAA")
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.test import Client
+
+from countries import schema as schema_module
+from countries.schema import get_schema
+
+from test_graphql import GRAPHQL_URL
+
+pytestmark = [pytest.mark.django_db]
+
+API_REQUEST = """
+import django
+from django.apps import apps
+from django.conf import settings
+from django.test import Client
+
+django.setup()
+settings.ALLOWED_HOSTS = ["testserver"]
+assert not apps.is_installed("django.contrib.admin")
+response = Client(enforce_csrf_checks=True).post(
+    "/graphql/",
+    {"query": '{ countries(search: "aus") { symbol currencies { symbol } } }'},
+    content_type="application/json",
+)
+print(response.status_code, response.json()["data"]["countries"][0]["symbol"])
+"""
+
+
+def test_schema_is_built_once():
+    assert schema_module.schema is get_schema()
+    assert schema_module.schema is not schema_module.async_schema
+    with pytest.raises(AttributeError):
+        schema_module.missing
+
+
+def test_graphql_view_is_csrf_exempt():
+    response = Client(enforce_csrf_checks=True).post(
+        GRAPHQL_URL,
+        {"query": '{ countries(search: "aus") { symbol } }'},
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+
+
+def test_api_settings_serve_graphql():
+    # In a process of its own, as the apps are set up once.
+    output = subprocess.run(
+        [sys.executable, "-c", API_REQUEST],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, "DJANGO_SETTINGS_MODULE": "codingtest.settings_api"},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output.split() == ["200", "AUS"]
@@ -0,0 +1,128 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from countries.models import Country, Currency
+from countries.sync.stream import iter_json_array, stream_sync
+
+import test_syncdata
+from test_syncdata import feeds_from_db, synthetic_feeds
+
+
+def split_every(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def normalize(countries_list, currencies_list):
+    return (
+        {(c["code"], c["name"], frozenset(c["currencies"])) for c in countries_list},
+        {(c["code"], c["name"]) for c in currencies_list},
+    )
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 4096])
+def test_iter_json_array_chunk_boundaries(size):
+    rows = [
+        {"code": "AUS", "name": "Australia", "currencies": ["AUD"]},
+        {"code": "Ω", "name": "Ünïcödé", "currencies": []},
+        12345,
+        -1.5e3,
+        "text",
+        None,
+        True,
+        [1, [2]],
+    ]
+    data = json.dumps(rows, ensure_ascii=False, indent=1).encode()
+
+    assert list(iter_json_array(split_every(data, size))) == rows
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ]  ", b"[\n]\n"])
+def test_iter_json_array_empty(data):
+    assert list(iter_json_array(split_every(data, 1))) == []
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"{}",
+        b"[1, 2",
+        b"[1 2]",
+        b"[1,]",
+        b"[1] 2",
+        b'[{"a": 1}',
+    ],
+)
+def test_iter_json_array_invalid(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array(split_every(data, 2)))
+
+
+@pytest.mark.django_db
+class TestStreamSync(test_syncdata.TestSyncData):
+
+    # The stream tests do not need the network tests of the base class.
+    test_call = None
+    test_call_error = None
+    test_sync_feeds_num_queries = None
+
+    def test_sync_feeds(self):
+        countries_list, currencies_list = feeds_from_db()
+        extra_countries, extra_currencies = synthetic_feeds(25)
+
+        self.add_fake_data()
+        self.delete_remove_real_data()
+
+        report = stream_sync(
+            iter(countries_list + extra_countries),
+            iter(currencies_list + extra_currencies),
+            chunk_size=7,
+        )
+        assert report.countries_created == 2 + 25
+        assert report.currencies_created == 1 + 25
+        assert report.countries_deleted == 2
+        assert report.currencies_deleted == 3
+
+        # The result is the same as a full sync.
+        report = stream_sync(iter(countries_list), iter(currencies_list), chunk_size=7)
+        assert report.countries_deleted == 25
+        assert report.currencies_deleted == 25
+        assert normalize(*feeds_from_db()) == normalize(countries_list, currencies_list)
+
+
+@pytest.mark.django_db
+def test_syncdata_stream(feed_server):
+    countries_list, currencies_list = feeds_from_db()
+    urls = (
+        feed_server.add("/countries.json", {"body": countries_list}),
+        feed_server.add("/currencies.json", {"body": currencies_list}),
+    )
+    Country.objects.get(symbol="AUS").delete()
+    Currency.objects.filter(symbol="CNY").update(name="XXXXX")
+
+    out = StringIO()
+    call_command("syncdata", *urls, "--stream", "--chunk-size", "50", stdout=out)
+    assert "rows touched" in out.getvalue()
+    assert Country.objects.filter(symbol="AUS").exists()
+    assert Currency.objects.get(symbol="CNY").name == "Yuan Renminbi"
+
+    # The stored hash lets the next full run skip the sync.
+    out = StringIO()
+    call_command("syncdata", *urls, stdout=out)
+    assert "sync skipped" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_syncdata_stream_invalid_feed(feed_server):
+    urls = (
+        feed_server.add("/countries.json", {"body": b'[{"code": '}),
+        feed_server.add("/currencies.json", {"body": []}),
+    )
+
+    with pytest.raises(CommandError, match="Could not parse"):
+        call_command("syncdata", *urls, "--stream", stdout=StringIO())
+    assert Currency.objects.exists()
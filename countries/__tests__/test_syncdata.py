@@ -1,7 +1,11 @@
 import pytest
 
 from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from countries.models import Country, Currency
+from countries.sync import sync_feeds
+from countries.sync.diff import DELETE_BATCH_SIZE
 
 # Use these incorrect urls to test connection errors.
 COUNTRIES_API_URL_ERROR = "https://storage.googleapis.com/ac-dev-test-mock-api/error/countries.json"
@@ -9,6 +13,38 @@ CURRENCIES_API_URL_ERROR = "https://storage.googleapis.com/ac-dev-test-mock-api/
 
 # Code for bonus task.
 
+# Build feeds in the format of the mock API from the current contents of the
+# database, so the diff engine can be tested without network access.
+def feeds_from_db():
+    countries_list = [
+        {
+            "code": country.symbol,
+            "name": country.name,
+            "currencies": [currency.symbol 
+                            for currency in country.currencies.all()],
+        }
+        for country in Country.objects.prefetch_related("currencies")
+    ]
+    currencies_list = [
+        {"code": currency.symbol, "name": currency.name}
+        for currency in Currency.objects.all()
+    ]
+    return countries_list, currencies_list
+
+
+def synthetic_feeds(size):
+    countries_list = [
+        {"code": "Z{:05d}".format(i), "name": "Country {}".format(i),
+            "currencies": ["Y{:05d}".format(i), "USD"]}
+        for i in range(size)
+    ]
+    currencies_list = [
+        {"code": "Y{:05d}".format(i), "name": "Currency {}".format(i)}
+        for i in range(size)
+    ]
+    return countries_list, currencies_list
+
+
 @pytest.mark.django_db
 class TestSyncData:
 
@@ -124,4 +160,75 @@ class TestSyncData:
         with pytest.raises(Exception):
             self.call_command(currencies_url=CURRENCIES_API_URL_ERROR)
         with pytest.raises(Exception):
-            self.call_command(currencies_url="")
\ No newline at end of file
+            self.call_command(currencies_url="")
+
+    def test_sync_feeds(self):
+        countries_list, currencies_list = feeds_from_db()
+
+        self.add_fake_data()
+        self.delete_remove_real_data()
+
+        report = sync_feeds(countries_list, currencies_list)
+
+        assert len(Country.objects.filter(symbol__in=["UFP", "PXL"])) == 0
+        assert len(Currency.objects.filter(
+            symbol__in=["FGPL", "GC", "PXD"])) == 0
+        assert Currency.objects.get(symbol="USD") not in Country.objects.get(
+            symbol="GBR").currencies.all()
+        assert Country.objects.get(symbol="CHN").name == "China"
+        assert Currency.objects.get(symbol="CNY").name == "Yuan Renminbi"
+        assert len(Country.objects.filter(symbol__in=["AUS", "AUT"])) == 2
+        assert len(Currency.objects.filter(symbol="USN")) == 1
+        assert Currency.objects.get(symbol="USD") in Country.objects.get(
+            symbol="USA").currencies.all()
+
+        assert report.countries_created == 2
+        assert report.countries_updated == 1
+        assert report.countries_deleted == 2
+        assert report.currencies_created == 1
+        assert report.currencies_updated == 1
+        assert report.currencies_deleted == 3
+
+        # A second run has nothing left to do.
+        assert sync_feeds(countries_list, currencies_list).total == 0
+
+    def test_sync_feeds_num_queries(self):
+        # The number of queries must not depend on the size of the feeds.
+        countries_list, currencies_list = feeds_from_db()
+        num_queries = []
+        for size in (10, 200):
+            extra_countries, extra_currencies = synthetic_feeds(size)
+            with CaptureQueriesContext(connection) as context:
+                report = sync_feeds(countries_list + extra_countries, 
+                                    currencies_list + extra_currencies)
+            assert report.countries_created == size
+            assert report.links_created == 2 * size
+            num_queries.append(len(context.captured_queries))
+
+            with CaptureQueriesContext(connection) as context:
+                report = sync_feeds(countries_list, currencies_list)
+            assert report.countries_deleted == size
+            num_queries.append(len(context.captured_queries))
+
+        assert num_queries[0] == num_queries[2]
+        assert num_queries[1] == num_queries[3]
+
+    def test_symbols_are_unique(self):
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Currency.objects.create(name="Dup Dollar", symbol="USD")
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Country.objects.create(name="Dupstralia", symbol="AUS")
+
+    def test_sync_feeds_deletes_in_batches(self):
+        # More rows than one DELETE statement takes.
+        countries_list, currencies_list = feeds_from_db()
+        size = DELETE_BATCH_SIZE + 1
+        extra_countries, extra_currencies = synthetic_feeds(size)
+        sync_feeds(countries_list + extra_countries, 
+                   currencies_list + extra_currencies)
+
+        report = sync_feeds(countries_list, currencies_list)
+        assert report.countries_deleted == size
+        assert report.currencies_deleted == size
+        assert report.links_deleted == 2 * size
+        assert feeds_from_db() == (countries_list, currencies_list)
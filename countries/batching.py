@@ -0,0 +1,166 @@
+"""
+Batches of GraphQL operations in one HTTP request.
+
+A page that sends several queries, such as a ``countries(search:)`` for each
+of its autocomplete boxes, can POST them together as a JSON array of the
+usual request objects::
+
+    [{"query": "...", "variables": {"search": "aus"}},
+     {"query": "...", "variables": {"search": "fra"}}]
+
+and gets back a JSON array of the usual results, in the same order. The
+status is ``200 OK`` whether or not the operations succeed, each result
+having its own ``errors``; only a batch that is empty or longer than
+``MAX_OPERATIONS`` is a bad request.
+
+The operations of a batch share one GraphQL context, and with it the
+loaders of ``countries.loaders`` and the read model of the request:
+
+- operations that are the same, query, variables and operation name, are
+  executed once, and repeated searches are queried once;
+- before any operation is executed, the ``countries`` fields of all of them
+  are found in their documents and their searches queried, and the
+  countries found are handed to the loaders. The first operation that
+  selects currencies then loads those of the countries of every operation
+  in one statement, and the others find theirs loaded.
+
+When the result cache or the read model is on, ``countries`` is not queried
+through the ORM, and there is nothing to load ahead.
+
+Configured by ``settings.COUNTRIES_BATCH``.
+"""
+import json
+
+from ariadne.graphql import validate_data
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from graphql import (
+    FragmentDefinitionNode,
+    GraphQLError,
+    OperationType,
+    get_operation_ast,
+)
+from graphql.execution.values import get_argument_values
+
+from countries import read_model
+from countries.cache import get_config as get_cache_config, normalize
+from countries.documents import document_cache
+from countries.loaders import Loaders
+from countries.selection import field_nodes, node_selected_fields
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_OPERATIONS": 20,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_BATCH", {})}
+
+
+def is_batch(data):
+    return isinstance(data, list) and get_config()["ENABLED"]
+
+
+def check(operations):
+    """The reason a batch cannot be executed, or None."""
+    if not operations:
+        return "A batch must contain at least one operation."
+    limit = get_config()["MAX_OPERATIONS"]
+    if len(operations) > limit:
+        return "A batch may contain at most {} operations.".format(limit)
+    return None
+
+
+def operation_key(data):
+    """The same for operations that are the same."""
+    return json.dumps(data, sort_keys=True)
+
+
+def encode(result):
+    # As JsonResponse would.
+    return json.dumps(result, cls=DjangoJSONEncoder).encode()
+
+
+def response_body(results):
+    """The JSON array of the encoded results."""
+    return b"[" + b",".join(results) + b"]"
+
+
+class Batch:
+    """The countries of each search of a batch, queried once."""
+
+    def __init__(self):
+        self.results = {}
+
+    def get_or_compute(self, search, compute):
+        key = normalize(search)
+        try:
+            return self.results[key]
+        except KeyError:
+            pass
+        result = self.results[key] = compute()
+        return result
+
+
+def get_batch(info):
+    """The batch the operation of ``info`` belongs to, or None."""
+    if not isinstance(info.context, dict):
+        return None
+    return info.context.get("batch")
+
+
+def countries_fields(schema, data):
+    """
+    Yield the search of each ``countries`` field of an operation, and
+    whether it selects the currencies of the countries.
+
+    Operations that would fail are left to the executor to report.
+    """
+    try:
+        data = document_cache.resolve_persisted_query(data)
+        validate_data(data)
+        document, errors = document_cache.get_document(schema, data["query"])
+    except GraphQLError:
+        return
+    if errors:
+        return
+    operation = get_operation_ast(document, data.get("operationName"))
+    if operation is None or operation.operation != OperationType.QUERY:
+        return
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    field = schema.query_type.fields["countries"]
+    for node in field_nodes(operation.selection_set, fragments):
+        if node.name.value != "countries":
+            continue
+        try:
+            arguments = get_argument_values(field, node, data.get("variables") or {})
+        except GraphQLError:
+            continue
+        selects_currencies = "currencies" in node_selected_fields([node], fragments)
+        yield arguments.get("search"), selects_currencies
+
+
+def prefetch(schema, operations, context):
+    """
+    Query the searches of all the operations, and hand the countries found
+    to the loaders of ``context``, the context they share.
+    """
+    if not isinstance(context, dict):
+        return
+    if read_model.get_config()["ENABLED"] or get_cache_config()["ENABLED"]:
+        return
+    # Which imports this module.
+    from countries.schema import countries_rows
+
+    batch = context.setdefault("batch", Batch())
+    loaders = context.setdefault("loaders", Loaders())
+    for data in operations:
+        for search, selects_currencies in countries_fields(schema, data):
+            countries = batch.get_or_compute(search, lambda: countries_rows(search))
+            if selects_currencies:
+                loaders.prime("Country", countries)
@@ -0,0 +1,144 @@
+"""
+Cache for the results of the countries query.
+
+Results are keyed by the normalized search term and the data generation, a
+token that changes whenever the data does: ``syncdata`` and the model
+signals send ``countries.signals.data_changed`` once their transaction
+commits, and that replaces the token. Entries of older generations are never
+read again and age out.
+
+There are two levels. An in-process LRU dict holds up to ``MAX_ENTRIES``
+results and serves them without any copying. Behind it, the Django cache
+``ALIAS`` stores the pickled results and the generation token, so that they
+are shared by every process using that cache. ``MAX_ENTRIES`` does not apply
+there: that level is only bounded by the backend's own limits, such as the
+``MAX_ENTRIES`` option of the local-memory and file-based backends, and by
+``TIMEOUT``. Use a shared backend such as
+the file-based cache if ``syncdata`` runs in a different process from the web
+server; with the local-memory backend the web server only sees changes made
+in its own process, until ``TIMEOUT`` expires its entries.
+
+Configured by ``settings.COUNTRIES_RESULT_CACHE``, off by default.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+GENERATION_KEY = "countries:generation"
+
+DEFAULTS = {
+    "ENABLED": False,
+    "ALIAS": "default",
+    "MAX_ENTRIES": 256,
+    "TIMEOUT": 300,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_RESULT_CACHE", {})}
+
+
+def current_generation():
+    cache = caches[get_config()["ALIAS"]]
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Never stored, or evicted. A new random token cannot collide with
+        # the keys of any earlier generation.
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    caches[get_config()["ALIAS"]].set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def normalize(search):
+    if not search:
+        return ""
+    # The database only ignores case for ASCII in LIKE, so only fold that.
+    return search.casefold() if search.isascii() else search
+
+
+class LRUCache:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self.entries[key]
+
+    def set(self, key, value, max_entries):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ResultCache:
+    def __init__(self):
+        self.local = LRUCache()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_compute(self, search, compute):
+        """Return the cached result for ``search``, or compute and store it."""
+        config = get_config()
+        key = "countries:{}:{}".format(current_generation(), normalize(search))
+
+        result = self.local.get(key)
+        if result is not None:
+            self._count("local_hits")
+            return result
+
+        shared = caches[config["ALIAS"]]
+        result = shared.get(key)
+        if result is not None:
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            result = compute()
+            shared.set(key, result, timeout=config["TIMEOUT"])
+        if config["MAX_ENTRIES"]:
+            self.local.set(key, result, config["MAX_ENTRIES"])
+        return result
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        hits = self.local_hits + self.shared_hits
+        return {
+            "enabled": get_config()["ENABLED"],
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "local_entries": len(self.local),
+        }
+
+
+result_cache = ResultCache()
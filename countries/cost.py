@@ -0,0 +1,271 @@
+"""
+Static cost analysis of GraphQL queries, run as a validation rule.
+
+A query is rejected before any resolver runs if it would cost more than
+``MAX_COST`` or nest fields deeper than ``MAX_DEPTH``. The cost counts
+every field the response would hold: a field costs 1, plus the cost of its
+own fields, times the number of items if it is a list. The number of items
+of a list field is taken from ``LIST_SIZES``, by ``"Type.field"``, or is
+the page size of a connection, given by the ``first`` argument of the field
+above it. Aliased fields are counted as many times as they are selected,
+so that a query selecting ``countries`` under a hundred aliases costs a
+hundred times as much as one that selects it once.
+
+The estimate is made from the document alone, so that it is cached with
+it: a ``first`` given by a variable is counted at its default value, or at
+the largest page size if it has none. Introspection fields are not
+counted. Each fragment is estimated once for each type and page size it is
+spread at. The estimate stops as soon as the cost goes over ``MAX_COST``,
+so the cost reported for a rejected query is only a lower bound.
+
+The cost of a query is sent back in the ``cost`` extension of its
+response. Documents are validated once and then cached by
+``countries.documents``, which also adds ``QueryCostRule`` to the rules of
+every document, so clear ``document_cache`` after changing the limits.
+
+Configured by ``settings.COUNTRIES_QUERY_COST``.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    IntValueNode,
+    OperationDefinitionNode,
+    ValidationRule,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+)
+
+from countries.cache import LRUCache
+from countries.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_COST": 50000,
+    "MAX_DEPTH": 10,
+    # About the number of rows, for the lists that are not paginated.
+    "LIST_SIZES": {
+        "Query.countries": 250,
+        "Country.currencies": 2,
+        "Currency.countries": 10,
+    },
+    # For any other list that is not a page of a connection.
+    "DEFAULT_LIST_SIZE": 20,
+}
+
+# Of ``estimates``, more than the documents ``document_cache`` keeps.
+MAX_ENTRIES = 1024
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_QUERY_COST", {})}
+
+
+@dataclass(frozen=True)
+class QueryCost:
+    cost: int
+    depth: int
+
+
+def _page_size(field, variable_defaults):
+    """The number of edges a connection field with ``first`` would return."""
+    for argument in field.arguments:
+        if argument.name.value != "first":
+            continue
+        value = argument.value
+        if isinstance(value, VariableNode):
+            value = variable_defaults.get(value.name.value)
+        if isinstance(value, IntValueNode):
+            return min(max(int(value.value), 0), MAX_PAGE_SIZE)
+        return MAX_PAGE_SIZE
+    return DEFAULT_PAGE_SIZE
+
+
+class _Estimator:
+    def __init__(self, schema, fragments, config):
+        self.schema = schema
+        self.fragments = fragments
+        self.list_sizes = config["LIST_SIZES"]
+        self.default_list_size = config["DEFAULT_LIST_SIZE"]
+        self.max_cost = config["MAX_COST"]
+
+    def operation(self, operation):
+        self.variable_defaults = {
+            definition.variable.name.value: definition.default_value
+            for definition in operation.variable_definitions or ()
+        }
+        # The (cost, depth) of the fragments by name, type and page size. The
+        # page sizes depend on the variables of the operation.
+        self.spreads = {}
+        root = self.schema.get_root_type(operation.operation)
+        return self.selection_set(operation.selection_set, root, None, frozenset())
+
+    def selection_set(self, selection_set, parent_type, page_size, fragments):
+        """
+        Return the (cost, depth) of the fields of ``selection_set``, or of
+        those up to where the cost goes over ``MAX_COST``.
+        """
+        cost = depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field(
+                    selection, parent_type, page_size, fragments
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                # Cycles are reported by the rules of the spec.
+                if fragment is None or name in fragments:
+                    continue
+                key = (name, parent_type.name, page_size)
+                if key not in self.spreads:
+                    # Walked once, or a chain of fragments that each spread
+                    # the next twice would take exponential time.
+                    self.spreads[key] = self.fragment(
+                        fragment, parent_type, page_size, fragments | {name}
+                    )
+                field_cost, field_depth = self.spreads[key]
+            else:
+                field_cost, field_depth = self.fragment(
+                    selection, parent_type, page_size, fragments
+                )
+            cost += field_cost
+            depth = max(depth, field_depth)
+            if cost > self.max_cost:
+                break
+        return cost, depth
+
+    def fragment(self, fragment, parent_type, page_size, fragments):
+        fragment_type = parent_type
+        if fragment.type_condition is not None:
+            fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+        if fragment_type is None:
+            return 0, 0
+        return self.selection_set(
+            fragment.selection_set, fragment_type, page_size, fragments
+        )
+
+    def field(self, field, parent_type, page_size, fragments):
+        name = field.name.value
+        definition = getattr(parent_type, "fields", {}).get(name)
+        if name.startswith("__") or definition is None:
+            return 0, 0
+
+        items = 1
+        field_type = get_nullable_type(definition.type)
+        if is_list_type(field_type):
+            items = self.list_sizes.get("{}.{}".format(parent_type.name, name))
+            if items is None:
+                items = self.default_list_size if page_size is None else page_size
+        if field.selection_set is None:
+            return items, 1
+
+        child_page_size = None
+        if "first" in definition.args:
+            child_page_size = _page_size(field, self.variable_defaults)
+        cost, depth = self.selection_set(
+            field.selection_set,
+            get_named_type(definition.type),
+            child_page_size,
+            fragments,
+        )
+        return items * (1 + cost), depth + 1
+
+
+# The estimates of the recent documents, which hold on to their documents so
+# that their ids are not reused. Clear it after changing the settings.
+estimates = LRUCache()
+
+
+def estimate(schema, document):
+    """Return the ``QueryCost`` of each operation of ``document`` by name."""
+    entry = estimates.get(id(document))
+    if entry is not None and entry[0] is document:
+        return entry[1]
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if not isinstance(definition, OperationDefinitionNode)
+    }
+    estimator = _Estimator(schema, fragments, get_config())
+    costs = {}
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode):
+            cost, depth = estimator.operation(definition)
+            name = definition.name.value if definition.name else None
+            costs[name] = QueryCost(cost, depth)
+    estimates.set(id(document), (document, costs), MAX_ENTRIES)
+    return costs
+
+
+def operation_cost(schema, document, operation_name=None):
+    """The ``QueryCost`` of the operation a request runs, or None."""
+    costs = estimate(schema, document)
+    if operation_name is None:
+        return next(iter(costs.values())) if len(costs) == 1 else None
+    return costs.get(operation_name)
+
+
+class QueryCostRule(ValidationRule):
+    """Report the operations over the cost or depth budget."""
+
+    def enter_document(self, node, *args):
+        config = get_config()
+        costs = estimate(self.context.schema, node)
+        for definition in node.definitions:
+            if not isinstance(definition, OperationDefinitionNode):
+                continue
+            query_cost = costs[definition.name.value if definition.name else None]
+            if query_cost.cost > config["MAX_COST"]:
+                self.report_error(
+                    GraphQLError(
+                        "The query costs at least {}, more than the maximum of {}.".format(
+                            query_cost.cost, config["MAX_COST"]
+                        ),
+                        definition,
+                        extensions={
+                            "code": "QUERY_COST_EXCEEDED",
+                            "cost": query_cost.cost,
+                            "maxCost": config["MAX_COST"],
+                        },
+                    )
+                )
+            if query_cost.depth > config["MAX_DEPTH"]:
+                self.report_error(
+                    GraphQLError(
+                        "The query is {} fields deep, more than the maximum "
+                        "of {}.".format(query_cost.depth, config["MAX_DEPTH"]),
+                        definition,
+                        extensions={
+                            "code": "QUERY_DEPTH_EXCEEDED",
+                            "depth": query_cost.depth,
+                            "maxDepth": config["MAX_DEPTH"],
+                        },
+                    )
+                )
+        return self.SKIP
+
+
+def validation_rules():
+    return [QueryCostRule] if get_config()["ENABLED"] else []
+
+
+def response_extensions(schema, document, operation_name=None):
+    """The ``cost`` extension of the response to a request, if any."""
+    if not get_config()["ENABLED"]:
+        return {}
+    query_cost = operation_cost(schema, document, operation_name)
+    if query_cost is None:
+        return {}
+    return {
+        "cost": {
+            "estimated": query_cost.cost,
+            "maximum": get_config()["MAX_COST"],
+            "depth": query_cost.depth,
+        }
+    }
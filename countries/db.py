@@ -0,0 +1,103 @@
+"""
+Database routing and SQLite connection settings.
+
+``ReadReplicaRouter`` sends reads to ``READ_ALIAS`` and writes to
+``WRITE_ALIAS``. With SQLite both aliases name the same file: the read alias
+is a second set of connections that are opened with ``query_only``, so that
+nothing served by the GraphQL endpoint can write through them. Reads made
+inside a transaction of the write alias, such as those of ``syncdata``, stay
+on it, so that they see the transaction's own changes.
+
+Every SQLite connection runs ``PRAGMAS`` when it opens. In WAL mode readers
+do not wait for a writer, nor a writer for readers: a ``syncdata`` in
+progress holds the write lock for the length of its transaction, and the
+readers keep on reading the last committed data until it commits. WAL mode
+is stored in the database file, the other pragmas are per connection, which
+is why connections should persist (``CONN_MAX_AGE``).
+
+Configured by ``settings.COUNTRIES_DATABASE``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+DEFAULTS = {
+    "READ_ALIAS": "replica",
+    "WRITE_ALIAS": "default",
+    "PRAGMAS": {
+        "journal_mode": "wal",
+        # In WAL mode, only a power loss can lose the last transactions, and
+        # the database stays consistent.
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        # In KiB when negative.
+        "cache_size": -16 * 1024,
+    },
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_DATABASE", {})}
+
+
+def read_alias():
+    """The alias to read from, which is the write alias if there is no other."""
+    config = get_config()
+    if config["READ_ALIAS"] in settings.DATABASES:
+        return config["READ_ALIAS"]
+    return config["WRITE_ALIAS"]
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        write_alias = get_config()["WRITE_ALIAS"]
+        if connections[write_alias].in_atomic_block:
+            return write_alias
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return get_config()["WRITE_ALIAS"]
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {read_alias(), get_config()["WRITE_ALIAS"]}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The read alias is the same database.
+        return db == get_config()["WRITE_ALIAS"]
+
+
+def in_worker_thread(function):
+    """
+    ``function`` as a coroutine function run by ``sync_to_async`` in a
+    thread of the executor, rather than in the thread of the request.
+
+    Django closes the connections of the request's thread that are past
+    ``CONN_MAX_AGE`` or broken when a request starts and ends, but never
+    those of the executor's threads, so they are checked around each call.
+    """
+
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def configure_connection(connection):
+    """Run the pragmas of a new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    config = get_config()
+    pragmas = dict(config["PRAGMAS"])
+    if connection.alias != config["WRITE_ALIAS"]:
+        pragmas["query_only"] = "on"
+    # On the sqlite3 connection, so that the execute wrappers and the query
+    # counts of the request that opened it leave them out.
+    for name, value in pragmas.items():
+        connection.connection.execute("PRAGMA {} = {}".format(name, value))
@@ -0,0 +1,358 @@
+"""
+Cache of parsed and validated GraphQL documents, and persisted queries.
+
+Parsing and validating the query text costs more than executing most of the
+queries our clients send, and they send the same few queries over and over.
+``DocumentCache`` keeps the ``DocumentNode`` of every query that passed
+validation in an LRU dict, keyed by the sha256 of the query text, so that a
+repeated query goes straight to execution. Queries that fail to parse or
+validate are not cached.
+
+The same hash is the id of a persisted query, following the protocol of
+Apollo's automatic persisted queries: a client sends
+
+    {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "..."}}}
+
+without a ``query``. If the server does not know the hash it answers with a
+``PERSISTED_QUERY_NOT_FOUND`` error, and the client sends the hash again
+together with the query text, which registers it. The query texts are also
+stored in the Django cache ``ALIAS``, so that a query registered with one
+process is known to the others. That cache must be shared by the processes,
+as the file-based ``countries`` cache is: with a per-process cache such as
+locmem, a query registered with one process is unknown to the next.
+
+Configured by ``settings.COUNTRIES_DOCUMENT_CACHE``.
+"""
+import hashlib
+import threading
+from inspect import isawaitable
+
+from ariadne.extensions import ExtensionManager
+from ariadne.format_error import format_error
+from ariadne.graphql import (
+    handle_graphql_errors,
+    handle_query_result,
+    parse_query,
+    validate_data,
+    validate_query,
+)
+from django.conf import settings
+from django.core.cache import caches
+from graphql import ExecutionContext, GraphQLError, execute, execute_sync
+
+from countries import cost
+from countries.cache import LRUCache
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 512,
+    "PERSISTED_QUERIES": True,
+    "ALIAS": "countries",
+    "TIMEOUT": None,
+}
+
+PERSISTED_QUERY_VERSION = 1
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_DOCUMENT_CACHE", {})}
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def persisted_query_error(message, code):
+    return GraphQLError(message, extensions={"code": code})
+
+
+class DocumentCache:
+    def __init__(self):
+        self.local = LRUCache()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        self.local.clear()
+
+    def _key(self, schema, digest, introspection, validation_rules):
+        # Validation depends on the schema, on whether introspection is
+        # allowed and on the rules besides those of the spec.
+        return (id(schema), digest, introspection, tuple(validation_rules))
+
+    def get_document(
+        self, schema, query, introspection=True, validation_rules=None, cache=True
+    ):
+        """
+        Return the parsed and validated document of ``query``.
+
+        Raises ``GraphQLError`` if it does not parse, and returns a list of
+        errors instead of a document if it does not validate.
+        """
+        config = get_config()
+        # Every query is checked against the cost budget, see countries/cost.py.
+        validation_rules = [*(validation_rules or ()), *cost.validation_rules()]
+        cacheable = cache and config["ENABLED"]
+        if cacheable:
+            key = self._key(schema, query_hash(query), introspection, validation_rules)
+            document = self.local.get(key)
+            if document is not None:
+                self._count("hits")
+                return document, []
+            self._count("misses")
+
+        document = parse_query(query)
+        errors = validate_query(
+            schema, document, validation_rules, enable_introspection=introspection
+        )
+        if errors:
+            return None, errors
+        if cacheable and config["MAX_ENTRIES"]:
+            self.local.set(key, document, config["MAX_ENTRIES"])
+        return document, []
+
+    def resolve_persisted_query(self, data):
+        """
+        Return ``data`` with the text of its persisted query filled in.
+
+        Data without a ``persistedQuery`` extension is returned unchanged.
+        """
+        if not isinstance(data, dict):
+            return data
+        extensions = data.get("extensions")
+        persisted = (
+            extensions.get("persistedQuery") if isinstance(extensions, dict) else None
+        )
+        if persisted is None:
+            return data
+
+        config = get_config()
+        if not config["PERSISTED_QUERIES"]:
+            raise persisted_query_error(
+                "PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+        if (
+            not isinstance(persisted, dict)
+            or persisted.get("version") != PERSISTED_QUERY_VERSION
+        ):
+            raise persisted_query_error(
+                "Unsupported persisted query version.", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+        digest = persisted.get("sha256Hash")
+        if not isinstance(digest, str):
+            raise GraphQLError("The sha256Hash of a persisted query must be a string.")
+
+        shared = caches[config["ALIAS"]]
+        key = "countries:query:{}".format(digest.lower())
+        query = data.get("query")
+        if query is None:
+            query = shared.get(key)
+            if query is None:
+                raise persisted_query_error(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return {**data, "query": query}
+
+        if not isinstance(query, str) or query_hash(query) != digest.lower():
+            raise GraphQLError("The sha256Hash does not match the query.")
+        shared.set(key, query, timeout=config["TIMEOUT"])
+        return data
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": get_config()["ENABLED"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "entries": len(self.local),
+        }
+
+
+document_cache = DocumentCache()
+
+
+def _document(schema, data, context_value, introspection, validation_rules):
+    """
+    Return the document, variables and operation name of a request.
+
+    Raises ``GraphQLError`` for bad request data; validation errors are
+    returned in place of the document.
+    """
+    data = document_cache.resolve_persisted_query(data)
+    validate_data(data)
+    query, variables, operation_name = (
+        data["query"],
+        data.get("variables"),
+        data.get("operationName"),
+    )
+
+    # Rules given as a callable depend on the request data, and the
+    # documents they validate cannot be shared between requests.
+    cache = not callable(validation_rules)
+    if not cache:
+        validation_rules = validation_rules(context_value, parse_query(query), data)
+    document, validation_errors = document_cache.get_document(
+        schema, query, introspection, validation_rules, cache
+    )
+    return document, validation_errors, variables, operation_name
+
+
+def _add_cost(response, schema, document, operation_name):
+    extensions = cost.response_extensions(schema, document, operation_name)
+    if extensions:
+        response.setdefault("extensions", {}).update(extensions)
+    return response
+
+
+def graphql_sync(
+    schema,
+    data,
+    *,
+    context_value=None,
+    root_value=None,
+    debug=False,
+    introspection=True,
+    logger=None,
+    validation_rules=None,
+    error_formatter=format_error,
+    middleware=None,
+    extensions=None,
+    execution_context_class=ExecutionContext,
+    **kwargs,
+):
+    """
+    ``ariadne.graphql_sync``, with the document taken from ``document_cache``.
+
+    Takes the same arguments and returns the same ``(success, result)``.
+    """
+    extension_manager = ExtensionManager(extensions, context_value)
+
+    with extension_manager.request():
+        try:
+            document, validation_errors, variables, operation_name = _document(
+                schema, data, context_value, introspection, validation_rules
+            )
+            if validation_errors:
+                return handle_graphql_errors(
+                    validation_errors,
+                    logger=logger,
+                    error_formatter=error_formatter,
+                    debug=debug,
+                    extension_manager=extension_manager,
+                )
+
+            if callable(root_value):
+                root_value = root_value(context_value, document)
+                if isawaitable(root_value):
+                    raise RuntimeError(
+                        "Root value resolver can't be asynchronous "
+                        "in synchronous query executor."
+                    )
+
+            result = execute_sync(
+                schema,
+                document,
+                root_value=root_value,
+                context_value=context_value,
+                variable_values=variables,
+                operation_name=operation_name,
+                execution_context_class=execution_context_class,
+                middleware=extension_manager.as_middleware_manager(middleware),
+                **kwargs,
+            )
+        except GraphQLError as error:
+            return handle_graphql_errors(
+                [error],
+                logger=logger,
+                error_formatter=error_formatter,
+                debug=debug,
+                extension_manager=extension_manager,
+            )
+        else:
+            success, response = handle_query_result(
+                result,
+                logger=logger,
+                error_formatter=error_formatter,
+                debug=debug,
+                extension_manager=extension_manager,
+            )
+            return success, _add_cost(response, schema, document, operation_name)
+
+
+async def graphql(
+    schema,
+    data,
+    *,
+    context_value=None,
+    root_value=None,
+    debug=False,
+    introspection=True,
+    logger=None,
+    validation_rules=None,
+    error_formatter=format_error,
+    middleware=None,
+    extensions=None,
+    execution_context_class=ExecutionContext,
+    **kwargs,
+):
+    """``ariadne.graphql``, with the document taken from ``document_cache``."""
+    extension_manager = ExtensionManager(extensions, context_value)
+
+    with extension_manager.request():
+        try:
+            document, validation_errors, variables, operation_name = _document(
+                schema, data, context_value, introspection, validation_rules
+            )
+            if validation_errors:
+                return handle_graphql_errors(
+                    validation_errors,
+                    logger=logger,
+                    error_formatter=error_formatter,
+                    debug=debug,
+                    extension_manager=extension_manager,
+                )
+
+            if callable(root_value):
+                root_value = root_value(context_value, document)
+                if isawaitable(root_value):
+                    root_value = await root_value
+
+            result = execute(
+                schema,
+                document,
+                root_value=root_value,
+                context_value=context_value,
+                variable_values=variables,
+                operation_name=operation_name,
+                execution_context_class=execution_context_class,
+                middleware=extension_manager.as_middleware_manager(middleware),
+                **kwargs,
+            )
+            if isawaitable(result):
+                result = await result
+        except GraphQLError as error:
+            return handle_graphql_errors(
+                [error],
+                logger=logger,
+                error_formatter=error_formatter,
+                debug=debug,
+                extension_manager=extension_manager,
+            )
+        else:
+            success, response = handle_query_result(
+                result,
+                logger=logger,
+                error_formatter=error_formatter,
+                debug=debug,
+                extension_manager=extension_manager,
+            )
+            return success, _add_cost(response, schema, document, operation_name)
@@ -0,0 +1,111 @@
+"""
+HTTP caching of GraphQL queries sent with GET.
+
+Besides POST, ``/graphql/`` takes a query in the query string, as in
+
+    GET /graphql/?query={countries{name}}&variables={"search":"aus"}
+
+or a persisted query with only its ``extensions``. Successful responses to
+such requests carry a strong ETag and ``Cache-Control: public, max-age=N``,
+so that clients and edge caches can keep them and revalidate them cheaply.
+
+The ETag hashes the query hash, the variables, the operation name and the
+data generation of ``countries.cache``, which ``syncdata`` and the model
+signals replace whenever the data changes. A request whose
+``If-None-Match`` names the current ETag gets ``304 Not Modified`` for the
+price of reading the generation token, without running the query. The
+token must be kept in a cache shared with the process that runs
+``syncdata`` for the ETags to follow its changes (see ``settings.CACHES``).
+
+Configured by ``settings.COUNTRIES_HTTP_CACHE``.
+"""
+import hashlib
+import json
+
+from ariadne.exceptions import HttpBadRequestError
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+from countries import cache
+from countries.documents import query_hash
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_AGE": 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_HTTP_CACHE", {})}
+
+
+def is_query_request(request):
+    """Whether a GET request sends a query, rather than asks for the playground."""
+    return "query" in request.GET or "extensions" in request.GET
+
+
+def data_from_query_string(query_dict):
+    """Return the request a GET query string sends, as it would be POSTed."""
+    data = {}
+    for name in ("query", "operationName"):
+        if name in query_dict:
+            data[name] = query_dict[name]
+    for name in ("variables", "extensions"):
+        if name in query_dict:
+            try:
+                data[name] = json.loads(query_dict[name])
+            except ValueError as error:
+                raise HttpBadRequestError(
+                    "The {} parameter is not valid JSON.".format(name)
+                ) from error
+    return data
+
+
+def _query_digest(data):
+    if isinstance(data.get("query"), str):
+        return query_hash(data["query"])
+    try:
+        return str(data["extensions"]["persistedQuery"]["sha256Hash"])
+    except (KeyError, TypeError):
+        return None
+
+
+def etag(data, gzipped=False):
+    """
+    The ETag of the response to ``data`` for the current data.
+
+    Gzipped bodies are different representations, and get different ETags.
+    """
+    key = json.dumps(
+        [
+            _query_digest(data),
+            data.get("variables"),
+            data.get("operationName"),
+            cache.current_generation(),
+            gzipped,
+        ],
+        sort_keys=True,
+    )
+    return '"{}"'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def patch_response(response, tag):
+    """Add the validator and the caching headers to a successful response."""
+    if response.status_code in (200, 304):
+        response["ETag"] = tag
+        patch_cache_control(response, public=True, max_age=get_config()["MAX_AGE"])
+        # Snapshots are sent gzipped to the clients that accept it.
+        patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def not_modified(request, tag):
+    """Return a 304 response if the client has the current response, or None."""
+    response = get_conditional_response(request, etag=tag)
+    if response is None:
+        return None
+    return patch_response(response, tag)
@@ -0,0 +1,166 @@
+"""
+Per-request batching of the ``Country.currencies`` and ``Currency.countries``
+fields.
+
+GraphQL resolves the fields of a list one item at a time, so a resolver that
+queries the currencies of its own country runs one query per country. A
+DataLoader collects the keys of all the items first and fetches them in one
+query. The JavaScript DataLoader waits for the next tick of the event loop to
+do that, but graphql-core resolves synchronous fields depth first, and there
+is no later point at which the keys of the other items are known.
+
+So the keys are handed to the loaders up front instead.
+``LoaderExecutionContext`` gives every list of objects it completes to the
+loaders of the item type, and the results of each batch are given to the
+loaders of their type in turn. The first ``load`` then fetches everything
+pending in one query on the through table. A query of any shape runs at most
+one statement per level of nesting, per ``BATCH_SIZE`` keys.
+
+The loaders live in the GraphQL context of a request, see ``get_loaders``,
+and cache what they loaded until the request ends. Async resolvers use
+``Loader.load_async``, which runs the same queries in a worker thread.
+"""
+import asyncio
+from collections import defaultdict
+
+from graphql import ExecutionContext, get_named_type, is_object_type
+from graphql.pyutils import is_iterable
+
+from countries.db import in_worker_thread
+from countries.models import CountryCurrency
+
+# Keys per statement, well below SQLite's limit of 32766 parameters.
+BATCH_SIZE = 5000
+
+
+def object_key(obj):
+    # The result cache stores dicts rather than model instances.
+    return obj["id"] if isinstance(obj, dict) else obj.pk
+
+
+class Loader:
+    """
+    Load lists of values by key, fetching every pending key at once.
+
+    ``batch_load`` takes a list of keys and returns a dict of the values
+    found for them; keys it leaves out load as an empty list.
+    """
+
+    def __init__(self, batch_load):
+        self.batch_load = batch_load
+        self.cache = {}
+        # Insertion ordered, as a set.
+        self.pending = {}
+        # Created by the first async load, in the event loop of the request.
+        self.lock = None
+
+    def prime(self, keys):
+        """Have the next batch include ``keys``."""
+        for key in keys:
+            if key not in self.cache:
+                self.pending[key] = None
+
+    def load(self, key):
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        self.pending[key] = None
+        keys = list(self.pending)
+        self.pending.clear()
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start : start + BATCH_SIZE]
+            values = self.batch_load(batch)
+            for batch_key in batch:
+                self.cache[batch_key] = values.get(batch_key, [])
+        return self.cache[key]
+
+    async def load_async(self, key):
+        """``load`` for async resolvers, querying in a worker thread."""
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        # The resolvers of a list run concurrently. The first to get here
+        # loads the pending keys of all of them, and the others find theirs
+        # in the cache.
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            return await in_worker_thread(self.load)(key)
+
+
+class Loaders:
+    """The loaders of one request."""
+
+    def __init__(self):
+        self.country_currencies = Loader(self.load_country_currencies)
+        self.currency_countries = Loader(self.load_currency_countries)
+        # The field each loader resolves, and the type of its values.
+        self.by_type = {
+            "Country": [("currencies", self.country_currencies, "Currency")],
+            "Currency": [("countries", self.currency_countries, "Country")],
+        }
+
+    def prime(self, type_name, objects):
+        for field, loader, value_type in self.by_type.get(type_name, ()):
+            keys = []
+            embedded = []
+            for obj in objects:
+                if isinstance(obj, dict) and field in obj:
+                    # A cached result that already holds the values.
+                    embedded.extend(obj[field])
+                else:
+                    keys.append(object_key(obj))
+            loader.prime(keys)
+            if embedded:
+                self.prime(value_type, embedded)
+
+    def _load_links(self, keys, key_field, value_field, value_type, order_by):
+        links = (
+            CountryCurrency.objects.filter(**{key_field + "_id__in": keys})
+            .select_related(value_field)
+            .order_by(*order_by)
+        )
+        values = defaultdict(list)
+        # One instance per row, however many keys it belongs to.
+        instances = {}
+        for link in links:
+            value = getattr(link, value_field)
+            value = instances.setdefault(value.pk, value)
+            values[getattr(link, key_field + "_id")].append(value)
+        self.prime(value_type, instances.values())
+        return values
+
+    def load_country_currencies(self, country_ids):
+        # In the order of the feed.
+        return self._load_links(country_ids, "country", "currency", "Currency", ["pk"])
+
+    def load_currency_countries(self, currency_ids):
+        return self._load_links(
+            currency_ids, "currency", "country", "Country", ["country__name"]
+        )
+
+
+def get_loaders(info):
+    """The loaders of the request ``info`` belongs to."""
+    loaders = info.context.get("loaders")
+    if loaders is None:
+        loaders = info.context["loaders"] = Loaders()
+    return loaders
+
+
+class LoaderExecutionContext(ExecutionContext):
+    """Hands the objects of every list to the loaders of their type."""
+
+    def complete_list_value(self, return_type, field_nodes, info, path, result):
+        item_type = get_named_type(return_type)
+        if (
+            is_object_type(item_type)
+            and is_iterable(result)
+            and isinstance(info.context, dict)
+        ):
+            # Querysets are evaluated here rather than by the loop below.
+            result = list(result)
+            get_loaders(info).prime(item_type.name, result)
+        return super().complete_list_value(return_type, field_nodes, info, path, result)
@@ -0,0 +1,215 @@
+"""
+Replay of recorded GraphQL requests, behind ``manage.py loadtest``.
+
+The requests are read from a JSONL file, one request per line, in the shape
+clients POST to ``/graphql/``:
+
+    {"query": "query Countries($search: String) { ... }", "variables": {...}}
+
+with an optional ``"method": "GET"`` to send it in the query string
+instead. They are sent in turn, over and over if more requests are asked
+for than there are lines, by ``concurrency`` threads. With a ``rate``, the
+n-th request is due ``n / rate`` seconds after the start, and its latency
+is counted from then rather than from when a thread got to it, so that a
+server that falls behind shows up in the latencies.
+
+The target is either a running server, over HTTP, or this process through
+the Django test client. Only the latter can count the SQL queries of each
+request.
+"""
+import itertools
+import json
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import connections
+from django.test import Client
+
+from countries.sync.fetch import make_session
+
+ANONYMOUS = "(anonymous)"
+
+
+@dataclass
+class Sample:
+    operation: str
+    latency: float
+    ok: bool
+    # None when the target cannot count them.
+    queries: Optional[int] = None
+
+
+def read_requests(lines):
+    """Return the requests of a JSONL file as (method, data, operation)."""
+    requests = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            raise ValueError("Line {} is not valid JSON: {}".format(number, error))
+        if not isinstance(data, dict) or not (
+            isinstance(data.get("query"), str) or "extensions" in data
+        ):
+            raise ValueError("Line {} is not a GraphQL request.".format(number))
+        method = data.pop("method", "POST").upper()
+        if method not in ("GET", "POST"):
+            raise ValueError(
+                "Line {} has an unsupported method {!r}.".format(number, method)
+            )
+        requests.append((method, data, data.get("operationName") or ANONYMOUS))
+    if not requests:
+        raise ValueError("There are no requests to replay.")
+    return requests
+
+
+def query_string(data):
+    """The GET parameters of a request, see countries/http_cache.py."""
+    return {
+        name: value if isinstance(value, str) else json.dumps(value)
+        for name, value in data.items()
+        if value is not None
+    }
+
+
+def is_success(status_code, body):
+    if status_code != 200:
+        return False
+    try:
+        return "errors" not in json.loads(body)
+    except ValueError:
+        return False
+
+
+class InProcessTarget:
+    """Send the requests through the Django test client, counting queries."""
+
+    def __init__(self, path="/graphql/"):
+        self.path = path
+        self.local = threading.local()
+
+    def send(self, method, data):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+        count = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        # Reads and writes go through different connections.
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            if method == "GET":
+                response = client.get(self.path, query_string(data))
+            else:
+                response = client.post(self.path, data, content_type="application/json")
+        return is_success(response.status_code, response.content), count
+
+    def close(self):
+        # Each worker thread opened connections of its own.
+        connections.close_all()
+
+
+class HTTPTarget:
+    """Send the requests to a running server."""
+
+    def __init__(self, url, pool_size, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.session = make_session(pool_size)
+
+    def send(self, method, data):
+        try:
+            if method == "GET":
+                response = self.session.get(
+                    self.url, params=query_string(data), timeout=self.timeout
+                )
+            else:
+                response = self.session.post(self.url, json=data, timeout=self.timeout)
+        except OSError:
+            return False, None
+        return is_success(response.status_code, response.content), None
+
+    def close(self):
+        pass
+
+
+def replay(requests, target, total, concurrency=1, rate=None):
+    """Send ``total`` requests; return their samples and the elapsed seconds."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    samples = []
+    start = time.perf_counter()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    index = next(counter)
+                if index >= total:
+                    return
+                method, data, operation = requests[index % len(requests)]
+                if rate:
+                    due = start + index / rate
+                    time.sleep(max(0, due - time.perf_counter()))
+                else:
+                    due = time.perf_counter()
+                ok, queries = target.send(method, data)
+                sample = Sample(operation, time.perf_counter() - due, ok, queries)
+                with lock:
+                    samples.append(sample)
+        finally:
+            target.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+
+def percentile(values, percent):
+    """The nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(samples, elapsed=None):
+    latencies = sorted(sample.latency * 1000 for sample in samples)
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    summary = {
+        "requests": len(samples),
+        "errors": sum(not sample.ok for sample in samples),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+        "queries_mean": statistics.mean(queries) if queries else None,
+        "queries_max": max(queries) if queries else None,
+    }
+    if elapsed is not None:
+        summary["seconds"] = elapsed
+        summary["requests_per_second"] = len(samples) / elapsed if elapsed else None
+    return summary
+
+
+def summarize_operations(samples):
+    operations = {}
+    for sample in samples:
+        operations.setdefault(sample.operation, []).append(sample)
+    return {
+        operation: summarize(operation_samples)
+        for operation, operation_samples in sorted(operations.items())
+    }
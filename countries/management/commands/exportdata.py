@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from countries.sync.ndjson import (
+    DEFAULT_CHUNK_SIZE,
+    export_records,
+    open_dump,
+    write_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the countries, currencies and their links to a file as NDJSON, "
+        "to be loaded into another database with importdata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default="-",
+            help="File to write, or - for stdout. Gzipped if it ends in .gz.",
+        )
+        parser.add_argument("--gzip", action="store_true", help="Gzip the dump.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows fetched from the database and written at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        path = options["path"]
+        compress = options["gzip"] or path.endswith(".gz")
+        try:
+            with open_dump(path, "wb", compress) as f:
+                report = write_records(
+                    export_records(options["chunk_size"]), f, options["chunk_size"]
+                )
+        except OSError as error:
+            raise CommandError("Could not write the dump: {}".format(error))
+        # Not into the dump, when that goes to stdout.
+        output = self.stderr if path == "-" else self.stdout
+        output.write("Exported {}".format(report), style_func=None)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from countries.sync.ndjson import (
+    DEFAULT_CHUNK_SIZE,
+    import_records,
+    open_dump,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the countries, currencies and their links with those of an "
+        "NDJSON dump written by exportdata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Dump to read, or - for stdin. May be gzipped."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows inserted at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        # Nothing is changed unless the whole dump loads.
+        try:
+            with open_dump(options["path"], "rb") as f:
+                report = import_records(read_records(f), options["chunk_size"])
+        except OSError as error:
+            raise CommandError("Could not read the dump: {}".format(error))
+        except ValueError as error:
+            raise CommandError(str(error))
+        except IntegrityError as error:
+            raise CommandError("The dump is not consistent: {}".format(error))
+        self.stdout.write("Imported {}".format(report))
@@ -0,0 +1,137 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from countries.loadtest import (
+    HTTPTarget,
+    InProcessTarget,
+    read_requests,
+    replay,
+    summarize,
+    summarize_operations,
+)
+
+COLUMNS = "{:<24} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9} {:>8}"
+
+
+def format_number(value, digits=1):
+    return "-" if value is None else "{:.{}f}".format(value, digits)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a JSONL file of GraphQL requests against /graphql/ and report "
+        "throughput, latency percentiles and SQL queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="JSONL file of GraphQL requests, or - for stdin."
+        )
+        parser.add_argument(
+            "--url",
+            help="GraphQL endpoint of a running server, e.g. "
+            "http://127.0.0.1:8000/graphql/. By default the requests go "
+            "through the Django test client in this process, which also "
+            "counts their SQL queries.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            help="Number of requests to send, cycling through the file. "
+            "Defaults to one per line.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Requests in flight at once."
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            help="Requests per second to send, in total. Latencies then count "
+            "from when each request was due. Defaults to as fast as possible.",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--json", help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        if options["rate"] is not None and options["rate"] <= 0:
+            raise CommandError("--rate must be positive.")
+
+        try:
+            if options["path"] == "-":
+                requests = read_requests(sys.stdin)
+            else:
+                with open(options["path"]) as f:
+                    requests = read_requests(f)
+        except (OSError, ValueError) as error:
+            raise CommandError("Could not read the requests: {}".format(error))
+        total = options["requests"] or len(requests)
+
+        if options["url"]:
+            target = HTTPTarget(
+                options["url"], options["concurrency"], options["timeout"]
+            )
+            samples, elapsed = replay(
+                requests, target, total, options["concurrency"], options["rate"]
+            )
+        else:
+            # The test client's host, as the test runner allows it.
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+            ):
+                samples, elapsed = replay(
+                    requests,
+                    InProcessTarget(),
+                    total,
+                    options["concurrency"],
+                    options["rate"],
+                )
+
+        report = {
+            "target": options["url"] or "in-process",
+            "concurrency": options["concurrency"],
+            "rate": options["rate"],
+            **summarize(samples, elapsed),
+            "operations": summarize_operations(samples),
+        }
+        self.write_report(report)
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def write_report(self, report):
+        self.stdout.write(
+            "{requests} requests to {target} in {seconds:.2f}s: "
+            "{requests_per_second:.1f} requests/s, {errors} errors.".format(**report)
+        )
+        self.stdout.write(
+            COLUMNS.format(
+                "operation",
+                "requests",
+                "errors",
+                "p50 ms",
+                "p95 ms",
+                "p99 ms",
+                "max ms",
+                "queries",
+            )
+        )
+        rows = [*report["operations"].items(), ("total", report)]
+        for operation, summary in rows:
+            self.stdout.write(
+                COLUMNS.format(
+                    operation[:24],
+                    summary["requests"],
+                    summary["errors"],
+                    format_number(summary["p50_ms"]),
+                    format_number(summary["p95_ms"]),
+                    format_number(summary["p99_ms"]),
+                    format_number(summary["max_ms"]),
+                    format_number(summary["queries_mean"]),
+                )
+            )
@@ -1,8 +1,21 @@
-import json, requests
-from locale import currency
-
 from django.core.management.base import BaseCommand, CommandError
-from countries.models import Country, Currency
+from django.db import transaction
+from countries.sync import (
+    FetchConfig,
+    FetchError,
+    SyncReport,
+    fetch_all,
+    sync_feeds,
+)
+from countries.sync.delta import delta_url, load_sequence, parse_changes, sync_delta
+from countries.sync.stream import DEFAULT_CHUNK_SIZE, iter_feed, stream_sync
+from countries.sync.state import (
+    conditional_headers,
+    is_unchanged,
+    load_states,
+    save_states,
+    validators_changed,
+)
 
 COUNTRIES_API_URL = "https://storage.googleapis.com/ac-dev-test-mock-api/countries.json"
 CURRENCIES_API_URL = "https://storage.googleapis.com/ac-dev-test-mock-api/currencies.json"
@@ -17,145 +30,140 @@ class Command(BaseCommand):
                             default=COUNTRIES_API_URL)
         parser.add_argument("currencies_url", nargs="?", type=str, 
                             default=CURRENCIES_API_URL)
+        parser.add_argument("--timeout", type=float, default=30,
+                            help="Read timeout per request in seconds.")
+        parser.add_argument("--retries", type=int, default=3,
+                            help="Retries on connection errors and 429/5xx.")
+        parser.add_argument("--force", action="store_true",
+                            help="Sync even if the feeds have not changed.")
+        parser.add_argument("--stream", action="store_true",
+                            help="Parse the feeds as they download and sync "
+                            "them in chunks, for feeds too large to hold in "
+                            "memory.")
+        parser.add_argument("--chunk-size", type=int, 
+                            default=DEFAULT_CHUNK_SIZE,
+                            help="Rows per chunk with --stream.")
+        parser.add_argument("--delta", metavar="URL",
+                            help="Apply the change records of this feed that "
+                            "are newer than the last ones applied, instead "
+                            "of syncing the full feeds.")
 
     def handle(self, *args, **options):
 
         countries_url = options["countries_url"]
         currencies_url = options["currencies_url"]
-
-        sync_data(countries_url, currencies_url)
-
-def sync_data(countries_api_url, currencies_api_url):
+        fetch_config = FetchConfig(
+            timeout=(FetchConfig.timeout[0], options["timeout"]),
+            retries=options["retries"],
+        )
+
+        if options["delta"]:
+            report, sequence = sync_delta_data(options["delta"], fetch_config)
+            if report.skipped:
+                self.stdout.write(
+                    "No changes after sequence {}.".format(sequence))
+            else:
+                self.stdout.write("{} Applied changes up to sequence {}."
+                                    .format(report, sequence))
+            return
+
+        report = sync_data(countries_url, currencies_url, fetch_config,
+                            force=options["force"], stream=options["stream"],
+                            chunk_size=options["chunk_size"])
+        self.stdout.write(str(report))
+
+def sync_data(countries_api_url, currencies_api_url, fetch_config=None, 
+                force=False, stream=False, chunk_size=DEFAULT_CHUNK_SIZE):
     # TODO: Add a function that syncs the data in the APIs above with the data in the database
 
     # Notes on solution.
     # I opted to use the requests for HTTP access, a fairly standard choice.
     # I have assumed thorughout that the symbols/codes are unique identifiers.
-    # I did consider a few different ways of implementing this task, but
-    # since neither contries or currencies change very frequently, I went for 
-    # simplicity over speed or optimization.
+    # The first version looked every row up individually; it is now a
+    # set-based diff so the number of queries does not depend on the size of
+    # the feeds.
 
-    # Connect to the API.
+    urls = {"countries": countries_api_url, "currencies": currencies_api_url}
+
+    # Download both feeds at the same time over a pooled session, retrying
+    # transient failures, see countries/sync/fetch.py. The requests are
+    # conditional on the validators stored by the last successful sync, see
+    # countries/sync/state.py.
+    states = {} if force else load_states(urls)
     try:
-        countries_request = requests.get(countries_api_url)
-        currencies_request = requests.get(currencies_api_url)
-        if countries_request.status_code != 200:
-            raise Exception("countries", countries_request.status_code)
-        if currencies_request.status_code != 200:
-            raise Exception("currencies", currencies_request.status_code)
-    except Exception as error:
-        if len(error.args) == 2:
-            url, exit_code = error.args
-            raise CommandError("Could not connect to {} url, exit code {}.".format(
-                url, exit_code))
-        else:
-            raise CommandError("Unknown connection error.")
+        responses = fetch_all(
+            urls,
+            fetch_config,
+            headers={feed: conditional_headers(states.get(feed)) 
+                        for feed in urls},
+            expected=(200, 304),
+            stream=stream,
+        )
+    except FetchError as error:
+        raise CommandError(str(error)) from error
+
+    # A streamed body is only read while syncing, so only a 304 counts as
+    # unchanged then.
+    if all(is_unchanged(states.get(feed), response, check_hash=not stream) 
+            for feed, response in responses.items()):
+        # Nothing to parse or compare. Keep any new validators so the next
+        # run can be answered with a 304.
+        if any(validators_changed(states[feed], response) 
+                for feed, response in responses.items()):
+            save_states(urls, responses, states)
+        return SyncReport(skipped=True)
+
+    # Only one of the feeds changed; the other one is needed in full.
+    not_modified = {feed: urls[feed] for feed, response in responses.items()
+                    if response.status_code == 304}
+    if not_modified:
+        try:
+            responses.update(fetch_all(not_modified, fetch_config, 
+                                        stream=stream))
+        except FetchError as error:
+            raise CommandError(str(error)) from error
+
+    if stream:
+        # The feeds are parsed element by element as they download and
+        # synced in chunks, see countries/sync/stream.py.
+        hashes = {}
+        try:
+            with transaction.atomic():
+                report = stream_sync(
+                    iter_feed(responses["countries"], hashes, "countries"),
+                    iter_feed(responses["currencies"], hashes, "currencies"),
+                    chunk_size,
+                )
+                save_states(urls, responses, states, hashes)
+        except ValueError as error:
+            raise CommandError("Could not parse the feeds: {}".format(error))
+        finally:
+            for response in responses.values():
+                response.close()
+        return report
 
     # Convert the data to native python data types.
-    countries_list = countries_request.json()
-    currencies_list = currencies_request.json()
-    
-    # Task 3 part 1 and part 4.
-    # For every currency extracted from the API, check if there is a currency
-    # with a matching symbol in the DB. If there exist corresponding 
-    # currencies, check that their names match and update the DB if required;
-    # otherwise, add the new currency to a list of new currencies that can
-    # be created en masse.
+    countries_list = responses["countries"].json()
+    currencies_list = responses["currencies"].json()
 
-    new_currencies = []
+    # The feeds are compared with the whole database in memory and the
+    # differences are written back with bulk operations in one transaction,
+    # see countries/sync/diff.py.
+    with transaction.atomic():
+        report = sync_feeds(countries_list, currencies_list)
+        save_states(urls, responses, states)
+    return report
 
-    for currency in currencies_list:
 
-        currency["symbol"] = currency.pop("code")
-        try:
-            currency_in_db = Currency.objects.get(symbol=currency.get("symbol"))
-        except:
-            currency_in_db = None
-        
-        if currency_in_db:
-            # Check/Update names.
-            if currency_in_db.name != currency.get("name"):
-                currency_in_db.name = currency.get("name")
-                currency_in_db.save()
-        else:
-            # There are new currencies.
-            new_currencies.append(Currency(**currency))
-
-    # Create new currencies en masse.
-    if len(new_currencies) > 0:
-        Currency.objects.bulk_create(new_currencies)
-
-    # Task 3 part 2 and 4
-    # For every country extracted from the API, check if there is a country
-    # with a matching symbol in the DB. If there exist corresponding
-    # countries, check that their names and currencies match and update the DB
-    # if required; otherwise, create a new country and add the appropriate
-    # currencies to that country.
-
-    for country in countries_list:
-        
-        country["symbol"] = country.pop("code")
-        try:
-            country_in_db = Country.objects.get(symbol=country.get("symbol"))
-        except Country.DoesNotExist:
-            country_in_db = None
-
-        if country_in_db:
-            # Check/Update names.
-            if country_in_db.name != country.get("name"):
-                country_in_db.name = country.get("name")
-                country_in_db.save()
-            
-            # Check/Update currencies.
-            currencies_in_db = [currency.symbol 
-                                for currency in country_in_db.currencies.all()]
-
-            for symbol in country.get("currencies"):
-                if symbol not in currencies_in_db:
-                    country_in_db.currencies.add(Currency.objects.get(
-                                                symbol=symbol))
-                    country_in_db.save()
-
-            for symbol in currencies_in_db:
-                if symbol not in country.get("currencies"):
-                    country_in_db.currencies.remove(Currency.objects.get(
-                                                    symbol=symbol))
-                    country_in_db.save()
-
-        else:
-            # Create new country.
-            list_of_currencies = list(Currency.objects.filter(
-                symbol__in=country["currencies"]))
-
-            new_country = Country(name=country["name"], 
-                                symbol=country["symbol"])
-            new_country.save()
-            new_country.currencies.add(*list_of_currencies)
-
-    # Task 3 part 3
-    # Simply, if a country or currency exists in the DB, but it is not 
-    # extracted from the API (based on the symbol), then it is deleted.
-
-    country_symbols = set([cd["symbol"] for cd in countries_list])
-    country_symbols_in_db = set(Country.objects.values_list("symbol", 
-                                flat=True))
-    currency_symbols = set([cd["symbol"] for cd in currencies_list])
-    currency_symbols_in_db = set(Currency.objects.values_list("symbol", 
-                                flat=True))
-    
-    countries_to_delete = []
-    currencies_to_delete = []
-    
-    for symbol in currency_symbols_in_db:
-        if symbol not in currency_symbols:
-            currencies_to_delete.append(symbol)
-    
-    Currency.objects.filter(symbol__in=currencies_to_delete).delete()
-
-    for symbol in country_symbols_in_db:
-        if symbol not in country_symbols:
-            countries_to_delete.append(symbol)
-
-    Country.objects.filter(symbol__in=countries_to_delete).delete()
-
-    return
\ No newline at end of file
+def sync_delta_data(url, fetch_config=None):
+    # The changes after the last one applied, see countries/sync/delta.py.
+    # The server may send older ones too, which are skipped.
+    try:
+        responses = fetch_all({"delta": delta_url(url, load_sequence(url))},
+                                fetch_config)
+        changes = parse_changes(responses["delta"].json())
+    except FetchError as error:
+        raise CommandError(str(error)) from error
+    except ValueError as error:
+        raise CommandError("Could not parse the delta feed: {}".format(error))
+    return sync_delta(url, changes)
@@ -0,0 +1,253 @@
+"""
+The read model in a file that processes map into memory.
+
+With ``COUNTRIES_READ_MODEL["FILE"]`` set, the read model (see
+``countries.read_model``) is not built in each process. The process that
+changed the data, which for ``syncdata`` is not a web server process, writes
+it to the file when its transaction commits, and every process maps the file
+read-only. Its pages are in the page cache once, shared by all the workers,
+so the memory of a worker does not grow with the data, and a worker that
+starts serves from the file without reading the tables.
+
+The file starts with a header: a magic number, the format version, the data
+generation (see ``countries.cache``) of the model, the number of countries,
+currencies and links, and the offset and length of each section. The
+sections are aligned arrays of 64-bit integers, in the byte order of the
+machine that wrote them, and UTF-8 text:
+
+- the ids of the countries in name order, the offsets of their names and
+  symbols in ``strings``, and the ids in ascending order with the index of
+  each, for looking a country up by id with ``bisect``; the same for the
+  currencies;
+- the two adjacency lists of the links, as in ``ReadModel``;
+- the lowercase names and symbols of the countries, separated by
+  ``SEPARATOR``, which ``mmap.find`` scans without copying, with the offset
+  where each one starts and one past the end.
+
+A file is written next to the previous one and renamed over it, so a process
+reading the previous one goes on reading it, consistent, until it sees the
+generation change and maps the new one.
+"""
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+
+from countries.read_model import SEPARATOR, BaseReadModel
+
+MAGIC = b"CNTRYRM\x00"
+VERSION = 1
+
+# Magic, version, generation, and the number of countries, currencies and
+# links.
+HEADER = struct.Struct("=8sI64s3q")
+
+SECTIONS = (
+    "country_ids",
+    "country_names",
+    "country_symbols",
+    "country_sorted_ids",
+    "country_sorted_indexes",
+    "currency_ids",
+    "currency_names",
+    "currency_symbols",
+    "currency_sorted_ids",
+    "currency_sorted_indexes",
+    "currency_offsets",
+    "currency_targets",
+    "country_offsets",
+    "country_targets",
+    "field_starts",
+    "strings",
+    "search_text",
+)
+
+# The offset and length of each section.
+TABLE = struct.Struct("={}q".format(2 * len(SECTIONS)))
+
+ALIGNMENT = 8
+
+
+def _string_offsets(strings, values):
+    """Append ``values`` to ``strings``, and return where each starts and ends."""
+    offsets = array("q", [len(strings)])
+    for value in values:
+        strings += value.encode()
+        offsets.append(len(strings))
+    return offsets
+
+
+def _sorted_ids(ids):
+    """The ids in ascending order, and the index of each in ``ids``."""
+    indexes = sorted(range(len(ids)), key=ids.__getitem__)
+    return array("q", (ids[i] for i in indexes)), array("q", indexes)
+
+
+def _sections(model):
+    strings = bytearray()
+    sections = {}
+    for kind in ("country", "currency"):
+        ids = getattr(model, kind + "_ids")
+        sections[kind + "_ids"] = array("q", ids)
+        sections[kind + "_names"] = _string_offsets(
+            strings, getattr(model, kind + "_names")
+        )
+        sections[kind + "_symbols"] = _string_offsets(
+            strings, getattr(model, kind + "_symbols")
+        )
+        (
+            sections[kind + "_sorted_ids"],
+            sections[kind + "_sorted_indexes"],
+        ) = _sorted_ids(ids)
+    for name in (
+        "currency_offsets",
+        "currency_targets",
+        "country_offsets",
+        "country_targets",
+    ):
+        sections[name] = array("q", getattr(model, name))
+    sections["strings"] = strings
+
+    search_text = bytearray()
+    field_starts = array("q")
+    for name, symbol in zip(model.country_names, model.country_symbols):
+        for field in (name.lower(), symbol.lower()):
+            if field_starts:
+                search_text += SEPARATOR.encode()
+            field_starts.append(len(search_text))
+            search_text += field.encode()
+    # As if there were a separator after the last field.
+    field_starts.append(len(search_text) + 1)
+    sections["field_starts"] = field_starts
+    sections["search_text"] = search_text
+    return sections
+
+
+def write(model, path):
+    """Write ``model`` to the file ``path``, replacing it at once."""
+    sections = _sections(model)
+    table = []
+    offset = HEADER.size + TABLE.size
+    for name in SECTIONS:
+        offset += -offset % ALIGNMENT
+        length = len(memoryview(sections[name]).cast("B"))
+        table += [offset, length]
+        offset += length
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=directory, prefix=".read_model.", delete=False
+    ) as f:
+        try:
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    model.generation.encode(),
+                    len(model.country_ids),
+                    len(model.currency_ids),
+                    len(model.currency_targets),
+                )
+            )
+            f.write(TABLE.pack(*table))
+            for name, offset in zip(SECTIONS, table[::2]):
+                f.write(bytes(offset - f.tell()))
+                f.write(sections[name])
+            f.flush()
+            os.replace(f.name, path)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+
+class MappedReadModel(BaseReadModel):
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size + TABLE.size:
+            raise ValueError("{} is not a read model file.".format(path))
+        magic, version, generation, countries, _, _ = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a read model file.".format(path))
+        self.generation = generation.rstrip(b"\x00").decode()
+        self.country_count = countries
+
+        table = TABLE.unpack_from(self.map, HEADER.size)
+        view = memoryview(self.map)
+        for name, offset, length in zip(SECTIONS, table[::2], table[1::2]):
+            if name in ("strings", "search_text"):
+                # Where it starts: the offsets into it are relative.
+                setattr(self, name, offset)
+            else:
+                setattr(self, name, view[offset : offset + length].cast("q"))
+        self.search_end = self.search_text + table[-1]
+
+    def _text(self, offsets, i, base):
+        return self.map[base + offsets[i] : base + offsets[i + 1]].decode()
+
+    def _index(self, sorted_ids, sorted_indexes, pk):
+        position = bisect_left(sorted_ids, pk)
+        if position == len(sorted_ids) or sorted_ids[position] != pk:
+            return None
+        return sorted_indexes[position]
+
+    def country_index(self, pk):
+        return self._index(self.country_sorted_ids, self.country_sorted_indexes, pk)
+
+    def currency_index(self, pk):
+        return self._index(self.currency_sorted_ids, self.currency_sorted_indexes, pk)
+
+    def country(self, i):
+        return {
+            "id": self.country_ids[i],
+            "name": self._text(self.country_names, i, self.strings),
+            "symbol": self._text(self.country_symbols, i, self.strings),
+        }
+
+    def currency(self, i):
+        return {
+            "id": self.currency_ids[i],
+            "name": self._text(self.currency_names, i, self.strings),
+            "symbol": self._text(self.currency_symbols, i, self.strings),
+        }
+
+    def search_fields(self, i):
+        """The lowercase name and symbol of country ``i``."""
+        starts = self.field_starts
+        base = self.search_text
+        return (
+            self.map[base + starts[2 * i] : base + starts[2 * i + 1] - 1].decode(),
+            self.map[base + starts[2 * i + 1] : base + starts[2 * i + 2] - 1].decode(),
+        )
+
+    def matching(self, term):
+        """The indexes of the countries matching ``term``, in name order."""
+        term = term.lower().encode()
+        if SEPARATOR.encode() in term:
+            return []
+        base = self.search_text
+        starts = self.field_starts
+        # Not the sentinel past the end.
+        fields = len(starts) - 1
+        indexes = []
+        position = self.map.find(term, base, self.search_end)
+        while position != -1:
+            i = (bisect_right(starts, position - base) - 1) // 2
+            indexes.append(i)
+            # The symbol of a country whose name matched need not be looked
+            # at.
+            if 2 * i + 2 >= fields:
+                break
+            position = self.map.find(term, base + starts[2 * i + 2], self.search_end)
+        return indexes
+
+
+def read(path):
+    """The model in the file ``path``, or None if it is missing or invalid."""
+    try:
+        return MappedReadModel(path)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,300 @@
+"""
+Latency, SQL and size metrics of ``/graphql/``, served at ``/metrics``.
+
+``MetricsMiddleware`` times every GraphQL request and records the size of
+its response. While a request is handled, a connection execute wrapper,
+installed on every database connection by ``countries.signals``, adds up the
+number and the time of its SQL queries. The request is found through a
+context variable, which asgiref copies into the threads the async resolvers
+query from.
+
+Timing each resolver call costs more, since it wraps every field of the
+response, so only a sample of the requests, ``RESOLVER_SAMPLE_RATE``, run
+with ``ResolverMetricsExtension``. It times the fields with resolvers of
+their own, such as ``Query.countries`` and ``Country.currencies``. A
+resolver that returns a lazy queryset is timed without its query, which is
+counted in the SQL time of the request.
+
+The metrics are histograms in the Prometheus text format. They are kept in
+the memory of each process, so with several worker processes each scrape
+sees the requests of one of them.
+
+Configured by ``settings.COUNTRIES_METRICS``.
+"""
+import asyncio
+import bisect
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from inspect import isawaitable
+
+from ariadne.types import ExtensionSync
+from django.conf import settings
+
+DEFAULTS = {
+    "ENABLED": True,
+    "RESOLVER_SAMPLE_RATE": 0.01,
+}
+
+SECONDS_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+BYTES_BUCKETS = tuple(4**power for power in range(4, 13))
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_METRICS", {})}
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                name,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n"),
+            )
+            for name, value in labels
+        )
+    )
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = (*buckets, float("inf"))
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # Per label values: a count per bucket, and the sum.
+            self.series = {}
+
+    def observe(self, value, **labels):
+        self.observe_many([value], **labels)
+
+    def observe_many(self, values, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0]
+            counts = series[0]
+            for value in values:
+                # The first bucket whose upper bound is at least the value.
+                counts[bisect.bisect_left(self.buckets, value)] += 1
+                series[1] += value
+
+    def collect(self):
+        """Yield the lines of the histogram in the Prometheus text format."""
+        yield "# HELP {} {}".format(self.name, self.documentation)
+        yield "# TYPE {} histogram".format(self.name)
+        with self.lock:
+            series = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self.series.items()
+            )
+        for key, (counts, total) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "{}_bucket{} {}".format(
+                    self.name,
+                    _format_labels([*labels, ("le", _format_value(bound))]),
+                    cumulative,
+                )
+            yield "{}_sum{} {}".format(
+                self.name, _format_labels(labels), _format_value(total)
+            )
+            yield "{}_count{} {}".format(self.name, _format_labels(labels), cumulative)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = [line for metric in self.metrics for line in metric.collect()]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "countries_graphql_request_duration_seconds",
+    "Time to handle a GraphQL request.",
+    SECONDS_BUCKETS,
+    ["method"],
+)
+response_size = registry.histogram(
+    "countries_graphql_response_size_bytes",
+    "Size of the body of a GraphQL response, as sent.",
+    BYTES_BUCKETS,
+    ["method"],
+)
+sql_queries = registry.histogram(
+    "countries_graphql_sql_queries",
+    "Number of SQL queries run for a GraphQL request.",
+    QUERIES_BUCKETS,
+)
+sql_duration = registry.histogram(
+    "countries_graphql_sql_duration_seconds",
+    "Time spent in the SQL queries of a GraphQL request.",
+    SECONDS_BUCKETS,
+)
+resolver_duration = registry.histogram(
+    "countries_graphql_resolver_duration_seconds",
+    "Time spent in a resolver, in a sample of the GraphQL requests.",
+    SECONDS_BUCKETS,
+    ["field"],
+)
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    # The async resolvers of one request query from several threads.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+current_request = ContextVar("countries_metrics_request", default=None)
+
+
+def record_sql(execute, sql, params, many, context):
+    """Connection execute wrapper adding queries to the current request."""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        with metrics.lock:
+            metrics.queries += 1
+            metrics.sql_seconds += elapsed
+
+
+class MetricsMiddleware:
+    # Async under ASGI, so that the async view is not run through a thread.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Tells Django to await this middleware, as MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not get_config()["ENABLED"]:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not get_config()["ENABLED"]:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, metrics, elapsed):
+        match = request.resolver_match
+        if match is not None and match.url_name == "graphql":
+            request_duration.observe(elapsed, method=request.method)
+            if not response.streaming:
+                response_size.observe(len(response.content), method=request.method)
+            sql_queries.observe(metrics.queries)
+            sql_duration.observe(metrics.sql_seconds)
+
+
+class ResolverMetricsExtension(ExtensionSync):
+    """Time the calls of the resolvers defined by the schema."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+
+    def resolve(self, next_, obj, info, **kwargs):
+        if info.parent_type.fields[info.field_name].resolve is None:
+            # The default resolver, reading a key or an attribute.
+            return next_(obj, info, **kwargs)
+        name = "{}.{}".format(info.parent_type.name, info.field_name)
+        start = time.perf_counter()
+        result = next_(obj, info, **kwargs)
+        if isawaitable(result):
+            return self.timed(result, name, start)
+        self.durations[name].append(time.perf_counter() - start)
+        return result
+
+    async def timed(self, result, name, start):
+        try:
+            return await result
+        finally:
+            self.durations[name].append(time.perf_counter() - start)
+
+    def request_finished(self, context):
+        for name, durations in self.durations.items():
+            resolver_duration.observe_many(durations, field=name)
+
+
+def sample_extensions():
+    """The extensions that record metrics for a request, if it is sampled."""
+    config = get_config()
+    if config["ENABLED"] and random.random() < config["RESOLVER_SAMPLE_RATE"]:
+        return [ResolverMetricsExtension]
+    return []
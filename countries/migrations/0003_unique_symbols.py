@@ -0,0 +1,108 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merge rows that share a symbol into the one with the lowest id.
+
+    The links of the duplicates are moved to the row that is kept, unless
+    that row already has the same link.
+    """
+    Country = apps.get_model("countries", "Country")
+    Currency = apps.get_model("countries", "Currency")
+    CountryCurrency = Country.currencies.through
+
+    for model, column in ((Currency, "currency_id"), (Country, "country_id")):
+        keep = {}
+        replace = {}
+        for pk, symbol in model.objects.order_by("id").values_list("id", "symbol"):
+            if symbol in keep:
+                replace[pk] = keep[symbol]
+            else:
+                keep[symbol] = pk
+        if not replace:
+            continue
+
+        links = set(CountryCurrency.objects.values_list("country_id", "currency_id"))
+        for link in CountryCurrency.objects.filter(**{column + "__in": replace}):
+            setattr(link, column, replace[getattr(link, column)])
+            pair = (link.country_id, link.currency_id)
+            if pair in links:
+                link.delete()
+            else:
+                link.save()
+                links.add(pair)
+        model.objects.filter(pk__in=replace).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("countries", "0002_feedstate"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="currency",
+            name="symbol",
+            field=models.CharField(max_length=8, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="country",
+            name="symbol",
+            field=models.CharField(max_length=8, unique=True),
+        ),
+        # The table Django created for the many-to-many field is kept; only
+        # the model state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="CountryCurrency",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "country",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="countries.country",
+                            ),
+                        ),
+                        (
+                            "currency",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="countries.currency",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "countries_country_currencies",
+                        "unique_together": {("country", "currency")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="country",
+                    name="currencies",
+                    field=models.ManyToManyField(
+                        through="countries.CountryCurrency", to="countries.currency"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="countrycurrency",
+            index=models.Index(
+                fields=["currency", "country"], name="countries_currency_country"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import sqlite3
+
+from django.db import migrations
+
+
+def is_supported(connection):
+    # The trigram tokenizer was added in SQLite 3.34.
+    return connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34)
+
+
+def create_fts_table(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE countries_country_fts "
+        "USING fts5(name, symbol, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO countries_country_fts (rowid, name, symbol) "
+        "SELECT id, name, symbol FROM countries_country"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    schema_editor.execute("DROP TABLE countries_country_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("countries", "0003_unique_symbols"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("countries", "0004_country_fts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="country",
+            index=models.Index(fields=["name", "id"], name="countries_name_id"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("countries", "0005_country_name_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedstate",
+            name="sequence",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -3,10 +3,46 @@ from django.db import models
 
 class Currency(models.Model):
     name = models.CharField(max_length=100)
-    symbol = models.CharField(max_length=8)
+    symbol = models.CharField(max_length=8, unique=True)
 
 
 class Country(models.Model):
     name = models.CharField(max_length=100)
-    symbol = models.CharField(max_length=8)
-    currencies = models.ManyToManyField(Currency)
+    symbol = models.CharField(max_length=8, unique=True)
+    currencies = models.ManyToManyField(Currency, through="CountryCurrency")
+
+    class Meta:
+        # The order of the countries, and the key of their pages.
+        indexes = [models.Index(fields=["name", "id"], name="countries_name_id")]
+
+
+class CountryCurrency(models.Model):
+    """
+    The link table Django created for ``Country.currencies``, made explicit
+    so that it can have an index for lookups by currency.
+    """
+
+    country = models.ForeignKey(Country, on_delete=models.CASCADE)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "countries_country_currencies"
+        unique_together = [("country", "currency")]
+        indexes = [
+            models.Index(
+                fields=["currency", "country"], name="countries_currency_country"
+            )
+        ]
+
+
+class FeedState(models.Model):
+    """Validators and content hash of a feed as of the last successful sync."""
+
+    feed = models.CharField(max_length=32, unique=True)
+    url = models.URLField(max_length=500)
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    content_hash = models.CharField(max_length=64)
+    # The last change applied from a delta feed, see countries/sync/delta.py.
+    sequence = models.BigIntegerField(default=0)
+    synced_at = models.DateTimeField(auto_now=True)
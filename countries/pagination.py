@@ -0,0 +1,85 @@
+"""
+Keyset pagination of countries for ``Query.countriesConnection``.
+
+Pages follow the Relay connection spec and are ordered by (name, id). A
+cursor encodes the name and id of a country, and the next page is the
+countries after it in that order:
+
+    WHERE name >= %s AND (name > %s OR id > %s) ORDER BY name, id LIMIT n
+
+The first condition lets SQLite seek in the ``countries_name_id`` index
+rather than skip over the rows of the earlier pages, as OFFSET would. So the
+cost of a page depends on its size, not on how far into the table it is.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from graphql import GraphQLError
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+CURSOR_PREFIX = "country:"
+
+
+def encode_cursor(row):
+    key = json.dumps([row["name"], row["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode((CURSOR_PREFIX + key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (name, id) key of a cursor."""
+    try:
+        text = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if not text.startswith(CURSOR_PREFIX):
+            raise ValueError(text)
+        name, pk = json.loads(text[len(CURSOR_PREFIX) :])
+        if not isinstance(name, str) or not isinstance(pk, int):
+            raise ValueError(text)
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as error:
+        raise GraphQLError("Invalid cursor: {!r}.".format(cursor)) from error
+    return name, pk
+
+
+def after(queryset, cursor):
+    name, pk = decode_cursor(cursor)
+    return queryset.filter(Q(name__gte=name), Q(name__gt=name) | Q(id__gt=pk))
+
+
+def paginate(queryset, columns, first=None, cursor=None):
+    """
+    Return a connection of the page of ``queryset`` after ``cursor``.
+
+    The rows are dicts of the id, the name and ``columns``. ``totalCount``
+    is left to its resolver, which counts ``queryset`` only if it is
+    selected.
+    """
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+    if not 0 <= first <= MAX_PAGE_SIZE:
+        raise GraphQLError(
+            "first must be between 0 and {}, not {}.".format(MAX_PAGE_SIZE, first)
+        )
+
+    page = queryset.order_by("name", "id")
+    if cursor is not None:
+        page = after(page, cursor)
+    # One more row than asked for tells whether there is a next page.
+    rows = list(
+        page.values("id", "name", *sorted(set(columns) - {"name"}))[: first + 1]
+    )
+    edges = [{"cursor": encode_cursor(row), "node": row} for row in rows[:first]]
+    return {
+        "edges": edges,
+        "pageInfo": {
+            "hasNextPage": len(rows) > first,
+            # Whether there are countries before the cursor would take
+            # another query, which the spec allows servers to skip.
+            "hasPreviousPage": False,
+            "startCursor": edges[0]["cursor"] if edges else None,
+            "endCursor": edges[-1]["cursor"] if edges else None,
+        },
+        "queryset": queryset,
+    }
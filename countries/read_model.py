@@ -0,0 +1,292 @@
+"""
+In-process read model of the countries, currencies and their links.
+
+``Query.countries``, ``Country.currencies`` and ``Currency.countries`` can be
+answered from memory rather than through the ORM. The three tables are read
+once, in one read transaction, into compact structures:
+
+- the names and symbols of the countries, ordered by name and id, and of the
+  currencies, as lists of interned strings, with the ids in ``array``\\ s;
+- the links as two adjacency lists in compressed sparse row form: for each
+  country, a range of an ``array`` of currency indexes in the order of the
+  feed, and for each currency, a range of one of country indexes in name
+  order;
+- for ``search``, the lowercase names and symbols joined into one string,
+  which ``str.find`` scans in C, with the offset where each one starts.
+
+A search matches the names and symbols that contain the term, ignoring case,
+like the database does. The matches are ordered as in
+``countries.search.search``: an exact symbol first, then names starting with
+the term, then by name. The database orders the other matches of terms of
+three or more characters by their FTS rank first, which the read model does
+not have.
+
+The model belongs to a data generation (see ``countries.cache``). The first
+request that finds the generation changed rebuilds it, and the others go on
+serving the previous model until the new one replaces it. The process that
+changed the data rebuilds it when the transaction commits, if it had one.
+``countriesConnection`` is still served by the database.
+
+With ``FILE`` set, the processes share one copy of the model, in a file that
+they map into memory (see ``countries.mapped_model``).
+
+Configured by ``settings.COUNTRIES_READ_MODEL``, off by default.
+"""
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import router, transaction
+
+from countries import cache
+from countries.models import Country, CountryCurrency, Currency
+
+DEFAULTS = {
+    "ENABLED": False,
+    # The file the processes share the model through, see
+    # countries/mapped_model.py; each builds its own if None.
+    "FILE": None,
+}
+
+# Between the fields of the search text; no search term can contain it.
+SEPARATOR = "\x00"
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_READ_MODEL", {})}
+
+
+def _adjacency(pairs, size):
+    """
+    The (source, target) index pairs as offsets and targets arrays: the
+    targets of ``source`` are ``targets[offsets[source]:offsets[source + 1]]``,
+    in the order of ``pairs``, which are sorted by source in place.
+    """
+    pairs.sort(key=itemgetter(0))
+    counts = Counter(map(itemgetter(0), pairs))
+    offsets = array("l", accumulate(map(counts.__getitem__, range(size)), initial=0))
+    return offsets, array("l", map(itemgetter(1), pairs))
+
+
+class BaseReadModel:
+    """
+    The queries of a read model, over the storage of a subclass: the
+    countries by index in name order, the currencies by index, the
+    ``currency_offsets``/``currency_targets`` and
+    ``country_offsets``/``country_targets`` adjacency arrays, and
+    ``matching``.
+    """
+
+    def search(self, term):
+        """``matching``, with the most relevant countries first."""
+        indexes = self.matching(term)
+        term = term.lower()
+
+        def relevance(i):
+            name, symbol = self.search_fields(i)
+            return symbol != term, not name.startswith(term)
+
+        # Stable, so the countries stay in name order otherwise.
+        indexes.sort(key=relevance)
+        return indexes
+
+    def countries(self, search=None):
+        if search:
+            indexes = self.search(search)
+        else:
+            indexes = range(self.country_count)
+        return [self.country(i) for i in indexes]
+
+    def country_currencies(self, country_id):
+        i = self.country_index(country_id)
+        if i is None:
+            return []
+        offsets = self.currency_offsets
+        return [
+            self.currency(j) for j in self.currency_targets[offsets[i] : offsets[i + 1]]
+        ]
+
+    def currency_countries(self, currency_id):
+        i = self.currency_index(currency_id)
+        if i is None:
+            return []
+        offsets = self.country_offsets
+        return [
+            self.country(j) for j in self.country_targets[offsets[i] : offsets[i + 1]]
+        ]
+
+
+class ReadModel(BaseReadModel):
+    def __init__(self, generation, countries, currencies, links):
+        """
+        ``countries`` and ``currencies`` are (id, name, symbol) rows, the
+        countries in name order, and ``links`` (country id, currency id)
+        pairs in the order of the feed.
+        """
+        self.generation = generation
+        intern = sys.intern
+
+        self.country_ids = array("q", map(itemgetter(0), countries))
+        self.country_names = [intern(row[1]) for row in countries]
+        self.country_symbols = [intern(row[2]) for row in countries]
+        self.country_indexes = {pk: i for i, pk in enumerate(self.country_ids)}
+
+        self.currency_ids = array("q", map(itemgetter(0), currencies))
+        self.currency_names = [intern(row[1]) for row in currencies]
+        self.currency_symbols = [intern(row[2]) for row in currencies]
+        self.currency_indexes = {pk: i for i, pk in enumerate(self.currency_ids)}
+
+        pairs = [
+            (self.country_indexes[country_id], self.currency_indexes[currency_id])
+            for country_id, currency_id in links
+        ]
+        self.currency_offsets, self.currency_targets = _adjacency(pairs, len(countries))
+        # In name order, as the country indexes are, and the sort is stable.
+        pairs = [(target, source) for source, target in pairs]
+        self.country_offsets, self.country_targets = _adjacency(pairs, len(currencies))
+
+        fields = []
+        for name, symbol in zip(self.country_names, self.country_symbols):
+            fields.append(name.lower())
+            fields.append(symbol.lower())
+        self.search_text = SEPARATOR.join(fields)
+        # Where the name of country i starts, at 2 * i, and its symbol.
+        self.field_starts = array("l", [0]) * len(fields)
+        offset = 0
+        for i, field in enumerate(fields):
+            self.field_starts[i] = offset
+            offset += len(field) + 1
+
+    @property
+    def country_count(self):
+        return len(self.country_ids)
+
+    def country_index(self, pk):
+        return self.country_indexes.get(pk)
+
+    def currency_index(self, pk):
+        return self.currency_indexes.get(pk)
+
+    def country(self, i):
+        return {
+            "id": self.country_ids[i],
+            "name": self.country_names[i],
+            "symbol": self.country_symbols[i],
+        }
+
+    def currency(self, i):
+        return {
+            "id": self.currency_ids[i],
+            "name": self.currency_names[i],
+            "symbol": self.currency_symbols[i],
+        }
+
+    def search_fields(self, i):
+        """The lowercase name and symbol of country ``i``."""
+        return self.country_names[i].lower(), self.country_symbols[i].lower()
+
+    def matching(self, term):
+        """The indexes of the countries matching ``term``, in name order."""
+        term = term.lower()
+        if SEPARATOR in term:
+            return []
+        text = self.search_text
+        starts = self.field_starts
+        indexes = []
+        position = text.find(term)
+        while position != -1:
+            i = (bisect_right(starts, position) - 1) // 2
+            indexes.append(i)
+            # The symbol of a country whose name matched need not be looked
+            # at.
+            if 2 * i + 2 >= len(starts):
+                break
+            position = text.find(term, starts[2 * i + 2])
+        return indexes
+
+
+def load():
+    """Read the tables into a new ``ReadModel``."""
+    # Before the data, so that a change committed in between is not missed.
+    generation = cache.current_generation()
+    # The three tables as of the same moment.
+    with transaction.atomic(using=router.db_for_read(Country)):
+        countries = list(
+            Country.objects.order_by("name", "id").values_list("id", "name", "symbol")
+        )
+        currencies = list(Currency.objects.values_list("id", "name", "symbol"))
+        links = CountryCurrency.objects.order_by("pk").values_list(
+            "country_id", "currency_id"
+        )
+        return ReadModel(generation, countries, currencies, links.iterator())
+
+
+class ReadModelStore:
+    def __init__(self):
+        self.model = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """The model of the current generation, rebuilt if it is out of date."""
+        model = self.model
+        if model is not None and model.generation == cache.current_generation():
+            return model
+        if model is not None and not self.lock.acquire(blocking=False):
+            # Being rebuilt by another thread.
+            return model
+        if model is None:
+            self.lock.acquire()
+        try:
+            if self.model is model or self.model is None:
+                self.model = self.load()
+            return self.model
+        finally:
+            self.lock.release()
+
+    def load(self):
+        """
+        A new model: the one in ``FILE``, written anew if it is not of the
+        current generation, or read from the tables.
+        """
+        path = get_config()["FILE"]
+        if not path:
+            return load()
+        # Which imports this module.
+        from countries import mapped_model
+
+        model = mapped_model.read(path)
+        if model is None or model.generation != cache.current_generation():
+            mapped_model.write(load(), path)
+            model = mapped_model.read(path)
+        return model
+
+    def rebuild(self):
+        """Replace ``FILE``, and the model, if this process has one."""
+        path = get_config()["FILE"]
+        if path:
+            from countries import mapped_model
+
+            mapped_model.write(load(), path)
+        if self.model is not None:
+            with self.lock:
+                self.model = self.load()
+
+    def clear(self):
+        with self.lock:
+            self.model = None
+
+
+read_models = ReadModelStore()
+
+
+def get_read_model(info):
+    """The model a request reads from: the same one for all its fields."""
+    model = info.context.get("read_model")
+    if model is None:
+        model = info.context["read_model"] = read_models.get()
+    return model
@@ -1,12 +1,19 @@
-from ariadne import gql
+import functools
+
 from ariadne import ObjectType, QueryType, make_executable_schema
 
+from countries import search as countries_search
+from countries.batching import get_batch
+from countries.cache import get_config as get_cache_config, result_cache
+from countries.db import in_worker_thread
+from countries.loaders import get_loaders, object_key
 from countries.models import Country
+from countries.pagination import paginate
+from countries.read_model import get_config as get_read_model_config, get_read_model
+from countries.selection import selected_fields
 
-from django.db.models import Q
-
-type_defs = gql(
-    """
+# Parsed and checked by make_executable_schema, when the schema is built.
+type_defs = """
     type Country {
         name: String!
         symbol: String!
@@ -15,15 +22,35 @@ type_defs = gql(
     type Currency {
         name: String!
         symbol: String!
+        countries: [Country!]!
+    }
+    type CountryEdge {
+        cursor: String!
+        node: Country!
+    }
+    type PageInfo {
+        hasNextPage: Boolean!
+        hasPreviousPage: Boolean!
+        startCursor: String
+        endCursor: String
+    }
+    type CountryConnection {
+        edges: [CountryEdge!]!
+        pageInfo: PageInfo!
+        totalCount: Int!
     }
     type Query {
         countries(search: String): [Country!]!
+        countriesConnection(
+            first: Int, after: String, search: String
+        ): CountryConnection!
     }
 """
-)
 
 query = QueryType()
 country = ObjectType("Country")
+currency = ObjectType("Currency")
+country_connection = ObjectType("CountryConnection")
 
 # Notes on solution.
 # Task 1
@@ -39,17 +66,181 @@ country = ObjectType("Country")
 # issue with using prefetch_related with GraphQL of which I am unaware, but 
 # based on the unit tests, it seems to work as expected, at least in this case.
 
-@query.field("countries")
-def resolve_countries(*_, search=None):
+# Search
+# The search term used to be matched with icontains on name and symbol, which
+# is a LIKE '%term%' scan of the whole table. It now goes through the FTS5
+# trigram index in countries/search.py, with the most relevant results first.
+
+# Caching
+# The data only changes when syncdata runs, so the results can be cached
+# until the next change, see countries/cache.py. The cache is opt-in through
+# settings.COUNTRIES_RESULT_CACHE.
+
+# Batching
+# prefetch_related only helps the resolver that applies it. The currencies
+# of countries, and the countries of currencies, are now loaded through the
+# per-request loaders in countries/loaders.py, which batch the lookups for
+# every country in the response, however it got there.
+
+# Projection
+# Most queries only ask for a name or a symbol. resolve_countries loads just
+# the columns of the selected fields as dicts, rather than whole model
+# instances, see countries/selection.py.
+
+# Pagination
+# countries returns every country at once. countriesConnection returns them
+# a page at a time, with keyset queries on (name, id), see
+# countries/pagination.py.
+
+# Read model
+# The data is small and changes rarely, so it can be held in memory and
+# served without the ORM, see countries/read_model.py. It is opt-in through
+# settings.COUNTRIES_READ_MODEL.
+
+# Batched requests
+# A page can send its queries as one batch, see countries/batching.py. The
+# operations share their loaders, and each search of the batch is queried
+# once.
+
+# The columns of the scalar fields of Country. The id is always loaded, as
+# the loaders need it.
+COUNTRY_COLUMNS = {"name", "symbol"}
+
+def countries_queryset(search=None):
     if search:
         # Handle a query with a search term.
-        return Country.objects.order_by("name").filter(
-            Q(name__icontains=search) | Q(symbol__icontains=search)
-            ).prefetch_related("currencies")
-    return Country.objects.order_by("name").prefetch_related("currencies")
+        return countries_search.search(Country.objects.all(), search)
+    return Country.objects.order_by("name", "id")
+
+def countries_as_dicts(search=None):
+    # Plain data rather than model instances, which are cheaper to pickle
+    # for the shared cache.
+    return [
+        {
+            "id": country.pk,
+            "name": country.name,
+            "symbol": country.symbol,
+            "currencies": [
+                {"id": currency.pk, "name": currency.name, "symbol": currency.symbol}
+                for currency in country.currencies.all()
+            ],
+        }
+        for country in countries_queryset(search).prefetch_related("currencies")
+    ]
+
+def countries_rows(search=None):
+    # Every column, for the operations of a batch, whatever they select.
+    return list(countries_queryset(search).values("id", *sorted(COUNTRY_COLUMNS)))
+
+@query.field("countries")
+def resolve_countries(_, info, search=None):
+    if get_read_model_config()["ENABLED"]:
+        return get_read_model(info).countries(search)
+    if get_cache_config()["ENABLED"]:
+        return result_cache.get_or_compute(
+            search, lambda: countries_as_dicts(search))
+    batch = get_batch(info)
+    if batch is not None:
+        return batch.get_or_compute(search, lambda: countries_rows(search))
+    columns = COUNTRY_COLUMNS & selected_fields(info)
+    return countries_queryset(search).values("id", *sorted(columns))
+
+@query.field("countriesConnection")
+def resolve_countries_connection(_, info, first=None, after=None, search=None):
+    queryset = Country.objects.all()
+    if search:
+        queryset = countries_search.matching(queryset, search)
+    columns = COUNTRY_COLUMNS & selected_fields(info, "edges", "node")
+    connection = paginate(queryset, columns, first, after)
+    # The nodes are not a list the loaders would see.
+    get_loaders(info).prime(
+        "Country", [edge["node"] for edge in connection["edges"]])
+    return connection
+
+@country_connection.field("totalCount")
+def resolve_total_count(connection, *_):
+    # Only counted when selected.
+    return connection["queryset"].count()
 
 @country.field("currencies")
-def resolve_country_currencies(obj, *_):
-    return obj.currencies.all()
+def resolve_country_currencies(obj, info):
+    if isinstance(obj, dict) and "currencies" in obj:
+        # A cached result.
+        return obj["currencies"]
+    if get_read_model_config()["ENABLED"]:
+        return get_read_model(info).country_currencies(object_key(obj))
+    return get_loaders(info).country_currencies.load(object_key(obj))
+
+@currency.field("countries")
+def resolve_currency_countries(obj, info):
+    if get_read_model_config()["ENABLED"]:
+        return get_read_model(info).currency_countries(object_key(obj))
+    return get_loaders(info).currency_countries.load(object_key(obj))
+
+# Built by the first request rather than when this module is imported, see
+# get_schema.
+@functools.lru_cache(maxsize=None)
+def get_schema():
+    return make_executable_schema(
+        type_defs, query, country, currency, country_connection)
+
+# Async
+# The same schema with async resolvers, served by the async view under ASGI
+# (see codingtest/asgi.py). Django 4.0 has no async ORM, so the resolvers
+# above run in worker threads, see countries.db.in_worker_thread, and the
+# event loop is free to serve other requests meanwhile.
+
+async_query = QueryType()
+async_country = ObjectType("Country")
+async_currency = ObjectType("Currency")
+async_country_connection = ObjectType("CountryConnection")
+
+@async_query.field("countries")
+async def resolve_countries_async(_, info, search=None):
+    # Evaluated in the thread, rather than by the executor in the loop.
+    return await in_worker_thread(
+        lambda: list(resolve_countries(_, info, search=search)))()
+
+@async_query.field("countriesConnection")
+async def resolve_countries_connection_async(_, info, **kwargs):
+    return await in_worker_thread(resolve_countries_connection)(_, info, **kwargs)
+
+@async_country_connection.field("totalCount")
+async def resolve_total_count_async(connection, info):
+    return await in_worker_thread(resolve_total_count)(connection, info)
+
+@async_country.field("currencies")
+async def resolve_country_currencies_async(obj, info):
+    if isinstance(obj, dict) and "currencies" in obj:
+        return obj["currencies"]
+    if get_read_model_config()["ENABLED"]:
+        # The model of the request was loaded by Query.countries, or the
+        # first use loads it from the database.
+        return await in_worker_thread(resolve_country_currencies)(obj, info)
+    return await get_loaders(info).country_currencies.load_async(object_key(obj))
+
+@async_currency.field("countries")
+async def resolve_currency_countries_async(obj, info):
+    if get_read_model_config()["ENABLED"]:
+        return await in_worker_thread(resolve_currency_countries)(obj, info)
+    return await get_loaders(info).currency_countries.load_async(object_key(obj))
+
+@functools.lru_cache(maxsize=None)
+def get_async_schema():
+    return make_executable_schema(
+        type_defs, async_query, async_country, async_currency,
+        async_country_connection)
+
+# Startup
+# Building the executable schemas parses and validates the type definitions
+# and binds the resolvers, which an instance started to serve a request
+# would pay for before answering anything. Both are built on first use, and
+# countries/urls.py hands the views the functions rather than the schemas.
 
-schema = make_executable_schema(type_defs, query, country)
\ No newline at end of file
+def __getattr__(name):
+    # The schemas as module attributes, built when first looked up.
+    if name == "schema":
+        return get_schema()
+    if name == "async_schema":
+        return get_async_schema()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
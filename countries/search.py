@@ -0,0 +1,163 @@
+"""
+Full text search over country names and symbols.
+
+On SQLite the names and symbols are copied into an FTS5 table with the
+trigram tokenizer, ``countries_country_fts``, whose rowid is the country id.
+A trigram index answers substring queries of three or more characters
+without scanning the country table. Shorter terms, and other databases, fall
+back to ``icontains``.
+
+The index is kept in step by the model signals in ``countries.signals`` and
+by ``syncdata``, whose bulk operations do not send signals.
+"""
+import sqlite3
+
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "countries_country_fts"
+COUNTRY_TABLE = "countries_country"
+
+# The trigram tokenizer cannot match anything shorter.
+MIN_TERM_LENGTH = 3
+
+# Ids per statement when indexing, well below SQLite's parameter limit.
+BATCH_SIZE = 500
+
+
+def is_supported(vendor):
+    # The trigram tokenizer was added in SQLite 3.34.
+    return vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34)
+
+
+def is_available():
+    """Whether the database has the FTS table; migration 0004 creates it."""
+    if not is_supported(connection.vendor):
+        return False
+    connection.ensure_connection()
+    # On the sqlite3 connection, so that the query counts leave it out, as
+    # countries.db.configure_connection does.
+    return (
+        connection.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            [FTS_TABLE],
+        ).fetchone()
+        is not None
+    )
+
+
+def match_expression(term):
+    """Quote the term as a single FTS5 phrase."""
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+def matching(queryset, term):
+    """Filter a ``Country`` queryset by the search term, leaving its order."""
+    if len(term) < MIN_TERM_LENGTH or not is_available():
+        return queryset.filter(Q(name__icontains=term) | Q(symbol__icontains=term))
+    return queryset.filter(
+        id__in=RawSQL(
+            "SELECT rowid FROM {0} WHERE {0} MATCH %s".format(FTS_TABLE),
+            [match_expression(term)],
+        )
+    )
+
+
+def search(queryset, term):
+    """
+    Filter a ``Country`` queryset by the search term, most relevant first.
+
+    An exact symbol match comes first, then names starting with the term,
+    then the other matches by their bm25 rank. Ties are ordered by name.
+    """
+    relevance = {
+        "exact_symbol": ExpressionWrapper(
+            Q(symbol__iexact=term), output_field=BooleanField()
+        ),
+        "name_prefix": ExpressionWrapper(
+            Q(name__istartswith=term), output_field=BooleanField()
+        ),
+    }
+    if len(term) < MIN_TERM_LENGTH or not is_available():
+        return (
+            matching(queryset, term)
+            .annotate(**relevance)
+            .order_by("-exact_symbol", "-name_prefix", "name")
+        )
+
+    # Joined rather than filtered with a subquery, so that the MATCH runs
+    # once, with its rank, instead of once per matching country.
+    return (
+        queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                "{} MATCH %s".format(FTS_TABLE),
+                "{}.rowid = {}.id".format(FTS_TABLE, COUNTRY_TABLE),
+            ],
+            params=[match_expression(term)],
+        )
+        .annotate(rank=RawSQL("{}.rank".format(FTS_TABLE), []), **relevance)
+        .order_by("-exact_symbol", "-name_prefix", "rank", "name")
+    )
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start : start + BATCH_SIZE]
+        yield batch, ", ".join(["%s"] * len(batch))
+
+
+def index(ids):
+    """(Re)index the given countries."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for batch, placeholders in _batches(ids):
+            cursor.execute(
+                "DELETE FROM {} WHERE rowid IN ({})".format(FTS_TABLE, placeholders),
+                batch,
+            )
+            cursor.execute(
+                "INSERT INTO {} (rowid, name, symbol) "
+                "SELECT id, name, symbol FROM {} WHERE id IN ({})".format(
+                    FTS_TABLE, COUNTRY_TABLE, placeholders
+                ),
+                batch,
+            )
+
+
+def unindex(ids):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for batch, placeholders in _batches(ids):
+            cursor.execute(
+                "DELETE FROM {} WHERE rowid IN ({})".format(FTS_TABLE, placeholders),
+                batch,
+            )
+
+
+def prune():
+    """Drop the entries of countries that no longer exist."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {} WHERE rowid NOT IN (SELECT id FROM {})".format(
+                FTS_TABLE, COUNTRY_TABLE
+            )
+        )
+
+
+def rebuild():
+    """Index every country from scratch."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {}".format(FTS_TABLE))
+        cursor.execute(
+            "INSERT INTO {} (rowid, name, symbol) "
+            "SELECT id, name, symbol FROM {}".format(FTS_TABLE, COUNTRY_TABLE)
+        )
@@ -0,0 +1,54 @@
+"""
+The fields a GraphQL query selects, for resolvers that only load those.
+"""
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _fields(selection_sets, fragments):
+    """Yield the field nodes of the selection sets, fragments included."""
+    visited = set()
+    pending = list(selection_sets)
+    while pending:
+        selection_set = pending.pop()
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                pending.append(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name not in visited:
+                    visited.add(name)
+                    pending.append(fragments[name].selection_set)
+
+
+def selected_fields(info, *path):
+    """
+    The names of the fields selected on the value of the field being resolved.
+
+    With a ``path`` of field names, the names of the fields selected below
+    it, e.g. ``selected_fields(info, "edges", "node")`` for a connection.
+
+    Fields are included whatever their ``@skip`` and ``@include`` directives
+    say, so this may name more fields than are in the response, never fewer.
+    """
+    return node_selected_fields(info.field_nodes, info.fragments, *path)
+
+
+def node_selected_fields(field_nodes, fragments, *path):
+    """``selected_fields`` of field nodes, outside of a resolver."""
+    selection_sets = [node.selection_set for node in field_nodes]
+    for name in path:
+        selection_sets = [
+            field.selection_set
+            for field in _fields(filter(None, selection_sets), fragments)
+            if field.name.value == name
+        ]
+    return {
+        field.name.value for field in _fields(filter(None, selection_sets), fragments)
+    }
+
+
+def field_nodes(selection_set, fragments):
+    """The field nodes of a selection set, those of its fragments included."""
+    return list(_fields([selection_set], fragments))
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from countries import cache, db, metrics, read_model, search, snapshot
+from countries.models import Country, CountryCurrency, Currency
+
+# Sent once a transaction that changed countries, currencies or their links
+# has committed. Anything derived from the data (caches, snapshots) should
+# listen to this rather than to the model signals, because the bulk
+# operations of syncdata do not send those.
+data_changed = Signal()
+
+
+def notify_data_changed():
+    """Send ``data_changed`` when the current transaction commits."""
+    transaction.on_commit(lambda: data_changed.send(sender=None))
+
+
+@receiver(data_changed)
+def bump_cache_generation(sender, **kwargs):
+    cache.bump_generation()
+
+
+@receiver(data_changed)
+def rebuild_snapshot(sender, **kwargs):
+    # After the generation has changed, so that the snapshot is stored under
+    # the new one.
+    if snapshot.get_config()["ENABLED"]:
+        snapshot.snapshots.rebuild()
+
+
+@receiver(data_changed)
+def rebuild_read_model(sender, **kwargs):
+    # Also after the generation has changed, which the new model is of.
+    if read_model.get_config()["ENABLED"]:
+        read_model.read_models.rebuild()
+
+
+# Keep the search index in step with changes made through the ORM. The bulk
+# operations of syncdata do not send these signals and update the index
+# themselves.
+
+
+@receiver(post_save, sender=Country)
+def index_country(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index([instance.pk])
+
+
+@receiver(post_delete, sender=Country)
+def unindex_country(sender, instance, **kwargs):
+    search.unindex([instance.pk])
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=Currency)
+@receiver(m2m_changed, sender=CountryCurrency)
+def model_changed(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        notify_data_changed()
+
+
+@receiver(connection_created)
+def install_sql_metrics(sender, connection, **kwargs):
+    # The wrappers are kept when the connection reconnects. First, because
+    # connection.execute_wrapper() removes the last one when it exits, and
+    # the connection may have been created within it.
+    if metrics.record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, metrics.record_sql)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    db.configure_connection(connection)
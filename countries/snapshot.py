@@ -0,0 +1,258 @@
+"""
+Pre-rendered responses to the unfiltered countries query.
+
+Most requests are the same query for every country, such as
+
+    { countries { name symbol currencies { name symbol } } }
+
+and its response only changes when the data does. Such queries, that select
+``countries`` without arguments and only scalar fields of the countries and
+their currencies, are answered with a JSON body rendered once per data
+generation (see ``countries.cache``), along with a gzipped copy for clients
+that accept it. Serving one touches neither the ORM nor the GraphQL
+executor.
+
+A snapshot is rendered by the first request for its selection. The full
+query above is also rendered when the data changes, by the receiver of
+``data_changed`` in the process that made the change, which for
+``syncdata`` is not a web server process. Snapshots are therefore kept in
+the Django cache of ``COUNTRIES_RESULT_CACHE["ALIAS"]``, next to the
+generation token, as well as in the memory of each process.
+
+Configured by ``settings.COUNTRIES_SNAPSHOT``.
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from graphql import (
+    FieldNode,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    parse,
+)
+
+from countries import cache, cost
+from countries.documents import document_cache
+from countries.models import Country, CountryCurrency
+
+DEFAULTS = {
+    "ENABLED": True,
+    "GZIP_LEVEL": 9,
+}
+
+# The fields a snapshot can select.
+COUNTRY_FIELDS = {"name", "symbol", "currencies"}
+CURRENCY_FIELDS = {"name", "symbol"}
+
+FULL_QUERY = "{ countries { name symbol currencies { name symbol } } }"
+
+# As in django.middleware.gzip.
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "COUNTRIES_SNAPSHOT", {})}
+
+
+def _is_plain(field):
+    return (
+        isinstance(field, FieldNode)
+        and field.alias is None
+        and not field.arguments
+        and not field.directives
+    )
+
+
+def _scalars(selection_set, names):
+    fields = selection_set.selections
+    if not all(_is_plain(field) and field.name.value in names for field in fields):
+        return None
+    return _unique(tuple(field.name.value for field in fields))
+
+
+def _unique(names):
+    # GraphQL merges fields selected twice, which is left to the executor.
+    return names if len(set(names)) == len(names) else None
+
+
+def selection(document):
+    """
+    The fields a document selects, if a snapshot can answer it, or None.
+
+    Returns a tuple of field names in the order of the query, with
+    ``("currencies", (...))`` in place of the currencies field.
+    """
+    [operation, *rest] = document.definitions
+    if (
+        rest
+        or not isinstance(operation, OperationDefinitionNode)
+        or operation.operation != OperationType.QUERY
+        or operation.variable_definitions
+        or operation.directives
+    ):
+        return None
+    [field, *rest] = operation.selection_set.selections
+    if rest or not _is_plain(field) or field.name.value != "countries":
+        return None
+
+    fields = []
+    for country_field in field.selection_set.selections:
+        if not _is_plain(country_field) or country_field.name.value not in (
+            COUNTRY_FIELDS
+        ):
+            return None
+        if country_field.name.value == "currencies":
+            currency_fields = _scalars(country_field.selection_set, CURRENCY_FIELDS)
+            if currency_fields is None:
+                return None
+            fields.append(("currencies", currency_fields))
+        else:
+            fields.append(country_field.name.value)
+    if _unique([field if isinstance(field, str) else field[0] for field in fields]):
+        return tuple(fields)
+    return None
+
+
+def request_selection(schema, data):
+    """The selection of a request, if a snapshot can answer it, or None."""
+    try:
+        data = document_cache.resolve_persisted_query(data)
+        if (
+            not isinstance(data, dict)
+            or not isinstance(data.get("query"), str)
+            or data.get("variables")
+        ):
+            return None
+        document, errors = document_cache.get_document(schema, data["query"])
+    except GraphQLError:
+        return None
+    if errors:
+        return None
+    fields = selection(document)
+    if fields is None:
+        return None
+    name = document.definitions[0].name
+    if data.get("operationName") not in (None, name and name.value):
+        return None
+    return fields
+
+
+def render(fields):
+    """Render the response to a query selecting ``fields``."""
+    columns = [field for field in fields if isinstance(field, str)]
+    # The order of resolve_countries and of the currency loader.
+    countries = Country.objects.order_by("name", "id").values("id", *columns)
+
+    currency_fields = None
+    for field in fields:
+        if not isinstance(field, str):
+            currency_fields = field[1]
+    currencies = defaultdict(list)
+    if currency_fields is not None:
+        links = CountryCurrency.objects.order_by("pk").values_list(
+            "country_id", *("currency__" + name for name in currency_fields)
+        )
+        for country_id, *values in links:
+            currencies[country_id].append(dict(zip(currency_fields, values)))
+
+    data = []
+    for country in countries:
+        row = {}
+        for field in fields:
+            if isinstance(field, str):
+                row[field] = country[field]
+            else:
+                row["currencies"] = currencies[country["id"]]
+        data.append(row)
+    response = {"data": {"countries": data}}
+    extensions = response_extensions(fields)
+    if extensions:
+        response["extensions"] = extensions
+    # As JsonResponse would encode it.
+    return json.dumps(response, cls=DjangoJSONEncoder).encode()
+
+
+def selection_query(fields):
+    """The query text of a selection."""
+    names = [
+        field
+        if isinstance(field, str)
+        else "{} {{ {} }}".format(field[0], " ".join(field[1]))
+        for field in fields
+    ]
+    return "{{ countries {{ {} }} }}".format(" ".join(names))
+
+
+def response_extensions(fields):
+    """The extensions an executed query of ``fields`` would respond with."""
+    from countries.schema import schema
+
+    return cost.response_extensions(schema, parse(selection_query(fields)))
+
+
+class SnapshotCache:
+    def __init__(self):
+        self.local = {}
+        self.lock = threading.Lock()
+
+    def _key(self, generation, fields):
+        digest = hashlib.sha256(repr(fields).encode()).hexdigest()
+        return "countries:snapshot:{}:{}".format(generation, digest)
+
+    def get(self, fields):
+        """Return the (body, gzipped body) of ``fields`` for the current data."""
+        generation = cache.current_generation()
+        with self.lock:
+            entry = self.local.get(fields)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        shared = caches[cache.get_config()["ALIAS"]]
+        key = self._key(generation, fields)
+        snapshot = shared.get(key)
+        if snapshot is None:
+            snapshot = self.build(fields)
+            shared.set(key, snapshot, timeout=cache.get_config()["TIMEOUT"])
+        with self.lock:
+            self.local[fields] = (generation, snapshot)
+        return snapshot
+
+    def build(self, fields):
+        body = render(fields)
+        return body, gzip.compress(body, compresslevel=get_config()["GZIP_LEVEL"])
+
+    def rebuild(self):
+        """Render the full query for the current data."""
+        self.get(selection(parse(FULL_QUERY)))
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+
+
+snapshots = SnapshotCache()
+
+
+def accepts_gzip(request):
+    return bool(ACCEPTS_GZIP.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+
+
+def response(request, fields):
+    body, gzipped = snapshots.get(fields)
+    if accepts_gzip(request):
+        response = HttpResponse(gzipped, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
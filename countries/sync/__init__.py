@@ -0,0 +1,20 @@
+from countries.sync.diff import (
+    SyncReport,
+    apply_diff,
+    compute_diff,
+    load_snapshot,
+    sync_feeds,
+)
+from countries.sync.fetch import FetchConfig, FetchError, fetch, fetch_all
+
+__all__ = [
+    "FetchConfig",
+    "FetchError",
+    "SyncReport",
+    "apply_diff",
+    "compute_diff",
+    "fetch",
+    "fetch_all",
+    "load_snapshot",
+    "sync_feeds",
+]
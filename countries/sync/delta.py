@@ -0,0 +1,255 @@
+"""
+Incremental sync from a feed of change records, for ``syncdata --delta``.
+
+A delta feed is a JSON array of changes, each with a sequence number::
+
+    {"seq": 7, "op": "upsert", "type": "country", "code": "AUS",
+     "name": "Australia"}
+    {"seq": 8, "op": "upsert", "type": "link", "country": "AUS",
+     "currency": "AUD"}
+    {"seq": 9, "op": "delete", "type": "currency", "code": "AUD"}
+
+The sequence number of the last change applied is stored in the
+``FeedState`` of the feed, in the same transaction as the changes, and is
+sent with the next request as the ``after`` query parameter. Changes up to it
+are skipped whether or not the server leaves them out, so a run that fails
+can simply be repeated, and applying the same changes twice changes nothing.
+
+Only the rows the changes mention are read. Within a run the changes are
+merged by key, the latest one winning, and written with bulk operations:
+deleting a country or a currency removes its links, including those of an
+earlier change of the run, and links to countries or currencies that do not
+exist are ignored, as in the full sync.
+"""
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.db import transaction
+from django.db.models import Q
+
+from countries import search
+from countries.models import Country, CountryCurrency, Currency, FeedState
+from countries.signals import notify_data_changed
+from countries.sync.diff import SyncReport, _create, _delete, _update
+
+FEED = "delta"
+
+OPS = ("upsert", "delete")
+TYPES = ("country", "currency", "link")
+
+
+@dataclass
+class Change:
+    seq: int
+    op: str
+    type: str
+    # The code of a country or currency, or the (country, currency) codes of
+    # a link.
+    key: object
+    name: str = ""
+
+
+def parse_changes(records):
+    """Validate the records of a delta feed, and return them as ``Change``."""
+    if not isinstance(records, list):
+        raise ValueError("The delta feed is not a list of changes.")
+    changes = []
+    for i, record in enumerate(records):
+        try:
+            seq, op, type_ = record["seq"], record["op"], record["type"]
+            # bool is a subclass of int.
+            if isinstance(seq, bool) or not isinstance(seq, int):
+                raise ValueError
+            if op not in OPS or type_ not in TYPES:
+                raise ValueError
+            if type_ == "link":
+                key = (record["country"], record["currency"])
+                codes = key
+            else:
+                key = record["code"]
+                codes = (key,)
+            name = record["name"] if op == "upsert" and type_ != "link" else ""
+            if not all(isinstance(value, str) for value in (*codes, name)):
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Change {} is not valid: {!r}.".format(i, record))
+        changes.append(Change(seq, op, type_, key, name))
+    return changes
+
+
+def delta_url(url, after):
+    """``url`` with the ``after`` query parameter set."""
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name != "after"]
+    query.append(("after", str(after)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def load_sequence(url):
+    """The sequence number of the last change applied from ``url``."""
+    state = FeedState.objects.filter(feed=FEED, url=url).first()
+    return state.sequence if state is not None else 0
+
+
+def save_sequence(url, sequence):
+    FeedState.objects.update_or_create(
+        feed=FEED, defaults={"url": url, "sequence": sequence, "content_hash": ""}
+    )
+
+
+def _merge(changes):
+    """
+    The last change of each key, and the last delete of each country and
+    currency, which removes the links made before it.
+    """
+    latest = {"country": {}, "currency": {}, "link": {}}
+    deleted = {"country": {}, "currency": {}}
+    for change in sorted(changes, key=lambda change: change.seq):
+        latest[change.type][change.key] = change
+        if change.op == "delete" and change.type != "link":
+            deleted[change.type][change.key] = change.seq
+    return latest, deleted
+
+
+def _report_field(type_, action):
+    """The ``SyncReport`` field counting ``action`` on rows of ``type_``."""
+    return "{}_{}".format("countries" if type_ == "country" else "currencies", action)
+
+
+def _rows(model, codes):
+    """symbol -> (id, name) of the rows with the given symbols."""
+    return {
+        symbol: (pk, name)
+        for pk, symbol, name in model.objects.filter(symbol__in=codes).values_list(
+            "id", "symbol", "name"
+        )
+    }
+
+
+def _apply_rows(model, rows, changes, report, type_):
+    """Delete, update and create the rows of ``model``, updating ``rows``."""
+    to_delete = set()
+    to_update = {}
+    to_create = {}
+    for code, change in changes.items():
+        if change.op == "delete":
+            if code in rows:
+                to_delete.add(rows.pop(code)[0])
+        elif code not in rows:
+            to_create[code] = change.name
+        elif rows[code][1] != change.name:
+            to_update[code] = change.name
+
+    if to_delete:
+        setattr(report, _report_field(type_, "deleted"), _delete(model, to_delete))
+    if to_update:
+        _update(model, to_update, rows)
+        setattr(report, _report_field(type_, "updated"), len(to_update))
+    if to_create:
+        for code, pk in _create(model, to_create).items():
+            rows[code] = (pk, to_create[code])
+        setattr(report, _report_field(type_, "created"), len(to_create))
+    return to_delete, [rows[code][0] for code in (*to_update, *to_create)]
+
+
+def apply_changes(changes):
+    """Write the changes to the database in a single transaction."""
+    report = SyncReport()
+    latest, deleted = _merge(changes)
+
+    with transaction.atomic():
+        countries = _rows(
+            Country, {*latest["country"], *(key[0] for key in latest["link"])}
+        )
+        currencies = _rows(
+            Currency, {*latest["currency"], *(key[1] for key in latest["link"])}
+        )
+        # The links between the rows the link changes mention: (country id,
+        # currency id) -> id.
+        links = {
+            (country_id, currency_id): pk
+            for pk, country_id, currency_id in CountryCurrency.objects.filter(
+                country_id__in=[
+                    countries[key[0]][0]
+                    for key in latest["link"]
+                    if key[0] in countries
+                ],
+                currency_id__in=[
+                    currencies[key[1]][0]
+                    for key in latest["link"]
+                    if key[1] in currencies
+                ],
+            ).values_list("id", "country_id", "currency_id")
+        }
+
+        # Links go first: those deleted on their own, and all the links of
+        # the deleted countries and currencies, which the link changes above
+        # may not cover.
+        links_to_delete = {
+            links.pop((countries[country][0], currencies[currency][0]), None)
+            for (country, currency), change in latest["link"].items()
+            if change.op == "delete" and country in countries and currency in currencies
+        } - {None}
+        reset_countries = {
+            countries[code][0] for code in deleted["country"] if code in countries
+        }
+        reset_currencies = {
+            currencies[code][0] for code in deleted["currency"] if code in currencies
+        }
+        if links_to_delete or reset_countries or reset_currencies:
+            report.links_deleted, _ = CountryCurrency.objects.filter(
+                Q(pk__in=links_to_delete)
+                | Q(country_id__in=reset_countries)
+                | Q(currency_id__in=reset_currencies)
+            ).delete()
+            links = {
+                pair: pk
+                for pair, pk in links.items()
+                if pair[0] not in reset_countries and pair[1] not in reset_currencies
+            }
+
+        unindexed, indexed = _apply_rows(
+            Country, countries, latest["country"], report, "country"
+        )
+        _apply_rows(Currency, currencies, latest["currency"], report, "currency")
+        # Bulk operations send no signals, so update the search index here.
+        search.unindex(unindexed)
+        search.index(indexed)
+
+        # A link made before its country or currency was deleted went with
+        # it.
+        to_link = {
+            (countries[country][0], currencies[currency][0])
+            for (country, currency), change in latest["link"].items()
+            if change.op == "upsert"
+            and country in countries
+            and currency in currencies
+            and change.seq > deleted["country"].get(country, 0)
+            and change.seq > deleted["currency"].get(currency, 0)
+        } - set(links)
+        if to_link:
+            CountryCurrency.objects.bulk_create(
+                [
+                    CountryCurrency(country_id=country_id, currency_id=currency_id)
+                    for country_id, currency_id in to_link
+                ]
+            )
+            report.links_created = len(to_link)
+
+        if report.total:
+            notify_data_changed()
+
+    return report
+
+
+def sync_delta(url, changes):
+    """Apply the changes of ``url`` newer than the last run, return a report."""
+    with transaction.atomic():
+        sequence = load_sequence(url)
+        new = [change for change in changes if change.seq > sequence]
+        if not new:
+            return SyncReport(skipped=True), sequence
+        report = apply_changes(new)
+        sequence = max(change.seq for change in new)
+        save_sequence(url, sequence)
+    return report, sequence
@@ -0,0 +1,289 @@
+"""
+Set-based diff engine behind ``syncdata``.
+
+The current contents of the currency, country and link tables are loaded
+once and keyed by symbol. The feeds are compared against that snapshot in
+memory, and the resulting inserts, updates, deletes and link changes are
+applied with bulk operations inside a single transaction. The number of
+queries therefore does not grow with the number of rows in the feeds (apart
+from the batching Django applies to very large bulk operations).
+"""
+from dataclasses import dataclass, field, fields
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from countries import search
+from countries.models import Country, CountryCurrency, Currency
+from countries.signals import notify_data_changed
+
+# Ids per DELETE statement, below SQLite's limit on query parameters.
+DELETE_BATCH_SIZE = 500
+
+
+@dataclass
+class SyncReport:
+    """Number of rows touched by a sync, per table and operation."""
+
+    currencies_created: int = 0
+    currencies_updated: int = 0
+    currencies_deleted: int = 0
+    countries_created: int = 0
+    countries_updated: int = 0
+    countries_deleted: int = 0
+    links_created: int = 0
+    links_deleted: int = 0
+    # Set when the feeds had not changed since the last sync.
+    skipped: bool = False
+
+    @property
+    def total(self):
+        return sum(getattr(self, f.name) for f in fields(self) if f.name != "skipped")
+
+    def __str__(self):
+        if self.skipped:
+            return "Feeds unchanged since the last sync, sync skipped."
+        return (
+            "{} rows touched: currencies +{} ~{} -{}, countries +{} ~{} -{}, "
+            "links +{} -{}.".format(
+                self.total,
+                self.currencies_created,
+                self.currencies_updated,
+                self.currencies_deleted,
+                self.countries_created,
+                self.countries_updated,
+                self.countries_deleted,
+                self.links_created,
+                self.links_deleted,
+            )
+        )
+
+
+@dataclass
+class Snapshot:
+    """The database state, keyed by symbol."""
+
+    # symbol -> (id, name)
+    currencies: dict = field(default_factory=dict)
+    countries: dict = field(default_factory=dict)
+    # (country_id, currency_id) -> id of the through row
+    links: dict = field(default_factory=dict)
+
+
+@dataclass
+class Diff:
+    """The changes needed to bring a snapshot in line with the feeds."""
+
+    # symbol -> name
+    currencies_to_create: dict = field(default_factory=dict)
+    currencies_to_update: dict = field(default_factory=dict)
+    countries_to_create: dict = field(default_factory=dict)
+    countries_to_update: dict = field(default_factory=dict)
+    # ids of the rows to delete
+    currencies_to_delete: set = field(default_factory=set)
+    countries_to_delete: set = field(default_factory=set)
+    links_to_delete: set = field(default_factory=set)
+    # (country symbol, currency symbol) pairs
+    links_to_create: set = field(default_factory=set)
+
+    def __bool__(self):
+        return any(getattr(self, f.name) for f in fields(self))
+
+
+def load_snapshot():
+    """Read the three tables in one query each."""
+    return Snapshot(
+        currencies={
+            symbol: (pk, name)
+            for pk, symbol, name in Currency.objects.values_list("id", "symbol", "name")
+        },
+        countries={
+            symbol: (pk, name)
+            for pk, symbol, name in Country.objects.values_list("id", "symbol", "name")
+        },
+        links={
+            (country_id, currency_id): pk
+            for pk, country_id, currency_id in CountryCurrency.objects.values_list(
+                "id", "country_id", "currency_id"
+            )
+        },
+    )
+
+
+def compute_diff(snapshot, countries_list, currencies_list):
+    """
+    Compare the feeds with the snapshot.
+
+    Feed rows are keyed by their ``code``; if a code appears more than once
+    the last row wins. Links to currencies that are not in the currency feed
+    are ignored.
+    """
+    currencies = {row["code"]: row["name"] for row in currencies_list}
+    countries = {
+        row["code"]: (row["name"], row.get("currencies") or ())
+        for row in countries_list
+    }
+
+    diff = Diff()
+
+    for symbol, name in currencies.items():
+        if symbol not in snapshot.currencies:
+            diff.currencies_to_create[symbol] = name
+        elif snapshot.currencies[symbol][1] != name:
+            diff.currencies_to_update[symbol] = name
+    diff.currencies_to_delete = {
+        pk
+        for symbol, (pk, _) in snapshot.currencies.items()
+        if symbol not in currencies
+    }
+
+    for symbol, (name, _) in countries.items():
+        if symbol not in snapshot.countries:
+            diff.countries_to_create[symbol] = name
+        elif snapshot.countries[symbol][1] != name:
+            diff.countries_to_update[symbol] = name
+    diff.countries_to_delete = {
+        pk for symbol, (pk, _) in snapshot.countries.items() if symbol not in countries
+    }
+
+    wanted = {
+        (country_symbol, currency_symbol)
+        for country_symbol, (_, currency_symbols) in countries.items()
+        for currency_symbol in currency_symbols
+        if currency_symbol in currencies
+    }
+    country_symbols = {pk: symbol for symbol, (pk, _) in snapshot.countries.items()}
+    currency_symbols = {pk: symbol for symbol, (pk, _) in snapshot.currencies.items()}
+    existing = set()
+    for (country_id, currency_id), pk in snapshot.links.items():
+        if (
+            country_id in diff.countries_to_delete
+            or currency_id in diff.currencies_to_delete
+        ):
+            # Removed by the cascade when the country or currency goes.
+            continue
+        pair = (country_symbols[country_id], currency_symbols[currency_id])
+        if pair in wanted:
+            existing.add(pair)
+        else:
+            diff.links_to_delete.add(pk)
+    diff.links_to_create = wanted - existing
+
+    return diff
+
+
+def _create(model, names):
+    objs = model.objects.bulk_create(
+        [model(symbol=symbol, name=name) for symbol, name in names.items()]
+    )
+    if any(obj.pk is None for obj in objs):
+        # The backend could not return the new primary keys.
+        return dict(
+            model.objects.filter(symbol__in=list(names)).values_list("symbol", "id")
+        )
+    return {obj.symbol: obj.pk for obj in objs}
+
+
+def _update(model, names, ids):
+    model.objects.bulk_update(
+        [model(pk=ids[symbol][0], name=name) for symbol, name in names.items()],
+        ["name"],
+    )
+
+
+def _delete(model, ids):
+    """
+    Delete the rows of ``model`` with the given ids, and return how many
+    were deleted. Their links must be deleted first: this is a plain DELETE,
+    without the collector and signals of ``QuerySet.delete()``.
+    """
+    ids = list(ids)
+    deleted = 0
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start : start + DELETE_BATCH_SIZE]
+            cursor.execute(
+                "DELETE FROM {} WHERE id IN ({})".format(
+                    model._meta.db_table, ", ".join(["%s"] * len(batch))
+                ),
+                batch,
+            )
+            deleted += cursor.rowcount
+    return deleted
+
+
+def apply_diff(snapshot, diff):
+    """Write the diff to the database in a single transaction."""
+    report = SyncReport()
+    if not diff:
+        return report
+
+    currency_ids = {symbol: pk for symbol, (pk, _) in snapshot.currencies.items()}
+    country_ids = {symbol: pk for symbol, (pk, _) in snapshot.countries.items()}
+
+    with transaction.atomic():
+        if (
+            diff.links_to_delete
+            or diff.countries_to_delete
+            or diff.currencies_to_delete
+        ):
+            # Remove the links of deleted rows here as well, so that the
+            # countries and currencies can be deleted without going through
+            # the collector, which works in chunks of 100 rows.
+            report.links_deleted, _ = CountryCurrency.objects.filter(
+                Q(pk__in=diff.links_to_delete)
+                | Q(country_id__in=diff.countries_to_delete)
+                | Q(currency_id__in=diff.currencies_to_delete)
+            ).delete()
+        if diff.countries_to_delete:
+            report.countries_deleted = _delete(Country, diff.countries_to_delete)
+        if diff.currencies_to_delete:
+            report.currencies_deleted = _delete(Currency, diff.currencies_to_delete)
+
+        if diff.currencies_to_update:
+            _update(Currency, diff.currencies_to_update, snapshot.currencies)
+            report.currencies_updated = len(diff.currencies_to_update)
+        if diff.countries_to_update:
+            _update(Country, diff.countries_to_update, snapshot.countries)
+            report.countries_updated = len(diff.countries_to_update)
+
+        if diff.currencies_to_create:
+            currency_ids.update(_create(Currency, diff.currencies_to_create))
+            report.currencies_created = len(diff.currencies_to_create)
+        if diff.countries_to_create:
+            country_ids.update(_create(Country, diff.countries_to_create))
+            report.countries_created = len(diff.countries_to_create)
+
+        # Bulk operations send no signals, so update the search index here.
+        search.unindex(diff.countries_to_delete)
+        search.index(
+            country_ids[symbol]
+            for symbol in (*diff.countries_to_update, *diff.countries_to_create)
+        )
+
+        if diff.links_to_create:
+            CountryCurrency.objects.bulk_create(
+                [
+                    CountryCurrency(
+                        country_id=country_ids[country_symbol],
+                        currency_id=currency_ids[currency_symbol],
+                    )
+                    for country_symbol, currency_symbol in diff.links_to_create
+                ],
+                # The unique (country, currency) index makes this safe to
+                # repeat.
+                ignore_conflicts=True,
+            )
+            report.links_created = len(diff.links_to_create)
+
+        notify_data_changed()
+
+    return report
+
+
+def sync_feeds(countries_list, currencies_list):
+    """Bring the database in line with the already downloaded feeds."""
+    with transaction.atomic():
+        snapshot = load_snapshot()
+        diff = compute_diff(snapshot, countries_list, currencies_list)
+        return apply_diff(snapshot, diff)
@@ -0,0 +1,164 @@
+"""
+Feed fetcher used by ``syncdata``.
+
+Both feeds are downloaded at the same time over one pooled
+``requests.Session``. Every request has a timeout, and connection errors,
+timeouts and 429/5xx responses are retried with exponential backoff and full
+jitter. Failures are reported as ``FetchError``, which records the feed, url,
+status code and number of attempts.
+"""
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchConfig:
+    # (connect, read) timeout in seconds for every attempt.
+    timeout: tuple = (3.05, 30)
+    # Number of retries after the first attempt.
+    retries: int = 3
+    # The n-th retry waits a random time up to backoff * 2 ** n seconds,
+    # capped at max_backoff.
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+
+
+class FetchError(Exception):
+    def __init__(self, feed, url, reason, status=None, attempts=1):
+        super().__init__(feed, url, reason, status, attempts)
+        self.feed = feed
+        self.url = url
+        self.reason = reason
+        self.status = status
+        self.attempts = attempts
+
+    def __str__(self):
+        if self.status is not None:
+            reason = "status code {}".format(self.status)
+        else:
+            reason = self.reason
+        return "Could not fetch the {} feed from {} ({} attempt(s)): {}.".format(
+            self.feed, self.url, self.attempts, reason
+        )
+
+
+def is_retryable_status(status):
+    return status == 429 or status >= 500
+
+
+def make_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backoff_delay(config, retry, response=None):
+    """Seconds to wait before the given retry (counting from zero)."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(config.max_backoff, int(retry_after))
+    return random.uniform(0, min(config.max_backoff, config.backoff * 2**retry))
+
+
+def fetch(
+    session,
+    feed,
+    url,
+    config=None,
+    headers=None,
+    expected=(200,),
+    stream=False,
+    sleep=time.sleep,
+):
+    """
+    GET a single feed, retrying transient failures.
+
+    Raises ``FetchError`` if the feed cannot be reached or the final status
+    code is not in ``expected``. With ``stream`` the body is left unread.
+    """
+    config = config or FetchConfig()
+    attempts = 0
+    while True:
+        attempts += 1
+        response = None
+        try:
+            response = session.get(
+                url, timeout=config.timeout, headers=headers, stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if attempts > config.retries:
+                raise FetchError(feed, url, error, attempts=attempts)
+            reason = error
+        except requests.RequestException as error:
+            raise FetchError(feed, url, error, attempts=attempts)
+        else:
+            status = response.status_code
+            if status in expected:
+                return response
+            response.close()
+            if not is_retryable_status(status) or attempts > config.retries:
+                raise FetchError(
+                    feed, url, "unexpected status", status=status, attempts=attempts
+                )
+            reason = "status code {}".format(response.status_code)
+
+        delay = backoff_delay(config, attempts - 1, response)
+        logger.warning(
+            "Fetching the %s feed from %s failed (%s), retrying in %.2fs.",
+            feed,
+            url,
+            reason,
+            delay,
+        )
+        sleep(delay)
+
+
+def fetch_all(
+    urls, config=None, session=None, headers=None, expected=(200,), stream=False
+):
+    """
+    Download every feed in ``urls`` (a dict of feed name to url) at once.
+
+    ``headers`` optionally maps feed names to extra request headers.
+
+    Returns a dict of feed name to response. If any feed fails, the first
+    failure in the order of ``urls`` is raised once all downloads are done.
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=len(urls))
+    try:
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            futures = {
+                feed: executor.submit(
+                    fetch,
+                    session,
+                    feed,
+                    url,
+                    config,
+                    (headers or {}).get(feed),
+                    expected,
+                    stream,
+                )
+                for feed, url in urls.items()
+            }
+    finally:
+        if own_session:
+            session.close()
+    errors = [future.exception() for future in futures.values() if future.exception()]
+    for error in errors:
+        logger.error("%s", error)
+    if errors:
+        raise errors[0]
+    return {feed: future.result() for feed, future in futures.items()}
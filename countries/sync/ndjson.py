@@ -0,0 +1,197 @@
+"""
+Export and import of the data as NDJSON, for ``exportdata`` and
+``importdata``.
+
+A dump has one JSON object per line, currencies first, then countries, then
+the links between them::
+
+    {"type": "currency", "id": 1, "code": "AUD", "name": "Australian Dollar"}
+    {"type": "country", "id": 7, "code": "AUS", "name": "Australia"}
+    {"type": "link", "country": 7, "currency": 1}
+
+The ids are kept, so that the links can be written without looking up their
+countries and currencies, and so that the cursors of ``countriesConnection``,
+which hold ids, stay valid where the dump is imported. The links are in the
+order of the feed, which is the order of the currencies of each country.
+
+Neither side holds more than a chunk of rows in memory. The export reads
+the three tables in one read transaction with ``QuerySet.iterator``. The
+import replaces the data in one transaction, writing each chunk with
+``bulk_create``, then rebuilds the search index. It also forgets the state of
+the feeds, so that the next ``syncdata`` compares the feeds with the
+imported data rather than skipping them as unchanged. Dumps may be gzipped.
+"""
+import gzip
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+from django.core.management.color import no_style
+from django.db import connection, router, transaction
+
+from countries import search
+from countries.models import Country, CountryCurrency, Currency, FeedState
+from countries.signals import notify_data_changed
+
+DEFAULT_CHUNK_SIZE = 2000
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# The fields of each type of record.
+FIELDS = {
+    "currency": {"id": int, "code": str, "name": str},
+    "country": {"id": int, "code": str, "name": str},
+    "link": {"country": int, "currency": int},
+}
+
+
+@dataclass
+class DumpReport:
+    """Number of rows exported or imported, per table."""
+
+    currencies: int = 0
+    countries: int = 0
+    links: int = 0
+
+    def count(self, type_, rows=1):
+        field = {"currency": "currencies", "country": "countries"}.get(type_, "links")
+        setattr(self, field, getattr(self, field) + rows)
+
+    def __str__(self):
+        return "{} currencies, {} countries and {} links.".format(
+            self.currencies, self.countries, self.links
+        )
+
+
+@contextmanager
+def open_dump(path, mode, compress=False):
+    """
+    Open the dump ``path`` in binary ``mode``, or stdin or stdout for
+    ``-``. Written dumps are gzipped with ``compress``; read ones if they
+    start as gzip does.
+    """
+    if path == "-":
+        f = sys.stdout.buffer if "w" in mode else sys.stdin.buffer
+        # Closing the dump leaves the standard streams open.
+        context = nullcontext(f)
+    else:
+        context = f = open(path, mode)
+    with context:
+        if "r" in mode:
+            compress = f.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC)
+        if compress:
+            with gzip.GzipFile(fileobj=f, mode=mode) as gzip_file:
+                yield gzip_file
+        else:
+            yield f
+
+
+def export_records(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the records of a dump of the database."""
+    # The three tables as of the same moment.
+    with transaction.atomic(using=router.db_for_read(Country)):
+        for type_, model in (("currency", Currency), ("country", Country)):
+            rows = model.objects.order_by("pk").values_list("id", "symbol", "name")
+            for pk, symbol, name in rows.iterator(chunk_size=chunk_size):
+                yield {"type": type_, "id": pk, "code": symbol, "name": name}
+        links = CountryCurrency.objects.order_by("pk").values_list(
+            "country_id", "currency_id"
+        )
+        for country_id, currency_id in links.iterator(chunk_size=chunk_size):
+            yield {"type": "link", "country": country_id, "currency": currency_id}
+
+
+def write_records(records, f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write ``records`` to the binary file ``f``, and return a report."""
+    report = DumpReport()
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        report.count(record["type"])
+        if len(lines) == chunk_size:
+            f.write(("\n".join(lines) + "\n").encode())
+            lines = []
+    if lines:
+        f.write(("\n".join(lines) + "\n").encode())
+    return report
+
+
+def read_records(f):
+    """
+    Yield the records of the binary file ``f``.
+
+    Raises ``ValueError`` on the first line that is not a valid record.
+    """
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            fields = FIELDS[record["type"]]
+            for name, type_ in fields.items():
+                if type(record[name]) is not type_:
+                    raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(
+                "Line {} is not a valid record: {}".format(
+                    number, line.decode("utf-8", "replace").strip()[:200]
+                )
+            )
+        yield record
+
+
+def _instance(record):
+    if record["type"] == "link":
+        return CountryCurrency(
+            country_id=record["country"], currency_id=record["currency"]
+        )
+    model = Country if record["type"] == "country" else Currency
+    return model(id=record["id"], symbol=record["code"], name=record["name"])
+
+
+def import_records(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the data with ``records`` in one transaction, and return a
+    report.
+
+    Raises ``IntegrityError`` for links to countries or currencies that are
+    not in the records, and for codes that are not unique.
+    """
+    report = DumpReport()
+    pending = {type_: [] for type_ in FIELDS}
+
+    def flush(type_):
+        instances = pending[type_]
+        if instances:
+            type(instances[0]).objects.bulk_create(instances)
+            report.count(type_, len(instances))
+            pending[type_] = []
+
+    with transaction.atomic():
+        # Bulk deletes, without the signals and cascades of QuerySet.delete().
+        with connection.cursor() as cursor:
+            for model in (CountryCurrency, Country, Currency):
+                cursor.execute("DELETE FROM {}".format(model._meta.db_table))
+        FeedState.objects.all().delete()
+
+        # The links are only checked once all the rows are in, so the types
+        # may come in any order.
+        for record in records:
+            pending[record["type"]].append(_instance(record))
+            if len(pending[record["type"]]) == chunk_size:
+                flush(record["type"])
+        for type_ in FIELDS:
+            flush(type_)
+
+        # Where the ids of new rows continue from, on databases with
+        # sequences.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Currency, Country, CountryCurrency]
+            ):
+                cursor.execute(sql)
+        connection.check_constraints(table_names=[CountryCurrency._meta.db_table])
+        search.rebuild()
+        notify_data_changed()
+    return report
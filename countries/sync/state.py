@@ -0,0 +1,84 @@
+"""
+Conditional fetching for ``syncdata``.
+
+After a successful sync the ETag, Last-Modified and a sha256 of the body of
+each feed are stored in ``FeedState``. The next run sends them back as
+``If-None-Match`` / ``If-Modified-Since``; a feed is unchanged if the server
+answers ``304 Not Modified`` or the body hashes to the stored value, which
+covers servers that do not send validators.
+"""
+import hashlib
+
+from countries.models import FeedState
+
+
+def load_states(urls):
+    """Stored state per feed name, for feeds whose url has not changed."""
+    states = FeedState.objects.filter(feed__in=list(urls))
+    return {state.feed: state for state in states if state.url == urls[state.feed]}
+
+
+def conditional_headers(state):
+    headers = {}
+    if state is None:
+        return headers
+    if state.etag:
+        headers["If-None-Match"] = state.etag
+    if state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+
+def content_hash(response):
+    return hashlib.sha256(response.content).hexdigest()
+
+
+def is_unchanged(state, response, check_hash=True):
+    """
+    Whether the feed is the same as at the last sync.
+
+    Without ``check_hash`` only a ``304`` counts, so that a streamed body is
+    not read here.
+    """
+    if state is None:
+        return False
+    if response.status_code == 304:
+        return True
+    return check_hash and content_hash(response) == state.content_hash
+
+
+def validators_changed(state, response):
+    if response.status_code == 304:
+        return False
+    return (
+        response.headers.get("ETag", "") != state.etag
+        or response.headers.get("Last-Modified", "") != state.last_modified
+    )
+
+
+def save_states(urls, responses, states, hashes=None):
+    """
+    Record the validators of the responses that were just synced.
+
+    A ``304`` response keeps the stored hash, as it has no body. ``hashes``
+    holds the hashes of streamed responses, whose bodies have been consumed.
+    """
+    for feed, response in responses.items():
+        state = states.get(feed)
+        if response.status_code == 304:
+            etag = response.headers.get("ETag", state.etag)
+            last_modified = response.headers.get("Last-Modified", state.last_modified)
+            digest = state.content_hash
+        else:
+            etag = response.headers.get("ETag", "")
+            last_modified = response.headers.get("Last-Modified", "")
+            digest = (hashes or {}).get(feed) or content_hash(response)
+        FeedState.objects.update_or_create(
+            feed=feed,
+            defaults={
+                "url": urls[feed],
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_hash": digest,
+            },
+        )
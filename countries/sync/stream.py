@@ -0,0 +1,294 @@
+"""
+Streaming ingestion for ``syncdata --stream``.
+
+The feeds are parsed one array element at a time straight from the response
+stream and synced in chunks of a fixed number of rows, so memory use does not
+grow with the size of the feeds. Each chunk only reads the rows it mentions;
+symbols seen in the feeds are recorded in a temporary table, and rows that
+were not seen are swept at the end. Everything runs in one transaction.
+"""
+import codecs
+import hashlib
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+
+from countries import search
+from countries.models import Country, CountryCurrency, Currency
+from countries.signals import notify_data_changed
+from countries.sync.diff import SyncReport, _create, _update
+
+DEFAULT_CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+
+SEEN_TABLE = "countries_sync_seen"
+
+WHITESPACE = " \t\r\n"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _delimited(buffer, end):
+    while end < len(buffer) and buffer[end] in WHITESPACE:
+        end += 1
+    return end < len(buffer) and buffer[end] in ",]"
+
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """
+    Yield the elements of a JSON array from an iterable of byte chunks.
+
+    Raises ``ValueError`` if the document is not a single JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    eof = False
+    # One of "start", "first", "value", "after" and "done".
+    state = "start"
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+
+        need_more = pos == len(buffer)
+        if not need_more:
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array at offset {}.".format(pos))
+                pos += 1
+                state = "first"
+            elif state in ("first", "value"):
+                if state == "first" and char == "]":
+                    pos += 1
+                    state = "done"
+                    continue
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    need_more = True
+                else:
+                    # A number may have been cut short by the end of the
+                    # buffer, so only accept one once the delimiter after it
+                    # has arrived.
+                    if not eof and _is_number(value) and not _delimited(buffer, end):
+                        need_more = True
+                    else:
+                        yield value
+                        pos = end
+                        state = "after"
+            elif state == "after":
+                if char == ",":
+                    state = "value"
+                elif char == "]":
+                    state = "done"
+                else:
+                    raise ValueError("Expected ',' or ']' at offset {}.".format(pos))
+                pos += 1
+            else:
+                raise ValueError("Extra data after the JSON array.")
+
+        if need_more:
+            if eof:
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                buffer = buffer[pos:] + text_decoder.decode(b"", final=True)
+            else:
+                buffer = buffer[pos:] + text_decoder.decode(chunk)
+            pos = 0
+
+    if state != "done":
+        raise ValueError("Unterminated JSON array.")
+
+
+def iter_feed(response, hashes, feed, read_size=READ_SIZE):
+    """
+    Yield the rows of a streamed feed response.
+
+    The sha256 of the body is stored in ``hashes[feed]`` once the response
+    has been read to the end.
+    """
+    digest = hashlib.sha256()
+
+    def chunks():
+        for chunk in response.iter_content(read_size):
+            digest.update(chunk)
+            yield chunk
+        hashes[feed] = digest.hexdigest()
+
+    return iter_json_array(chunks(), response.encoding or "utf-8")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _mark_seen(cursor, kind, symbols):
+    cursor.executemany(
+        "INSERT INTO {} (kind, symbol) VALUES (%s, %s)".format(SEEN_TABLE),
+        [(kind, symbol) for symbol in symbols],
+    )
+
+
+def _sync_currencies(cursor, rows, report):
+    names = {row["code"]: row["name"] for row in rows}
+    existing = {
+        symbol: (pk, name)
+        for pk, symbol, name in Currency.objects.filter(
+            symbol__in=list(names)
+        ).values_list("id", "symbol", "name")
+    }
+    to_create = {s: n for s, n in names.items() if s not in existing}
+    to_update = {
+        s: n for s, n in names.items() if s in existing and existing[s][1] != n
+    }
+    if to_create:
+        _create(Currency, to_create)
+        report.currencies_created += len(to_create)
+    if to_update:
+        _update(Currency, to_update, existing)
+        report.currencies_updated += len(to_update)
+    _mark_seen(cursor, "currency", names)
+
+
+def _sync_countries(cursor, rows, report):
+    countries = {
+        row["code"]: (row["name"], row.get("currencies") or ()) for row in rows
+    }
+    existing = {
+        symbol: (pk, name)
+        for pk, symbol, name in Country.objects.filter(
+            symbol__in=list(countries)
+        ).values_list("id", "symbol", "name")
+    }
+    to_create = {s: n for s, (n, _) in countries.items() if s not in existing}
+    to_update = {
+        s: n for s, (n, _) in countries.items() if s in existing and existing[s][1] != n
+    }
+    country_ids = {symbol: pk for symbol, (pk, _) in existing.items()}
+    if to_update:
+        _update(Country, to_update, existing)
+        report.countries_updated += len(to_update)
+    if to_create:
+        country_ids.update(_create(Country, to_create))
+        report.countries_created += len(to_create)
+    search.index(country_ids[symbol] for symbol in (*to_update, *to_create))
+    _mark_seen(cursor, "country", countries)
+
+    # Only link to currencies that were in the currency feed.
+    currency_symbols = {s for _, symbols in countries.values() for s in symbols}
+    currency_ids = {}
+    if currency_symbols:
+        cursor.execute(
+            "SELECT symbol, id FROM {} WHERE symbol IN ({}) AND symbol IN "
+            "(SELECT symbol FROM {} WHERE kind = 'currency')".format(
+                Currency._meta.db_table,
+                ", ".join(["%s"] * len(currency_symbols)),
+                SEEN_TABLE,
+            ),
+            list(currency_symbols),
+        )
+        currency_ids = dict(cursor.fetchall())
+
+    wanted = {
+        (country_ids[country_symbol], currency_ids[currency_symbol])
+        for country_symbol, (_, symbols) in countries.items()
+        for currency_symbol in symbols
+        if currency_symbol in currency_ids
+    }
+    current = {}
+    if existing:
+        current = {
+            (country_id, currency_id): pk
+            for pk, country_id, currency_id in CountryCurrency.objects.filter(
+                country_id__in=[pk for pk, _ in existing.values()]
+            ).values_list("id", "country_id", "currency_id")
+        }
+    to_unlink = [pk for pair, pk in current.items() if pair not in wanted]
+    to_link = wanted - current.keys()
+    if to_unlink:
+        CountryCurrency.objects.filter(pk__in=to_unlink).delete()
+        report.links_deleted += len(to_unlink)
+    if to_link:
+        CountryCurrency.objects.bulk_create(
+            [
+                CountryCurrency(country_id=country_id, currency_id=currency_id)
+                for country_id, currency_id in to_link
+            ],
+            ignore_conflicts=True,
+        )
+        report.links_created += len(to_link)
+
+
+def _sweep(cursor, report):
+    """Delete the countries and currencies that were not in the feeds."""
+    unseen = (
+        "SELECT id FROM {table} WHERE symbol NOT IN "
+        "(SELECT symbol FROM {seen} WHERE kind = '{kind}')"
+    )
+    unseen_countries = unseen.format(
+        table=Country._meta.db_table, seen=SEEN_TABLE, kind="country"
+    )
+    unseen_currencies = unseen.format(
+        table=Currency._meta.db_table, seen=SEEN_TABLE, kind="currency"
+    )
+    cursor.execute(
+        "DELETE FROM {} WHERE country_id IN ({}) OR currency_id IN ({})".format(
+            CountryCurrency._meta.db_table, unseen_countries, unseen_currencies
+        )
+    )
+    report.links_deleted += cursor.rowcount
+    cursor.execute(
+        "DELETE FROM {} WHERE id IN ({})".format(
+            Country._meta.db_table, unseen_countries
+        )
+    )
+    report.countries_deleted += cursor.rowcount
+    search.prune()
+    cursor.execute(
+        "DELETE FROM {} WHERE id IN ({})".format(
+            Currency._meta.db_table, unseen_currencies
+        )
+    )
+    report.currencies_deleted += cursor.rowcount
+
+
+def stream_sync(countries_rows, currencies_rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sync from iterables of feed rows, ``chunk_size`` rows at a time.
+
+    The currency rows are consumed first, as the country rows link to them.
+    """
+    report = SyncReport()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE {} (kind VARCHAR(8), symbol VARCHAR(8))".format(
+                SEEN_TABLE
+            )
+        )
+        cursor.execute("CREATE INDEX {0}_idx ON {0} (kind, symbol)".format(SEEN_TABLE))
+        # On errors the table goes with the rolled back transaction.
+        for rows in chunked(currencies_rows, chunk_size):
+            _sync_currencies(cursor, rows, report)
+        for rows in chunked(countries_rows, chunk_size):
+            _sync_countries(cursor, rows, report)
+        _sweep(cursor, report)
+        if report.total:
+            notify_data_changed()
+        cursor.execute("DROP TABLE {}".format(SEEN_TABLE))
+    return report
@@ -1,10 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from ariadne_django.views import GraphQLView
-from .schema import schema
+from .schema import get_async_schema, get_schema
 
 from . import views
 
+if settings.COUNTRIES_GRAPHQL_ASYNC:
+    graphql_view = views.AsyncGraphQLView.as_view(schema_factory=get_async_schema)
+else:
+    graphql_view = views.GraphQLView.as_view(schema_factory=get_schema)
+
 urlpatterns = [
     path("", views.index, name="index"),
-    path("graphql/", GraphQLView.as_view(schema=schema), name="graphql"),
+    path("graphql/", graphql_view, name="graphql"),
+    path("cache-stats/", views.cache_stats, name="cache_stats"),
+    # Where Prometheus scrapes by default.
+    path("metrics", views.metrics_view, name="metrics"),
 ]
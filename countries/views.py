@@ -1,5 +1,252 @@
-from django.http import HttpResponse
+from typing import cast
+
+from ariadne.exceptions import HttpBadRequestError
+from ariadne_django.views import GraphQLAsyncView as BaseGraphQLAsyncView
+from ariadne_django.views import GraphQLView as BaseGraphQLView
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from graphql import GraphQLSchema
+
+from countries import batching, http_cache, metrics, snapshot
+from countries.cache import result_cache
+from countries.db import in_worker_thread
+from countries.documents import document_cache, graphql, graphql_sync
+from countries.loaders import LoaderExecutionContext
 
 
 def index(request):
     return HttpResponse("Hello, world.")
+
+
+# As the dispatch of the ariadne views it comes before is.
+@method_decorator(csrf_exempt, name="dispatch")
+class LazySchemaMixin:
+    # Returns the schema, for views given this rather than ``schema``, so
+    # that it is built by the first request instead of at startup.
+    schema_factory = None
+
+    def dispatch(self, *args, **kwargs):
+        if self.schema is None and self.schema_factory is not None:
+            self.schema = self.schema_factory()
+        return super().dispatch(*args, **kwargs)
+
+
+class SnapshotMixin:
+    def snapshot_selection(self, data):
+        """The fields of the query, if a snapshot can answer it, or None."""
+        if not snapshot.get_config()["ENABLED"]:
+            return None
+        return snapshot.request_selection(self.schema, data)
+
+
+class MetricsMixin:
+    def get_extensions_for_request(self, request, context):
+        extensions = super().get_extensions_for_request(request, context)
+        sampled = metrics.sample_extensions()
+        return [*(extensions or []), *sampled] if sampled else extensions
+
+
+class HTTPCacheMixin:
+    def query_string_data(self, request):
+        """
+        The query of a GET request with its ETag, or the response to send
+        instead: the playground, a bad request or ``304 Not Modified``.
+        """
+        if not http_cache.is_query_request(request):
+            return None, None, None, self._get(request)
+        try:
+            data = http_cache.data_from_query_string(request.GET)
+        except HttpBadRequestError as error:
+            return None, None, None, HttpResponseBadRequest(error.message)
+        fields = self.snapshot_selection(data)
+        if not http_cache.get_config()["ENABLED"]:
+            return data, fields, None, None
+        tag = http_cache.etag(
+            data, gzipped=fields is not None and snapshot.accepts_gzip(request)
+        )
+        return data, fields, tag, http_cache.not_modified(request, tag)
+
+    def cacheable(self, response, tag):
+        if tag is None:
+            return response
+        return http_cache.patch_response(response, tag)
+
+
+class BatchMixin:
+    def start_batch(self, request, operations):
+        """
+        The keys of the operations of a batch and the arguments of
+        ``graphql`` they share, or the response to send instead.
+        """
+        error = batching.check(operations)
+        if error is not None:
+            return None, None, HttpResponseBadRequest(error)
+        keys = [batching.operation_key(data) for data in operations]
+        return keys, self.get_kwargs_graphql(request), None
+
+    def batch_response(self, keys, results):
+        return HttpResponse(
+            batching.response_body([results[key] for key in keys]),
+            content_type="application/json",
+        )
+
+
+class GraphQLView(
+    LazySchemaMixin,
+    MetricsMixin,
+    HTTPCacheMixin,
+    SnapshotMixin,
+    BatchMixin,
+    BaseGraphQLView,
+):
+    """
+    The ariadne view, with parsed documents cached, persisted queries,
+    snapshots of the unfiltered countries query and cacheable GET requests.
+    """
+
+    execution_context_class = LoaderExecutionContext
+
+    def get_kwargs_graphql(self, request):
+        return {
+            **super().get_kwargs_graphql(request),
+            "execution_context_class": self.execution_context_class,
+        }
+
+    def get(self, request, *args, **kwargs):
+        data, fields, tag, response = self.query_string_data(request)
+        if response is not None:
+            return response
+        return self.cacheable(self.respond(request, data, fields), tag)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = self.extract_data_from_request(request)
+        except HttpBadRequestError as error:
+            return HttpResponseBadRequest(error.message)
+        if batching.is_batch(data):
+            return self.respond_batch(request, data)
+        return self.respond(request, data, self.snapshot_selection(data))
+
+    def respond(self, request, data, fields):
+        if fields is not None:
+            return snapshot.response(request, fields)
+        success, result = graphql_sync(
+            cast(GraphQLSchema, self.schema), data, **self.get_kwargs_graphql(request)
+        )
+        status_code = 200 if success else 400
+        return JsonResponse(result, status=status_code)
+
+    def respond_batch(self, request, operations):
+        keys, kwargs, response = self.start_batch(request, operations)
+        if response is not None:
+            return response
+        batching.prefetch(self.schema, operations, kwargs["context_value"])
+        results = {}
+        for key, data in zip(keys, operations):
+            if key in results:
+                continue
+            fields = self.snapshot_selection(data)
+            if fields is not None:
+                results[key] = snapshot.snapshots.get(fields)[0]
+            else:
+                _, result = graphql_sync(
+                    cast(GraphQLSchema, self.schema), data, **kwargs
+                )
+                results[key] = batching.encode(result)
+        return self.batch_response(keys, results)
+
+
+class AsyncGraphQLView(
+    LazySchemaMixin,
+    MetricsMixin,
+    HTTPCacheMixin,
+    SnapshotMixin,
+    BatchMixin,
+    BaseGraphQLAsyncView,
+):
+    """``GraphQLView`` for ASGI, to be used with ``schema.async_schema``."""
+
+    execution_context_class = LoaderExecutionContext
+
+    def get_kwargs_graphql(self, request):
+        return {
+            **super().get_kwargs_graphql(request),
+            "execution_context_class": self.execution_context_class,
+        }
+
+    async def get(self, request, *args, **kwargs):
+        # The ETag reads the generation from the shared cache, and the
+        # snapshot selection parses the document.
+        data, fields, tag, response = await in_worker_thread(self.query_string_data)(
+            request
+        )
+        if response is not None:
+            return response
+        return self.cacheable(await self.respond(request, data, fields), tag)
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = self.extract_data_from_request(request)
+        except HttpBadRequestError as error:
+            return HttpResponseBadRequest(error.message)
+        if batching.is_batch(data):
+            return await self.respond_batch(request, data)
+        fields = await in_worker_thread(self.snapshot_selection)(data)
+        return await self.respond(request, data, fields)
+
+    async def respond(self, request, data, fields):
+        if fields is not None:
+            # Rendering a snapshot that is not cached yet queries the data.
+            return await in_worker_thread(snapshot.response)(request, fields)
+        success, result = await graphql(
+            cast(GraphQLSchema, self.schema), data, **self.get_kwargs_graphql(request)
+        )
+        status_code = 200 if success else 400
+        return JsonResponse(result, status=status_code)
+
+    async def respond_batch(self, request, operations):
+        keys, kwargs, response = self.start_batch(request, operations)
+        if response is not None:
+            return response
+        await in_worker_thread(batching.prefetch)(
+            self.schema, operations, kwargs["context_value"]
+        )
+        results = {}
+        for key, data in zip(keys, operations):
+            if key in results:
+                continue
+            body = await in_worker_thread(self.snapshot_body)(data)
+            if body is not None:
+                results[key] = body
+            else:
+                _, result = await graphql(
+                    cast(GraphQLSchema, self.schema), data, **kwargs
+                )
+                results[key] = batching.encode(result)
+        return self.batch_response(keys, results)
+
+    def snapshot_body(self, data):
+        """The snapshot answering an operation of a batch, or None."""
+        fields = self.snapshot_selection(data)
+        if fields is None:
+            return None
+        body, _ = snapshot.snapshots.get(fields)
+        return body
+
+
+def cache_stats(request):
+    # Hit and miss counters of the countries result cache and the document
+    # cache in this process. They are internals, so only served in DEBUG.
+    if not settings.DEBUG:
+        raise Http404("Cache statistics are only served in DEBUG.")
+    return JsonResponse({**result_cache.stats(), "documents": document_cache.stats()})
+
+
+def metrics_view(request):
+    if not metrics.get_config()["ENABLED"]:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )